@@ -24,6 +24,106 @@ echo "****************************************************************"
 echo "Running test_ping_pong.py..."
 python test_ping_pong.py
 
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_long_poll.py..."
+python test_long_poll.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_async_engine.py..."
+python test_async_engine.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_persistence.py..."
+python test_persistence.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_retention.py..."
+python test_retention.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_subscriptions.py..."
+python test_subscriptions.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_wildcards.py..."
+python test_wildcards.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_concurrency.py..."
+python test_concurrency.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_workers.py..."
+python test_workers.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_cluster.py..."
+python test_cluster.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_binary_protocol.py..."
+python test_binary_protocol.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_metrics.py..."
+python test_metrics.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_request_log.py..."
+python test_request_log.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_acks.py..."
+python test_acks.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_consumer_groups.py..."
+python test_consumer_groups.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_pull_all.py..."
+python test_pull_all.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_compression.py..."
+python test_compression.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_in_process.py..."
+python test_in_process.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_backpressure.py..."
+python test_backpressure.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_stream.py..."
+python test_stream.py
+
+echo "****************************************************************"
+echo "****************************************************************"
+echo "Running test_benchmark_harness.py..."
+python test_benchmark_harness.py
+
 echo "****************************************************************"
 echo "****************************************************************"
 echo "Running benchmark_pub_sub.py..."
@@ -1,4 +1,5 @@
 # client_api/__init__.py
 
 # You can optionally import the classes or methods here for easier access
-from .client_api_impl import ClientAPIImpl
\ No newline at end of file
+from .client_api_impl import ClientAPIImpl
+from .async_client_api_impl import AsyncClientAPIImpl
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import aiohttp
+from client_api_controller import retry_delay
+
+class AsyncClientAPIController:
+    # asyncio counterpart of ClientAPIController. All calls share one
+    # aiohttp session whose connector keeps up to pool_size non-blocking
+    # keep-alive connections to the broker; coroutines beyond that wait for a
+    # free connection. Publishes refused because a topic is full (429) are
+    # retried like ClientAPIController does, without blocking the loop.
+    def __init__(self, base_url='http://localhost:5000', pool_size=100, timeout=None, overload_retries=5,
+                 backoff_factor=0.2):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout  # Seconds to connect and to wait for a response; None waits forever
+        self.overload_retries = overload_retries
+        self.backoff_factor = backoff_factor
+        self.session = None
+
+    def _session(self):
+        # Created lazily because aiohttp sessions must be made inside a running loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None, connect=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _post(self, path, payload, timeout=None):
+        return (await self._request(path, payload, timeout))[1]
+
+    async def _request(self, path, payload, timeout=None):
+        # (response, decoded JSON body); the response is already released
+        read_timeout = timeout if timeout is not None else self.timeout
+        async with self._session().post(f'{self.base_url}{path}', json=payload,
+                                        timeout=aiohttp.ClientTimeout(total=None, connect=self.timeout, sock_read=read_timeout)) as response:
+            return response, await response.json()
+
+    async def _publish(self, path, payload):
+        # Sends a publish, backing off while the broker refuses it as
+        # overloaded; raises ClientResponseError once overload_retries are used up
+        for attempt in range(self.overload_retries + 1):
+            response, body = await self._request(path, payload)
+            if response.status != 429:
+                return body
+            if attempt < self.overload_retries:
+                await asyncio.sleep(retry_delay(body, response.headers, attempt, self.backoff_factor))
+        response.raise_for_status()
+
+    async def register_publisher(self, pid):
+        return await self._post('/register_publisher', {'pid': pid})
+
+    async def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # The retention limits and overflow policy are optional; the broker's
+        # defaults apply to any left out
+        payload = {'pid': pid, 'topic': topic}
+        for key, value in (('max_messages', max_messages), ('max_bytes', max_bytes), ('max_age_s', max_age_s),
+                           ('overflow', overflow)):
+            if value is not None:
+                payload[key] = value
+        await self._post('/create_topic', payload)
+
+    async def delete_topic(self, pid, topic):
+        await self._post('/delete_topic', {'pid': pid, 'topic': topic})
+
+    async def send_message(self, pid, topic, message):
+        await self._publish('/send_message', {'pid': pid, 'topic': topic, 'message': message})
+
+    async def send_messages(self, pid, topic, messages):
+        return await self._publish('/send_messages', {'pid': pid, 'topic': topic, 'messages': messages})
+
+    async def send_batches(self, pid, batches):
+        # batches maps each topic to the list of messages to append to it; only
+        # the batches of topics that turned out full are sent again after a backoff
+        count = 0
+        for attempt in range(self.overload_retries + 1):
+            payload = [{'topic': topic, 'messages': messages} for topic, messages in batches.items()]
+            response, body = await self._request('/send_messages', {'pid': pid, 'batches': payload})
+            count += body.get('count', 0)
+            if response.status != 429:
+                break
+            if attempt == self.overload_retries:
+                response.raise_for_status()
+            batches = {topic: batches[topic] for topic in body['topics']}
+            await asyncio.sleep(retry_delay(body, response.headers, attempt, self.backoff_factor))
+        return {'message': f'{count} messages sent by Publisher {pid}', 'count': count}
+
+    async def topic_stats(self, topic=None):
+        return await self._post('/topic_stats', {'topic': topic})
+
+    async def register_subscriber(self, sid):
+        return await self._post('/register_subscriber', {'sid': sid})
+
+    async def subscribe(self, sid, topic, group=None, max_backlog=None):
+        await self._post('/subscribe', {'sid': sid, 'topic': topic, 'group': group, 'max_backlog': max_backlog})
+
+    async def unsubscribe(self, sid, topic):
+        await self._post('/unsubscribe', {'sid': sid, 'topic': topic})
+
+    async def unregister_subscriber(self, sid):
+        await self._post('/unregister_subscriber', {'sid': sid})
+
+    async def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        response = await self._pull(sid, topic, wait_ms, max_messages=max_messages, max_bytes=max_bytes)
+        return response.get('messages', [])
+
+    async def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        # Leases the messages instead of consuming them; see ClientAPIController.pull_batch
+        return await self._pull(sid, topic, wait_ms, ack=True, max_messages=max_messages, max_bytes=max_bytes,
+                                visibility_timeout_ms=visibility_timeout_ms)
+
+    async def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        response = await self._pull(sid, None, wait_ms, max_messages=max_messages, max_bytes=max_bytes)
+        return response.get('topics', {})
+
+    async def _pull(self, sid, topic, wait_ms, **options):
+        payload = {'sid': sid, 'topic': topic}
+        timeout = None
+        if wait_ms is not None:
+            payload['wait_ms'] = wait_ms
+            if self.timeout is not None:
+                # The broker may legitimately hold a long poll for wait_ms
+                timeout = self.timeout + wait_ms / 1000
+        payload.update((key, value) for key, value in options.items() if value is not None)
+        return await self._post('/pull_messages', payload, timeout)
+
+    async def ack(self, sid, topic, offset):
+        response = await self._post('/ack', {'sid': sid, 'topic': topic, 'offset': offset})
+        return response['acked']
+
+    async def stream_messages(self, sid, topic):
+        # Yields messages pushed by the broker over Server-Sent Events. Only the
+        # connect timeout applies: an idle stream can go quiet between heartbeats
+        async with self._session().post(f'{self.base_url}/stream_messages', json={'sid': sid, 'topic': topic}) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.decode().strip()
+                if line.startswith('data: '):
+                    for message in json.loads(line[len('data: '):]):
+                        yield message
@@ -0,0 +1,85 @@
+from async_client_api_controller import AsyncClientAPIController
+from client_api_impl import ClientAPIImpl
+
+class AsyncClientAPIImpl:
+    # asyncio counterpart of ClientAPIImpl, for driving thousands of concurrent
+    # publishers and subscribers from one event loop instead of one thread each.
+    # IDs come from ClientAPIImpl's counters so sync and async clients in the
+    # same process never hand out the same pid/sid.
+
+    def __init__(self, base_url='http://localhost:5000', pool_size=100, timeout=None, overload_retries=5,
+                 backoff_factor=0.2):
+        # pool_size: keep-alive connections shared by all coroutines using this client
+        # timeout: seconds to connect and to wait for a response (None waits forever)
+        # overload_retries/backoff_factor: retry policy for publishes refused
+        #   by a full topic, as for ClientAPIImpl
+        self.api_controller = AsyncClientAPIController(base_url, pool_size, timeout, overload_retries, backoff_factor)
+
+    async def close(self):
+        await self.api_controller.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def register_publisher(self):
+        pid = f'P{ClientAPIImpl.pid_count}'
+        ClientAPIImpl.pid_count += 1
+        return await self.api_controller.register_publisher(pid)
+
+    async def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # overflow: drop_oldest, drop_newest or reject, as for ClientAPIImpl.create_topic
+        await self.api_controller.create_topic(pid, topic, max_messages, max_bytes, max_age_s, overflow)
+
+    async def delete_topic(self, pid, topic):
+        await self.api_controller.delete_topic(pid, topic)
+
+    async def send_message(self, pid, topic, message):
+        await self.api_controller.send_message(pid, topic, message)
+
+    async def send_messages(self, pid, topic, messages):
+        return await self.api_controller.send_messages(pid, topic, messages)
+
+    async def send_batches(self, pid, batches):
+        return await self.api_controller.send_batches(pid, batches)
+
+    async def topic_stats(self, topic=None):
+        # Retained messages/bytes, evictions and subscribers per topic
+        return await self.api_controller.topic_stats(topic)
+
+    async def register_subscriber(self):
+        sid = f'S{ClientAPIImpl.sid_count}'
+        ClientAPIImpl.sid_count += 1
+        return await self.api_controller.register_subscriber(sid)
+
+    async def subscribe(self, sid, topic, group=None, max_backlog=None):
+        # With group, sid shares the topic's messages with the group's other members;
+        # max_backlog caps how many unread messages sid may have on the topic
+        await self.api_controller.subscribe(sid, topic, group, max_backlog)
+
+    async def unsubscribe(self, sid, topic):
+        await self.api_controller.unsubscribe(sid, topic)
+
+    async def unregister_subscriber(self, sid):
+        # Drops all of sid's subscriptions
+        await self.api_controller.unregister_subscriber(sid)
+
+    async def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        return await self.api_controller.pull_messages(sid, topic, wait_ms, max_messages, max_bytes)
+
+    async def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        # Messages from every topic sid reads, as {topic: messages}
+        return await self.api_controller.pull_all(sid, wait_ms, max_messages, max_bytes)
+
+    async def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        # At-least-once: {'messages', 'offsets'}; redelivered unless acked in time
+        return await self.api_controller.pull_batch(sid, topic, wait_ms, max_messages, max_bytes, visibility_timeout_ms)
+
+    async def ack(self, sid, topic, offset):
+        return await self.api_controller.ack(sid, topic, offset)
+
+    def stream(self, sid, topic):
+        # Async generator over messages pushed by the broker as they are published
+        return self.api_controller.stream_messages(sid, topic)
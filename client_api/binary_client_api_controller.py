@@ -0,0 +1,161 @@
+import itertools
+import socket
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+from binary_protocol import LENGTH, OPCODES, OK, BrokerError, encode_frame, decode_frame
+
+# How long each poll of stream_messages parks on the broker
+STREAM_POLL_MS = 30000
+
+class BinaryClientAPIController:
+    # Same calls as ClientAPIController, over the binary protocol on a single
+    # TCP connection to one broker (started with --binary-port) shared by all
+    # threads. Requests are pipelined: each one is written as soon as it is
+    # made, tagged with an id, and a reader thread hands every response to
+    # whoever waits for that id, so callers never queue behind each other's
+    # round trips or behind a parked long poll. submit() returns a Future, so
+    # a single thread can keep many requests in flight too.
+    def __init__(self, address='tcp://localhost:6000', timeout=None):
+        url = urlsplit(address)
+        self.timeout = timeout  # Seconds to connect and to wait for a response; None waits forever
+        self.sock = socket.create_connection((url.hostname, url.port), timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+        self.pending = {}  # Request id -> Future for its response
+        self.pending_lock = threading.Lock()
+        self.closed = False
+        self.request_ids = itertools.count(1)
+        self.reader = threading.Thread(target=self._read_responses, daemon=True)
+        self.reader.start()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already disconnected
+        self.sock.close()
+        self.reader.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, operation, *args):
+        """Send a request without waiting for it; returns a Future for its
+        response, which fails with BrokerError if the broker rejects it."""
+        future = Future()
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        frame = encode_frame(request_id, OPCODES[operation], args)
+        with self.pending_lock:
+            if self.closed:
+                raise ConnectionError('Connection to the broker is closed')
+            self.pending[request_id] = future
+        try:
+            with self.send_lock:
+                self.sock.sendall(frame)
+        except OSError:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise
+        return future
+
+    def _call(self, operation, *args, timeout=None):
+        return self.submit(operation, *args).result(timeout or self.timeout)
+
+    def _read_responses(self):
+        stream = self.sock.makefile('rb')
+        try:
+            while True:
+                header = stream.read(LENGTH.size)
+                if len(header) < LENGTH.size:
+                    break
+                (length,) = LENGTH.unpack(header)
+                frame = stream.read(length)
+                if len(frame) < length:
+                    break
+                request_id, code, value = decode_frame(frame)
+                with self.pending_lock:
+                    future = self.pending.pop(request_id, None)
+                if future is None:
+                    continue  # Its caller gave up waiting
+                if code == OK:
+                    future.set_result(value)
+                else:
+                    future.set_exception(BrokerError(value))
+        except OSError:
+            pass
+        finally:
+            stream.close()
+            with self.pending_lock:
+                self.closed = True
+                pending, self.pending = self.pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError('Connection to the broker closed'))
+
+    def register_publisher(self, pid):
+        return self._call('register_publisher', pid)
+
+    def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # The retention limits and overflow policy are optional; the broker's
+        # defaults apply to any left out
+        retention = {key: value for key, value in (('max_messages', max_messages), ('max_bytes', max_bytes),
+                                                   ('max_age_s', max_age_s), ('overflow', overflow)) if value is not None}
+        self._call('create_topic', pid, topic, retention)
+
+    def delete_topic(self, pid, topic):
+        self._call('delete_topic', pid, topic)
+
+    def send_message(self, pid, topic, message):
+        self._call('send_message', pid, topic, message)
+
+    def send_messages(self, pid, topic, messages):
+        return self._call('send_messages', pid, [{'topic': topic, 'messages': messages}])
+
+    def send_batches(self, pid, batches):
+        # batches maps each topic to the list of messages to append to it
+        return self._call('send_messages', pid, [{'topic': topic, 'messages': messages}
+                                                 for topic, messages in batches.items()])
+
+    def topic_stats(self, topic=None):
+        return self._call('topic_stats', topic)
+
+    def register_subscriber(self, sid):
+        return self._call('register_subscriber', sid)
+
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        self._call('subscribe', sid, topic, group, max_backlog)
+
+    def unsubscribe(self, sid, topic):
+        self._call('unsubscribe', sid, topic)
+
+    def unregister_subscriber(self, sid):
+        self._call('unregister_subscriber', sid)
+
+    def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        return self._pull(sid, topic, wait_ms, max_messages, max_bytes)['messages']
+
+    def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        return self._pull(sid, topic, wait_ms, max_messages, max_bytes, True, visibility_timeout_ms)
+
+    def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        return self._pull(sid, None, wait_ms, max_messages, max_bytes).get('topics', {})
+
+    def _pull(self, sid, topic, wait_ms, *options):
+        timeout = None
+        if wait_ms is not None and self.timeout is not None:
+            # The broker may legitimately hold a long poll for wait_ms
+            timeout = self.timeout + wait_ms / 1000
+        return self._call('pull_messages', sid, topic, wait_ms, *options, timeout=timeout)
+
+    def ack(self, sid, topic, offset):
+        return self._call('ack', sid, topic, offset)['acked']
+
+    def stream_messages(self, sid, topic):
+        # The protocol has no server push, so a stream is long polls back to
+        # back; it ends when the caller stops iterating
+        while True:
+            yield from self.pull_messages(sid, topic, wait_ms=STREAM_POLL_MS)
@@ -0,0 +1,131 @@
+import struct
+
+# Compact binary protocol spoken over a persistent TCP connection, as an
+# alternative to HTTP+JSON. Every frame is
+#
+#   u32 length | u32 request id | u8 code | value
+#
+# where length counts the bytes after itself. In a request the code is the
+# operation (its index in OPERATIONS plus one) and the value is the list of
+# arguments; in a response the code is OK or ERROR and the value is the
+# result. Responses carry the id of their request and may come back in any
+# order, so a client can keep many requests in flight on one connection.
+
+OPERATIONS = (
+    'register_publisher',     # pid
+    'create_topic',           # pid, topic, retention dict
+    'delete_topic',           # pid, topic
+    'send_message',           # pid, topic, message
+    'send_messages',          # pid, [{'topic': ..., 'messages': [...]}, ...]
+    'register_subscriber',    # sid
+    'subscribe',              # sid, topic, group, max_backlog
+    'unsubscribe',            # sid, topic
+    'unregister_subscriber',  # sid
+    'pull_messages',          # sid, topic (None for all), wait_ms, max_messages, max_bytes, ack, visibility_timeout_ms
+    'topic_stats',            # topic
+    'ack',                    # sid, topic, offset
+)
+OPCODES = {operation: code for code, operation in enumerate(OPERATIONS, 1)}
+OK, ERROR = 0, 1
+
+LENGTH = struct.Struct('>I')
+HEADER = struct.Struct('>IIB')  # length, request id, code
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+_F64 = struct.Struct('>d')
+
+
+class BrokerError(Exception):
+    """An ERROR response. response holds its value: a 'message' and, when the
+    topic is served by another broker, its 'owner' and the cluster 'nodes'."""
+
+    def __init__(self, response):
+        super().__init__(response.get('message'))
+        self.response = response
+
+
+# Value tags
+_NONE, _STR, _INT, _FLOAT, _LIST, _DICT, _TRUE, _FALSE = range(8)
+
+
+def encode_frame(request_id, code, value):
+    body = bytearray()
+    _encode(value, body)
+    return HEADER.pack(len(body) + 5, request_id, code) + body
+
+
+def decode_frame(frame):
+    """Split a frame without its length prefix into (request id, code, value)."""
+    request_id, code = struct.unpack_from('>IB', frame)
+    value, _ = _decode(frame, 5)
+    return request_id, code, value
+
+
+def _encode(value, out):
+    # Strings, the common case, come first
+    if isinstance(value, str):
+        data = value.encode()
+        out.append(_STR)
+        out += _U32.pack(len(data))
+        out += data
+    elif value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        out += _I64.pack(value)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        out += _U32.pack(len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _encode(str(key), out)
+            _encode(item, out)
+    else:
+        raise TypeError(f'Cannot encode {type(value).__name__}')
+
+
+def _decode(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == _STR:
+        (size,) = _U32.unpack_from(data, offset)
+        offset += 4
+        return bytes(data[offset:offset + size]).decode(), offset + size
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _INT:
+        return _I64.unpack_from(data, offset)[0], offset + 8
+    if tag == _FLOAT:
+        return _F64.unpack_from(data, offset)[0], offset + 8
+    if tag == _LIST:
+        (count,) = _U32.unpack_from(data, offset)
+        offset += 4
+        items = []
+        for _ in range(count):
+            item, offset = _decode(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == _DICT:
+        (count,) = _U32.unpack_from(data, offset)
+        offset += 4
+        result = {}
+        for _ in range(count):
+            key, offset = _decode(data, offset)
+            result[key], offset = _decode(data, offset)
+        return result, offset
+    raise ValueError(f'Unknown value tag {tag}')
@@ -11,11 +11,29 @@ class ClientAPI:
     def send(self, pid, topic, message):
         pass
 
+    def send_messages(self, pid, topic, messages):
+        pass
+
     def register_subscriber(self):
         pass
 
-    def subscribe(self, sid, topic):
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        pass
+
+    def unsubscribe(self, sid, topic):
+        pass
+
+    def pull(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        pass
+
+    def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        pass
+
+    def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        pass
+
+    def ack(self, sid, topic, offset):
         pass
 
-    def pull(self, sid, topic):
+    def stream(self, sid, topic):
         pass
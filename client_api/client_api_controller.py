@@ -1,29 +1,311 @@
+import gzip
+import json
+import random
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from hash_ring import HashRing, partition_key
+
+# How many times a request follows a broker's redirect to a topic's new owner
+MAX_REDIRECTS = 5
+# zlib level for compressed request bodies: the fastest, as for the broker's responses
+COMPRESSION_LEVEL = 1
+# Upper bound on the random part of the wait before retrying a rejected publish
+MAX_BACKOFF_S = 10
+
+def retry_delay(body, headers, attempt, backoff_factor):
+    # Seconds to wait before retrying a publish refused with 429: the broker's
+    # Retry-After plus "full jitter" over an exponentially growing window
+    retry_after_ms = body.get('retry_after_ms')
+    retry_after = retry_after_ms / 1000 if retry_after_ms is not None else float(headers.get('Retry-After', 0))
+    return retry_after + random.uniform(0, min(backoff_factor * 2 ** attempt, MAX_BACKOFF_S))
 
 class ClientAPIController:
-    def __init__(self, base_url='http://localhost:5000'):
-        self.base_url = base_url
+    # The session keeps connections to the broker alive and reuses them across
+    # calls. requests.Session/urllib3 pools are safe to share between threads;
+    # pool_block makes callers wait for a free connection instead of opening
+    # throwaway ones once pool_size connections are in use.
+    #
+    # base_url may also be a list of broker URLs, e.g. the workers started by
+    # message_broker.py --workers. Topics are then spread over the brokers by
+    # consistent hashing on the first level of their name, and every call about
+    # a topic goes straight to the broker that owns it. When ownership has
+    # moved, brokers redirect the request and the client adopts the cluster
+    # membership they report, so later calls go to the right broker directly.
+    #
+    # With compression, responses of at least the broker's threshold come back
+    # gzipped, and request bodies of at least compress_min_bytes are gzipped
+    # for every broker that has advertised it accepts them. Without it the
+    # client asks for uncompressed responses.
+    #
+    # Publishes a broker rejects because the topic is full (429) are retried up
+    # to overload_retries times, each after the Retry-After the broker asked
+    # for plus random jitter that grows exponentially with backoff_factor, so
+    # rejected publishers don't all come back at the same moment.
+    def __init__(self, base_url='http://localhost:5000', pool_size=10, timeout=None, retries=3, backoff_factor=0.2,
+                 compression=False, compress_min_bytes=1024, overload_retries=5):
+        self.nodes = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.base_url = self.nodes[0]
+        self.ring = HashRing(self.nodes)
+        self.timeout = timeout  # Seconds to connect and to wait for a response; None waits forever
+        # Retries only cover connection errors and idempotent requests, so a
+        # POST that may have reached the broker is never sent twice
+        retry = Retry(total=retries, backoff_factor=backoff_factor)
+        adapter = HTTPAdapter(pool_connections=len(self.nodes), pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.gzip_nodes = set()  # Brokers that accept gzipped request bodies
+        self.session.headers['Accept-Encoding'] = 'gzip' if compression else 'identity'
+        self.overload_retries = overload_retries
+        self.backoff_factor = backoff_factor
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _post(self, path, payload, timeout=None, node=None, **kwargs):
+        node = node or self.base_url
+        body = json.dumps(payload).encode() if self.compression else None
+        for _ in range(MAX_REDIRECTS):
+            if body is not None:
+                kwargs.update(self._encode(body, node))
+            else:
+                kwargs['json'] = payload
+            try:
+                response = self.session.post(f'{node}{path}', timeout=timeout or self.timeout,
+                                             allow_redirects=False, **kwargs)
+            except requests.exceptions.ConnectionError:
+                # The topic's broker may have left the cluster; retry once the ring changed
+                if len(self.nodes) == 1 or not payload.get('topic') or not self._refresh_nodes(node):
+                    raise
+                node = self._owner(payload['topic'])
+                continue
+            if self.compression and 'gzip' in response.headers.get('Accept-Encoding', ''):
+                self.gzip_nodes.add(node)
+            if response.status_code != 307:
+                return response
+            redirect = response.json()
+            response.close()
+            self._set_nodes(redirect['nodes'])
+            node = redirect['owner']
+        return response
+
+    def _publish(self, path, payload, node):
+        # Sends a publish, backing off while the broker rejects it as
+        # overloaded; raises HTTPError once overload_retries are used up
+        for attempt in range(self.overload_retries + 1):
+            response = self._post(path, payload, node=node)
+            if response.status_code != 429:
+                return response
+            if attempt < self.overload_retries:
+                time.sleep(self._backoff(response, attempt))
+        response.raise_for_status()
+
+    def _backoff(self, response, attempt):
+        return retry_delay(response.json(), response.headers, attempt, self.backoff_factor)
+
+    def _encode(self, body, node):
+        # Request arguments for a JSON body sent to node, gzipped when it is
+        # big enough and node has said it accepts that
+        headers = {'Content-Type': 'application/json'}
+        if len(body) >= self.compress_min_bytes and node in self.gzip_nodes:
+            headers['Content-Encoding'] = 'gzip'
+            body = gzip.compress(body, COMPRESSION_LEVEL, mtime=0)
+        return {'data': body, 'headers': headers}
+
+    def _set_nodes(self, nodes):
+        # Adopts the cluster membership reported by a broker
+        if nodes and nodes != self.nodes:
+            self.ring = HashRing(nodes)
+            self.nodes = list(nodes)
+            if self.base_url not in self.nodes:
+                self.base_url = self.nodes[0]
+
+    def _refresh_nodes(self, unreachable):
+        # Asks the other brokers for the current membership; returns whether it changed
+        for node in self.nodes:
+            if node == unreachable:
+                continue
+            try:
+                nodes = self.session.post(f'{node}/cluster', json={}, timeout=self.timeout).json()['nodes']
+            except requests.exceptions.RequestException:
+                continue
+            if nodes and nodes != self.nodes:
+                self._set_nodes(nodes)
+                return True
+            return False
+        return False
+
+    def _owner(self, topic):
+        # The broker that owns topic (or, for a pattern, the topics it matches)
+        if len(self.nodes) == 1:
+            return self.base_url
+        try:
+            return self.ring.node_for(partition_key(topic))
+        except ValueError:
+            return self.base_url  # A pattern spanning all brokers is served wherever it lands
 
     def register_publisher(self, pid):
-        response = requests.post(f'{self.base_url}/register_publisher', json={'pid': pid})
+        response = self._post('/register_publisher', {'pid': pid})
         return response.json()
 
-    def create_topic(self, pid, topic):
-        requests.post(f'{self.base_url}/create_topic', json={'pid': pid, 'topic': topic})
+    def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # The retention limits and overflow policy are optional; the broker's
+        # defaults apply to any left out
+        payload = {'pid': pid, 'topic': topic}
+        for key, value in (('max_messages', max_messages), ('max_bytes', max_bytes), ('max_age_s', max_age_s),
+                           ('overflow', overflow)):
+            if value is not None:
+                payload[key] = value
+        self._post('/create_topic', payload, node=self._owner(topic))
 
     def delete_topic(self, pid, topic):
-        requests.post(f'{self.base_url}/delete_topic', json={'pid': pid, 'topic': topic})
+        self._post('/delete_topic', {'pid': pid, 'topic': topic}, node=self._owner(topic))
 
     def send_message(self, pid, topic, message):
-        requests.post(f'{self.base_url}/send_message', json={'pid': pid, 'topic': topic, 'message': message})
+        self._publish('/send_message', {'pid': pid, 'topic': topic, 'message': message}, node=self._owner(topic))
+
+    def send_messages(self, pid, topic, messages):
+        response = self._publish('/send_messages', {'pid': pid, 'topic': topic, 'messages': messages}, node=self._owner(topic))
+        return response.json()
+
+    def send_batches(self, pid, batches):
+        # batches maps each topic to the list of messages to append to it; one
+        # request goes to every broker that owns some of the topics. Only the
+        # batches of topics that turned out full are sent again after a backoff
+        count = 0
+        redirects = overloads = 0
+        while batches:
+            by_node = {}
+            for topic, messages in batches.items():
+                by_node.setdefault(self._owner(topic), []).append({'topic': topic, 'messages': messages})
+            misdirected, rejected = {}, {}
+            delay = 0
+            for node, payload in by_node.items():
+                response = self._post('/send_messages', {'pid': pid, 'batches': payload}, node=node)
+                if response.status_code == 421:
+                    # Part of the batch moved to another broker: split it again
+                    self._set_nodes(response.json()['nodes'])
+                    misdirected.update((batch['topic'], batch['messages']) for batch in payload)
+                elif response.status_code == 429:
+                    full = set(response.json()['topics'])
+                    count += response.json()['count']
+                    rejected.update((batch['topic'], batch['messages']) for batch in payload if batch['topic'] in full)
+                    delay = max(delay, self._backoff(response, overloads))
+                    last_rejection = response
+                else:
+                    count += response.json()['count']
+            if misdirected:
+                redirects += 1
+                if redirects == MAX_REDIRECTS:
+                    break
+            if rejected:
+                if overloads == self.overload_retries:
+                    last_rejection.raise_for_status()
+                overloads += 1
+                time.sleep(delay)
+            batches = {**misdirected, **rejected}
+        return {'message': f'{count} messages sent by Publisher {pid}', 'count': count}
+
+    def topic_stats(self, topic=None):
+        if topic is not None:
+            return self._post('/topic_stats', {'topic': topic}, node=self._owner(topic)).json()
+        # Every broker reports its own topics
+        stats = {'topics': {}, 'totals': {}}
+        for node in self.nodes:
+            response = self._post('/topic_stats', {}, node=node).json()
+            stats['topics'].update(response['topics'])
+            for key, value in response['totals'].items():
+                stats['totals'][key] = stats['totals'].get(key, 0) + value
+        return stats
 
     def register_subscriber(self, sid):
-        response = requests.post(f'{self.base_url}/register_subscriber', json={'sid': sid})
+        response = self._post('/register_subscriber', {'sid': sid})
         return response.json()
 
-    def subscribe(self, sid, topic):
-        requests.post(f'{self.base_url}/subscribe', json={'sid': sid, 'topic': topic})
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        self._post('/subscribe', {'sid': sid, 'topic': topic, 'group': group, 'max_backlog': max_backlog},
+                   node=self._owner(topic))
+
+    def unsubscribe(self, sid, topic):
+        self._post('/unsubscribe', {'sid': sid, 'topic': topic}, node=self._owner(topic))
+
+    def unregister_subscriber(self, sid):
+        # sid may hold subscriptions on every broker
+        for node in self.nodes:
+            self._post('/unregister_subscriber', {'sid': sid}, node=node)
+
+    def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        return self._pull(sid, topic, wait_ms, max_messages=max_messages, max_bytes=max_bytes).get('messages', [])
+
+    def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        # Leases the messages instead of consuming them: the response also
+        # holds their offsets, and they are delivered again unless acknowledged
+        # with ack() before the visibility timeout (the broker's default if None)
+        return self._pull(sid, topic, wait_ms, ack=True, max_messages=max_messages, max_bytes=max_bytes,
+                          visibility_timeout_ms=visibility_timeout_ms)
+
+    def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        # Messages from every topic sid reads, by topic. With several brokers
+        # each is asked in turn for what is left of max_messages (max_bytes
+        # applies per broker), and only once none of them had anything does
+        # the client long-poll them, splitting wait_ms evenly between them
+        if len(self.nodes) == 1:
+            return self._pull(sid, None, wait_ms, max_messages=max_messages, max_bytes=max_bytes).get('topics', {})
+        by_topic = {}
+        for wait in (None, wait_ms and wait_ms // len(self.nodes)):
+            for node in list(self.nodes):
+                if max_messages is not None and max_messages <= 0:
+                    break
+                topics = self._pull(sid, None, wait, node=node, max_messages=max_messages, max_bytes=max_bytes).get('topics', {})
+                by_topic.update(topics)
+                if max_messages is not None:
+                    max_messages -= sum(len(messages) for messages in topics.values())
+            if by_topic or not wait_ms:
+                break
+        return by_topic
+
+    def _pull(self, sid, topic, wait_ms, node=None, **options):
+        payload = {'sid': sid, 'topic': topic}
+        timeout = None
+        if wait_ms is not None:
+            payload['wait_ms'] = wait_ms
+            if self.timeout is not None:
+                # The broker may legitimately hold a long poll for wait_ms
+                timeout = (self.timeout, self.timeout + wait_ms / 1000)
+        payload.update((key, value) for key, value in options.items() if value is not None)
+        return self._post('/pull_messages', payload, timeout, node=node or self._owner(topic)).json()
+
+    def ack(self, sid, topic, offset):
+        # Acknowledges sid's messages on topic up to and including offset;
+        # topic is the concrete topic even for messages pulled through a pattern
+        response = self._post('/ack', {'sid': sid, 'topic': topic, 'offset': offset}, node=self._owner(topic))
+        return response.json()['acked']
 
-    def pull_messages(self, sid, topic):
-        response = requests.post(f'{self.base_url}/pull_messages', json={'sid': sid, 'topic': topic})
-        return response.json().get('messages', [])
+    def stream_messages(self, sid, topic):
+        # Yields messages pushed by the broker over Server-Sent Events. Only the
+        # connect timeout applies: an idle stream can go quiet between heartbeats
+        reconnect = False
+        while True:
+            with self._post('/stream_messages', {'sid': sid, 'topic': topic}, (self.timeout, None),
+                            node=self._owner(topic), stream=True) as response:
+                if reconnect and response.status_code == 404:
+                    return  # Unsubscribed or deleted meanwhile
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if line and line.startswith('data: '):
+                        yield from json.loads(line[len('data: '):])
+            # In a cluster the broker ends a stream when it hands the topic
+            # over; asking again gets redirected to the new owner
+            if len(self.nodes) == 1:
+                return
+            reconnect = True
@@ -1,12 +1,41 @@
 from client_api_controller import ClientAPIController
+from binary_client_api_controller import BinaryClientAPIController
+from in_process_client_api_controller import InProcessClientAPIController
 
 class ClientAPIImpl:
     # Class-level counters shared across all instances
     pid_count = 1
     sid_count = 1
 
-    def __init__(self):
-        self.api_controller = ClientAPIController()
+    def __init__(self, base_url='http://localhost:5000', pool_size=10, timeout=None, retries=3, backoff_factor=0.2,
+                 compression=False, compress_min_bytes=1024, overload_retries=5):
+        # base_url: broker URL, or a list of broker URLs to spread topics over.
+        #   A tcp://host:port address selects the binary protocol instead of
+        #   HTTP: one pipelined connection to a broker's --binary-port. A
+        #   BrokerEngine (server/broker.py) is called directly, in process
+        # pool_size: connections kept alive to each broker and shared by all threads
+        # timeout: seconds to connect and to wait for a response (None waits forever)
+        # retries/backoff_factor: retry policy for failed connections
+        # compression: negotiate gzip for large request and response bodies
+        #   (HTTP only); compress_min_bytes is the smallest request body gzipped
+        # overload_retries: how often a publish rejected by a full topic is
+        #   retried, with jittered backoff, before HTTPError is raised (HTTP only)
+        if not isinstance(base_url, (str, list, tuple)):
+            self.api_controller = InProcessClientAPIController(base_url)
+        elif isinstance(base_url, str) and base_url.startswith('tcp://'):
+            self.api_controller = BinaryClientAPIController(base_url, timeout)
+        else:
+            self.api_controller = ClientAPIController(base_url, pool_size, timeout, retries, backoff_factor,
+                                                      compression, compress_min_bytes, overload_retries)
+
+    def close(self):
+        self.api_controller.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def register_publisher(self):
         # Use class-level counter for publisher ID
@@ -14,8 +43,10 @@ class ClientAPIImpl:
         ClientAPIImpl.pid_count += 1
         return self.api_controller.register_publisher(pid)
 
-    def create_topic(self, pid, topic):
-        self.api_controller.create_topic(pid, topic)
+    def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # overflow: drop_oldest, drop_newest or reject, for publishes that
+        # would break the topic's limits or a subscriber's max_backlog
+        self.api_controller.create_topic(pid, topic, max_messages, max_bytes, max_age_s, overflow)
 
     def delete_topic(self, pid, topic):
         self.api_controller.delete_topic(pid, topic)
@@ -23,14 +54,51 @@ class ClientAPIImpl:
     def send_message(self, pid, topic, message):
         self.api_controller.send_message(pid, topic, message)
 
+    def send_messages(self, pid, topic, messages):
+        return self.api_controller.send_messages(pid, topic, messages)
+
+    def send_batches(self, pid, batches):
+        return self.api_controller.send_batches(pid, batches)
+
+    def topic_stats(self, topic=None):
+        # Retained messages/bytes, evictions and subscribers per topic
+        return self.api_controller.topic_stats(topic)
+
     def register_subscriber(self):
         # Use class-level counter for subscriber ID
         sid = f'S{ClientAPIImpl.sid_count}'
         ClientAPIImpl.sid_count += 1
         return self.api_controller.register_subscriber(sid)
 
-    def subscribe(self, sid, topic):
-        self.api_controller.subscribe(sid, topic)
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        # With group, sid shares the topic's messages with the group's other members;
+        # max_backlog caps how many unread messages sid may have on the topic
+        self.api_controller.subscribe(sid, topic, group, max_backlog)
+
+    def unsubscribe(self, sid, topic):
+        self.api_controller.unsubscribe(sid, topic)
+
+    def unregister_subscriber(self, sid):
+        # Drops all of sid's subscriptions
+        self.api_controller.unregister_subscriber(sid)
+
+    def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        return self.api_controller.pull_messages(sid, topic, wait_ms, max_messages, max_bytes)
+
+    def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        # Messages from every topic sid reads, directly or through patterns,
+        # as {topic: messages}; max_messages is shared fairly between topics
+        return self.api_controller.pull_all(sid, wait_ms, max_messages, max_bytes)
+
+    def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        # At-least-once: returns {'messages', 'offsets'} (per topic for a
+        # pattern) and redelivers the messages unless they are acked in time
+        return self.api_controller.pull_batch(sid, topic, wait_ms, max_messages, max_bytes, visibility_timeout_ms)
+
+    def ack(self, sid, topic, offset):
+        # Acknowledges sid's messages on topic up to and including offset
+        return self.api_controller.ack(sid, topic, offset)
 
-    def pull_messages(self, sid, topic):
-        return self.api_controller.pull_messages(sid, topic)
+    def stream(self, sid, topic):
+        # Generator over messages pushed by the broker as they are published
+        return self.api_controller.stream_messages(sid, topic)
@@ -0,0 +1,63 @@
+import bisect
+import hashlib
+
+
+def partition_key(topic):
+    """The part of a topic name that decides which broker owns it.
+
+    Only the first level counts, so a whole hierarchy ('orders',
+    'orders.eu.created', ...) lives on one broker and a pattern such as
+    'orders.*.created' can be served by that broker alone. Patterns that start
+    with a wildcard could match topics anywhere and have no owner.
+    """
+    key = topic.split('.', 1)[0]
+    if key in ('*', '#'):
+        raise ValueError(f'Pattern {topic} spans all brokers; its first level must be a concrete name')
+    return key
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to nodes.
+
+    Every node is placed at `replicas` points on the ring and a key belongs to
+    the first node point at or after the key's own hash. Adding or removing a
+    node only moves the keys on the arcs that node gains or loses, about 1/N
+    of them, and every process builds the same ring from the same node list.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.points = []  # Sorted hashes of all node points
+        self.owners = {}  # Point hash -> node
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        # md5 rather than hash(): it must agree across processes and hosts
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            point = self._hash(f'{node}#{replica}')
+            self.owners[point] = node
+            bisect.insort(self.points, point)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        for replica in range(self.replicas):
+            point = self._hash(f'{node}#{replica}')
+            del self.owners[point]
+            self.points.pop(bisect.bisect_left(self.points, point))
+
+    def node_for(self, key):
+        if not self.points:
+            raise LookupError('Hash ring has no nodes')
+        index = bisect.bisect_left(self.points, self._hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
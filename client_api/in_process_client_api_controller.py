@@ -0,0 +1,84 @@
+# How long each poll of stream_messages parks on the engine
+STREAM_POLL_MS = 30000
+
+class InProcessClientAPIController:
+    # Same calls as ClientAPIController, made directly on a broker engine
+    # (server/broker.py's BrokerEngine) running in this process: no HTTP, no
+    # serialization, no sockets. Long polls block the calling thread on the
+    # engine itself. Messages are passed by reference, so the object a
+    # publisher sends is the object its subscribers receive; neither side
+    # should modify a message once it is sent. A publish to a full topic
+    # with the reject overflow policy raises the engine's Overloaded right
+    # away: backing off is up to the caller.
+    def __init__(self, engine):
+        self.engine = engine
+
+    def close(self):
+        pass  # The engine belongs to whoever created it
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def register_publisher(self, pid):
+        return self.engine.register_publisher(pid)
+
+    def create_topic(self, pid, topic, max_messages=None, max_bytes=None, max_age_s=None, overflow=None):
+        # The retention limits and overflow policy are optional; the engine's
+        # defaults apply to any left out
+        retention = {'max_messages': max_messages, 'max_bytes': max_bytes, 'max_age_s': max_age_s, 'overflow': overflow}
+        self.engine.create_topic(pid, topic, retention)
+
+    def delete_topic(self, pid, topic):
+        self.engine.delete_topic(pid, topic)
+
+    def send_message(self, pid, topic, message):
+        self.engine.send_message(pid, topic, message)
+
+    def send_messages(self, pid, topic, messages):
+        return self.engine.send_messages(pid, [{'topic': topic, 'messages': messages}])
+
+    def send_batches(self, pid, batches):
+        # batches maps each topic to the list of messages to append to it
+        return self.engine.send_messages(pid, [{'topic': topic, 'messages': messages}
+                                               for topic, messages in batches.items()])
+
+    def topic_stats(self, topic=None):
+        return self.engine.topic_stats(topic)
+
+    def register_subscriber(self, sid):
+        return self.engine.register_subscriber(sid)
+
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        self.engine.subscribe(sid, topic, group, max_backlog)
+
+    def unsubscribe(self, sid, topic):
+        self.engine.unsubscribe(sid, topic)
+
+    def unregister_subscriber(self, sid):
+        self.engine.unregister_subscriber(sid)
+
+    def pull_messages(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None):
+        return self._pull(sid, topic, wait_ms, max_messages, max_bytes)['messages']
+
+    def pull_batch(self, sid, topic, wait_ms=None, max_messages=None, max_bytes=None, visibility_timeout_ms=None):
+        return self._pull(sid, topic, wait_ms, max_messages, max_bytes, True, visibility_timeout_ms)
+
+    def pull_all(self, sid, wait_ms=None, max_messages=None, max_bytes=None):
+        return self._pull(sid, None, wait_ms, max_messages, max_bytes).get('topics', {})
+
+    def _pull(self, sid, topic, wait_ms, max_messages, max_bytes, ack=False, visibility_timeout_ms=None):
+        # Unlike a server, the engine has no worker threads to protect, so
+        # wait_ms isn't capped
+        lease_s = self.engine.lease_time(ack, visibility_timeout_ms)
+        return self.engine.long_poll(sid, topic, (wait_ms or 0) / 1000, max_messages, max_bytes, lease_s)
+
+    def ack(self, sid, topic, offset):
+        return self.engine.ack(sid, topic, offset)['acked']
+
+    def stream_messages(self, sid, topic):
+        # Long polls back to back; the stream ends when the caller stops iterating
+        while True:
+            yield from self.pull_messages(sid, topic, wait_ms=STREAM_POLL_MS)
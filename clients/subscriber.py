@@ -10,7 +10,8 @@ def run_subscriber():
     subscriber = api.register_subscriber()
     sid = subscriber['sid']
     api.subscribe(sid, 'news')
-    messages = api.pull_messages(sid, 'news')
+    # Long poll so we don't miss messages published right after subscribing
+    messages = api.pull_messages(sid, 'news', wait_ms=5000)
     print(f"Messages received: {messages}")
 
 if __name__ == "__main__":
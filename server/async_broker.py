@@ -0,0 +1,296 @@
+import asyncio
+import json
+import math
+import time
+from aiohttp import web
+import broker
+from broker import engine
+import compression
+import metrics
+import request_log
+from topic_log import Overloaded, TopicMoved
+
+# asyncio engine: same endpoints and semantics as the Flask app in
+# message_broker.py, served from a single event loop. Long-polling pulls and
+# streams park on a future instead of a thread, so idle waiters cost a few
+# hundred bytes each rather than an OS thread.
+
+routes = web.RouteTableDef()
+closing = web.AppKey('closing', bool)  # Set once the server starts shutting down
+
+async def wait_for_messages(sid, topic, timeout):
+    """Suspend until sid has something to pull through topic or timeout
+    seconds pass. Returns False on timeout."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+
+    def wake():
+        # Publishes may come from another thread, e.g. a TopicLog shared with a
+        # threaded server, so hop back onto the loop before touching the future
+        loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None))
+
+    if not engine.add_waiter(sid, topic, wake):
+        return True
+    try:
+        await asyncio.wait_for(ready, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        engine.remove_waiter(sid, topic, wake)
+
+async def long_poll(sid, topic, wait_ms=None, max_messages=None, max_bytes=None, lease_s=None, stopping=lambda: False):
+    """Pull sid's messages through topic, parking for up to wait_ms until there
+    are some or stopping() turns true."""
+    wait = broker.wait_time(wait_ms)
+    response = engine.pull_messages(sid, topic, max_messages, max_bytes, lease_s)
+    deadline = time.monotonic() + wait
+    while (not response['messages'] and wait > 0 and not stopping()
+           and engine.subscription_logs(sid, topic) is not None):
+        # Wake-ups without messages park again for the rest of the wait
+        await wait_for_messages(sid, topic, wait)
+        response = engine.pull_messages(sid, topic, max_messages, max_bytes, lease_s)
+        wait = deadline - time.monotonic()
+    if not response['messages'] and engine.owner_of(topic, wait=False) is not None:
+        raise TopicMoved(topic, engine.owner_of(topic, wait=False))  # Handed over while parked
+    return response
+
+async def durable(operation, *args):
+    """Run a state-changing broker operation without stalling the loop."""
+    # With fsync=always the operation blocks until its records are on disk, so
+    # it runs on a worker thread; concurrent requests then share one fsync.
+    # So does any operation while a cluster change is under way, since
+    # owner_of may wait for a handover to finish
+    syncing = engine.wal is not None and engine.wal.fsync == 'always'
+    settling = engine.cluster is not None and not engine.settled.is_set()
+    if syncing or settling:
+        return await asyncio.to_thread(operation, *args)
+    return operation(*args)
+
+# Publisher Endpoints
+@routes.post('/register_publisher')
+async def register_publisher(request):
+    data = await request.json()
+    return web.json_response(engine.register_publisher(data.get('pid')))
+
+@routes.post('/create_topic')
+async def create_topic(request):
+    data = await request.json()
+    retention = {key: data.get(key) for key in broker.RETENTION_LIMITS}
+    return web.json_response(await durable(engine.create_topic, data.get('pid'), data.get('topic'), retention))
+
+@routes.post('/delete_topic')
+async def delete_topic(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.delete_topic, data.get('pid'), data.get('topic')))
+
+@routes.post('/send_message')
+async def send_message(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.send_message, data.get('pid'), data.get('topic'), data.get('message')))
+
+@routes.post('/send_messages')
+async def send_messages(request):
+    data = await request.json()
+    # Either a single topic with a list of messages, or a list of per-topic batches
+    batches = data.get('batches')
+    if batches is None:
+        batches = [{'topic': data.get('topic'), 'messages': data.get('messages', [])}]
+    return web.json_response(await durable(engine.send_messages, data.get('pid'), batches))
+
+# Subscriber Endpoints
+@routes.post('/register_subscriber')
+async def register_subscriber(request):
+    data = await request.json()
+    return web.json_response(engine.register_subscriber(data.get('sid')))
+
+@routes.post('/subscribe')
+async def subscribe(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.subscribe, data.get('sid'), data.get('topic'), data.get('group'),
+                                           data.get('max_backlog')))
+
+@routes.post('/unsubscribe')
+async def unsubscribe(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.unsubscribe, data.get('sid'), data.get('topic')))
+
+@routes.post('/unregister_subscriber')
+async def unregister_subscriber(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.unregister_subscriber, data.get('sid')))
+
+@routes.post('/pull_messages')
+async def pull_messages(request):
+    data = await request.json()
+    lease_s = engine.lease_time(data.get('ack'), data.get('visibility_timeout_ms'))
+    return web.json_response(await long_poll(data.get('sid'), data.get('topic'), data.get('wait_ms'),
+                                             data.get('max_messages'), data.get('max_bytes'), lease_s,
+                                             lambda: request.app[closing]))
+
+@routes.post('/ack')
+async def ack(request):
+    data = await request.json()
+    return web.json_response(await durable(engine.ack, data.get('sid'), data.get('topic'), data.get('offset')))
+
+@routes.post('/stream_messages')
+async def stream_messages(request):
+    data = await request.json()
+    sid = data.get('sid')
+    topic = data.get('topic')
+    if engine.subscription_logs(sid, topic) is None:
+        return web.json_response({'message': f'Subscriber {sid} is not subscribed to topic {topic}'}, status=404)
+
+    stream = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+    await stream.prepare(request)
+    try:
+        while engine.subscription_logs(sid, topic) is not None and not request.app[closing]:
+            messages = engine.pull_messages(sid, topic)['messages']
+            if messages:
+                await stream.write(f"data: {json.dumps(messages)}\n\n".encode())
+                continue
+            if not await wait_for_messages(sid, topic, broker.STREAM_HEARTBEAT_MS / 1000):
+                await stream.write(b": keep-alive\n\n")
+    except ConnectionResetError:
+        pass  # Subscriber went away
+    except TopicMoved:
+        pass  # Handed over to another broker; the subscriber reconnects there
+    return stream
+
+@routes.post('/topic_stats')
+async def topic_stats(request):
+    data = await request.json() if request.can_read_body else {}
+    return web.json_response(engine.topic_stats(data.get('topic')))
+
+@routes.route('*', '/metrics')
+async def get_metrics(request):
+    # Request latencies per route, rates and backlogs per topic, retained totals
+    return web.json_response(metrics.report(list(engine.topics.items())))
+
+# Cluster Endpoints
+@routes.post('/cluster')
+async def cluster(request):
+    return web.json_response(engine.cluster_nodes())
+
+@routes.post('/cluster/update')
+async def update_cluster(request):
+    data = await request.json()
+    return web.json_response(engine.update_cluster(data.get('nodes')))
+
+@routes.post('/cluster/rebalance')
+async def rebalance(request):
+    # Talks to other brokers while holding the broker's locks, so off the loop
+    return web.json_response(await asyncio.to_thread(engine.rebalance))
+
+@routes.post('/cluster/settle')
+async def settle(request):
+    return web.json_response(engine.settle())
+
+@routes.post('/cluster/import')
+async def import_topics(request):
+    data = await request.json()
+    return web.json_response(await asyncio.to_thread(engine.import_topics, data))
+
+@web.middleware
+async def instrument(request, handler):
+    # Request metrics and sampled request logging
+    started = time.perf_counter()
+    logged = request_log.sampled(request.path.strip('/'))
+    status = 500  # Unless the handler answers
+    try:
+        response = await handler(request)
+        status = response.status
+    except web.HTTPException as error:
+        status = error.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        metrics.observe(resource.canonical if resource is not None else 'unmatched', status, time.perf_counter() - started)
+    if logged:
+        try:
+            data = await request.json() if request.body_exists else None  # Already read, so cached
+        except ValueError:
+            data = None
+        request_log.log_request(request.method, request.path.strip('/'), status, started, data)
+    return response
+
+@web.middleware
+async def negotiate_compression(request, handler):
+    # Same negotiation as the Flask engine; aiohttp inflates gzip-encoded
+    # request bodies by itself
+    try:
+        response = await handler(request)
+    except web.RequestPayloadError:
+        return web.Response(status=400, text='Malformed gzip request body')
+    response.headers['Accept-Encoding'] = 'gzip'
+    if type(response) is web.Response and 'Content-Encoding' not in response.headers:
+        body = response.body
+        if isinstance(body, bytes) and compression.wanted(len(body), request.headers.get('Accept-Encoding')):
+            response.body = compression.compress(body)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.add('Vary', 'Accept-Encoding')
+    return response
+
+@web.middleware
+async def route_to_owner(request, handler):
+    """Cluster mode: redirect requests about topics another broker serves."""
+    if engine.cluster is None:
+        return await handler(request)
+    data = await request.json() if request.can_read_body else {}  # aiohttp caches the body for the handler
+    if not isinstance(data, dict):
+        data = {}
+
+    async def owner(topic):
+        if engine.settled.is_set():
+            return engine.owner_of(topic)
+        return await asyncio.to_thread(engine.owner_of, topic)  # May wait for a handover to finish
+
+    batches = data.get('batches')
+    if batches is not None:
+        for batch in batches:
+            if await owner(batch.get('topic')) is not None:
+                # Can't redirect a batch that spans brokers; the client re-splits it
+                return web.json_response({'message': 'Batch contains topics served by other brokers',
+                                          **engine.cluster_nodes()}, status=421)
+        return await handler(request)
+    topic_owner = await owner(data.get('topic'))
+    if topic_owner is not None:
+        return redirect_to(request, topic_owner)
+    try:
+        return await handler(request)
+    except TopicMoved as error:
+        return redirect_to(request, error.owner)
+
+@web.middleware
+async def broker_errors(request, handler):
+    # Out-of-range arguments and publishes to topics at their backlog caps,
+    # same answers as the Flask engine
+    try:
+        return await handler(request)
+    except broker.InvalidArgument as error:
+        return web.json_response({'message': str(error)}, status=400)
+    except Overloaded as error:
+        return web.json_response(engine.overloaded(error), status=429,
+                                 headers={'Retry-After': str(math.ceil(engine.retry_after_ms / 1000))})
+
+def redirect_to(request, owner):
+    # 307 keeps the method and body, so clients can replay the request as is
+    return web.json_response({'message': f'Served by {owner}', 'owner': owner, **engine.cluster_nodes()},
+                             status=307, headers={'Location': f'{owner}{request.path}'})
+
+async def release_waiters(app):
+    # Let parked pulls and streams finish instead of holding up shutdown
+    app[closing] = True
+    engine.wake_all()
+
+def create_app():
+    app = web.Application(middlewares=[instrument, negotiate_compression, route_to_owner, broker_errors])
+    app[closing] = False
+    app.add_routes(routes)
+    app.on_shutdown.append(release_waiters)
+    return app
+
+def run(host='0.0.0.0', port=5000):
+    # A large backlog lets bursts of thousands of new connections queue up in
+    # the kernel instead of being refused
+    web.run_app(create_app(), host=host, port=port, backlog=4096, access_log=None)
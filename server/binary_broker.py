@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from broker import engine
+import async_broker
+import metrics
+from binary_protocol import LENGTH, OPERATIONS, OK, ERROR, encode_frame, decode_frame
+from topic_log import Overloaded, TopicMoved
+
+# Binary engine: the publish/subscribe operations over the length-prefixed TCP
+# protocol in client_api/binary_protocol.py. It runs its own event loop on a
+# background thread next to either HTTP engine and shares the broker state
+# with it, so messages published over one transport can be pulled over the
+# other.
+#
+# Requests on a connection are handled in arrival order and answered as soon
+# as they are done. Only those that may have to wait (long polls, writes with
+# fsync=always, ownership checks during a handover) run as tasks, so a parked
+# pull never holds up the requests pipelined behind it.
+
+# Operations that change state and so may have to wait for their records to be on disk
+DURABLE = {'create_topic', 'delete_topic', 'send_message', 'send_messages',
+           'subscribe', 'unsubscribe', 'unregister_subscriber', 'ack'}
+WRITE_BUFFER_LIMIT = 1 << 20  # Stop reading requests while this many response bytes are unsent
+
+def pull_args(sid, topic, wait_ms=None, max_messages=None, max_bytes=None, ack=False, visibility_timeout_ms=None):
+    # pull_messages arguments in protocol order -> long_poll arguments
+    return sid, topic, wait_ms, max_messages, max_bytes, engine.lease_time(ack, visibility_timeout_ms)
+
+def pull_now(*args):
+    sid, topic, _, max_messages, max_bytes, lease_s = pull_args(*args)
+    return engine.pull_messages(sid, topic, max_messages, max_bytes, lease_s)
+
+HANDLERS = {operation: getattr(engine, operation) for operation in OPERATIONS}
+HANDLERS['pull_messages'] = pull_now
+
+def topics_of(operation, args):
+    # The topics a request is about, for routing in cluster mode
+    if operation == 'send_messages':
+        return [batch.get('topic') for batch in args[1]]
+    if operation == 'topic_stats':
+        return args[:1]
+    if operation in ('register_publisher', 'register_subscriber', 'unregister_subscriber'):
+        return []
+    return args[1:2]
+
+def misrouted(operation, args):
+    """Error response for a request about topics another broker serves, or None."""
+    owners = {engine.owner_of(topic) for topic in topics_of(operation, args)} - {None}
+    if not owners:
+        return None
+    if operation == 'send_messages':
+        return {'message': 'Batch contains topics served by other brokers', **engine.cluster_nodes()}
+    return served_by(owners.pop())
+
+def served_by(owner):
+    # The binary counterpart of the HTTP engines' 307 redirect
+    return {'message': f'Served by {owner}', 'owner': owner, **engine.cluster_nodes()}
+
+def may_suspend(operation, args):
+    if operation == 'pull_messages':
+        return bool(args[2:3] and args[2])
+    if engine.cluster is not None and not engine.settled.is_set():
+        return True  # owner_of may wait for a handover to finish
+    return operation in DURABLE and engine.wal is not None and engine.wal.fsync == 'always'
+
+def serve_now(operation, args):
+    # Serves a request that never waits; returns its response code and value
+    try:
+        error = misrouted(operation, args) if engine.cluster is not None else None
+        if error is not None:
+            return ERROR, error
+        return OK, HANDLERS[operation](*args)
+    except TopicMoved as error:
+        return ERROR, served_by(error.owner)
+    except Overloaded as error:
+        return ERROR, engine.overloaded(error)
+    except Exception as error:
+        return ERROR, {'message': f'{operation} failed: {error}'}
+
+async def serve_later(operation, args):
+    try:
+        error = None
+        if engine.cluster is not None:
+            error = await asyncio.to_thread(misrouted, operation, args)
+        if error is not None:
+            return ERROR, error
+        if operation == 'pull_messages':
+            return OK, await async_broker.long_poll(*pull_args(*args))
+        return OK, await async_broker.durable(HANDLERS[operation], *args)
+    except TopicMoved as error:
+        return ERROR, served_by(error.owner)
+    except Overloaded as error:
+        return ERROR, engine.overloaded(error)
+    except Exception as error:
+        return ERROR, {'message': f'{operation} failed: {error}'}
+
+def respond(writer, request_id, operation, started, code, value):
+    metrics.observe(f'binary:{operation}', 'ok' if code == OK else 'error', time.perf_counter() - started)
+    if not writer.is_closing():
+        writer.write(encode_frame(request_id, code, value))
+
+async def respond_later(writer, request_id, operation, args, started):
+    respond(writer, request_id, operation, started, *await serve_later(operation, args))
+
+async def handle_connection(reader, writer):
+    tasks = set()
+    try:
+        while True:
+            (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            started = time.perf_counter()
+            request_id, code, args = decode_frame(await reader.readexactly(length))
+            if not 0 < code <= len(OPERATIONS):
+                writer.write(encode_frame(request_id, ERROR, {'message': f'Unknown operation {code}'}))
+                continue
+            operation = OPERATIONS[code - 1]
+            if may_suspend(operation, args):
+                task = asyncio.create_task(respond_later(writer, request_id, operation, args, started))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                respond(writer, request_id, operation, started, *serve_now(operation, args))
+            if writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                await writer.drain()  # The client isn't reading its responses; stop reading its requests
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # Client went away
+    finally:
+        # Cancelling a parked pull takes its waiter off the topic
+        for task in list(tasks):
+            task.cancel()
+        writer.close()
+
+async def serve(host, port, started):
+    server = await asyncio.start_server(handle_connection, host, port, backlog=4096)
+    started.set()
+    async with server:
+        await server.serve_forever()
+
+def start(host='0.0.0.0', port=6000):
+    """Serve the binary protocol on a daemon thread; returns once it is listening."""
+    started = threading.Event()
+    failures = []
+
+    def run():
+        try:
+            asyncio.run(serve(host, port, started))
+        except Exception as error:
+            failures.append(error)  # E.g. the port is taken
+            started.set()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    if failures:
+        raise failures[0]
+    return thread
@@ -0,0 +1,787 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+import requests
+from topic_log import OVERFLOW_POLICIES, Overloaded, TopicLog, TopicMoved, message_size
+from topic_trie import TopicTrie, is_pattern, pattern_matches
+from sharded_index import ShardedIndex
+from wal import WriteAheadLog
+
+# The hash ring is shared with the client library, which routes topics the same way
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from hash_ring import HashRing, partition_key
+
+# Broker state and operations, independent of any transport. The Flask,
+# asyncio and binary servers all serve the module's engine; a BrokerEngine of
+# its own can also be embedded in a process and used directly, e.g. through
+# ClientAPIImpl(engine), without any network in between. Every operation takes
+# plain arguments and returns the JSON-ready response body.
+#
+# Operations may run on many threads at once. Publishing and pulling only
+# take the lock of the topic's own log, and the subscription registry is
+# sharded, so operations on different topics never contend; topics_lock is
+# reserved for creating and deleting topics and for pattern subscriptions.
+
+# Upper bound for long-polling pulls so a parked request never holds its
+# worker thread for longer than this
+MAX_WAIT_MS = 30000
+# How often an idle stream sends a keep-alive comment, which is also how a
+# stream notices that its client went away
+STREAM_HEARTBEAT_MS = 15000
+# Per-topic settings, each falling back to the broker's default_retention
+RETENTION_LIMITS = ('max_messages', 'max_bytes', 'max_age_s', 'overflow')
+SETTLE_TIMEOUT_S = 10
+# How long a handover waits for the new owner to take the topics; they stay
+# here, locked meanwhile, so a peer that hangs must not hold them forever
+HANDOVER_TIMEOUT_S = 10
+
+def snapshot_path(directory, segment):
+    return os.path.join(directory, f'snapshot-{segment:06d}.json')
+
+def snapshot_segments(directory):
+    names = [name for name in os.listdir(directory) if name.startswith('snapshot-') and name.endswith('.json')]
+    return sorted(int(name[9:-5]) for name in names)
+
+class InvalidArgument(ValueError):
+    """A request argument is out of range; the engines answer it with 400."""
+
+
+def check_limit(name, value, minimum=1, types=(int,)):
+    # Raises InvalidArgument unless value is None or a number of types >= minimum
+    if value is not None and (isinstance(value, bool) or not isinstance(value, types) or value < minimum):
+        raise InvalidArgument(f'{name} must be a number of at least {minimum}, not {value!r}')
+
+def wait_time(wait_ms):
+    # Seconds a long-polling pull may park for
+    check_limit('wait_ms', wait_ms, 0, (int, float))
+    return min(wait_ms or 0, MAX_WAIT_MS) / 1000
+
+
+class BrokerEngine:
+    """Topics, subscriptions and delivery for one broker."""
+
+    def __init__(self):
+        self.topics = {}  # Topic to its message log
+        # Subscription registry, indexed both ways so membership checks are O(1) and
+        # dropping a topic or subscriber only touches that entity's own subscriptions.
+        # Each index is split into independently locked shards.
+        self.subscribers = ShardedIndex()  # Topic to set of subscribers
+        self.subscriptions = ShardedIndex()  # Subscriber to set of topics
+        # Subscriber to the topics it reads, directly or through patterns, kept
+        # up to date by the topic logs; pull_all asks each log whether there is
+        # anything new before visiting it
+        self.reading = ShardedIndex()
+        # Wildcard subscriptions ('orders.*.created', 'orders.#') are registered
+        # under their pattern in the same registry. Every existing or future topic a
+        # pattern matches gets the pattern's subscribers as readers.
+        self.patterns = TopicTrie()  # Patterns with at least one subscriber
+        self.matched_topics = defaultdict(set)  # Pattern to the existing topics it matches
+        self.pattern_waiters = defaultdict(list)  # (sid, pattern) to callbacks woken when a new topic matches
+        self.waiters_lock = threading.Lock()
+        # Retention limits for topics that don't set their own
+        self.default_retention = {}
+        # How long messages pulled with ack stay leased before they are delivered again
+        self.default_visibility_timeout_ms = 30000
+        # Backlog cap for subscriptions that don't set their own, or None for no cap
+        self.default_max_backlog = None
+        # How long publishers rejected by a full topic are told to wait before retrying
+        self.retry_after_ms = 1000
+        self.wal = None  # WriteAheadLog once persistence is enabled
+        # Held while topics are created or deleted, so a snapshot sees a topic list
+        # that lines up with the write-ahead log position it starts from
+        self.topics_lock = threading.Lock()
+
+        # Cluster mode: each broker serves the topics the hash ring assigns to it
+        # (by the first level of their name) and redirects requests for the others
+        self.cluster = None  # HashRing of broker URLs once clustering is enabled
+        self.node_url = None  # This broker's URL as it appears in the ring
+        # Cleared while topics are being handed between brokers after a membership
+        # change; requests for topics this broker gained wait until it is set again
+        self.settled = threading.Event()
+        self.settled.set()
+
+    # Persistence
+    def enable_persistence(self, directory, fsync='interval', interval_ms=10, snapshot_interval_s=60):
+        """Restore state from the latest snapshot plus the write-ahead log tail in
+        directory, then keep logging (and snapshotting) to it.
+
+        Returns a dict with how long recovery took and how much it replayed.
+        """
+        start_time = time.perf_counter()
+        log = WriteAheadLog(directory, fsync, interval_ms)
+        segment = self.load_snapshot(directory)
+        replayed = 0
+        for record in log.replay(segment):
+            self.apply(record)
+            replayed += 1
+        self.wal = log
+        if snapshot_interval_s:
+            threading.Thread(target=self.snapshot_loop, args=(directory, snapshot_interval_s), name='snapshotter', daemon=True).start()
+        return {'recovery_seconds': time.perf_counter() - start_time, 'snapshot_segment': segment, 'replayed_records': replayed}
+
+    def snapshot_loop(self, directory, interval_s):
+        snapshotted = None
+        while True:
+            time.sleep(interval_s)
+            if self.wal.appended != snapshotted:  # Nothing to gain while idle
+                snapshotted = self.wal.appended
+                self.write_snapshot(directory)
+
+    def write_snapshot(self, directory):
+        """Write a compact snapshot of topics, subscribers and offsets and drop
+        the log segments it makes redundant."""
+        with self.topics_lock:
+            # Every record from here on goes to the new segment; everything
+            # already in older segments is reflected in the state captured below
+            segment = self.wal.rotate()
+            logs = list(self.topics.items())
+            subscriber_lists = {topic: sorted(sids) for topic, sids in self.subscribers.items()}
+        # Each topic is captured under its own lock. Records for it that land in
+        # the new segment meanwhile are either already in the capture or not, and
+        # replay skips the ones that are (they carry their offsets)
+        state = {
+            'segment': segment,
+            'topics': {topic: log.snapshot() for topic, log in logs},
+            'subscribers': subscriber_lists,
+        }
+        path = snapshot_path(directory, segment)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+        for old in snapshot_segments(directory):
+            if old < segment:
+                os.remove(snapshot_path(directory, old))
+        self.wal.truncate_before(segment)
+        return segment
+
+    def load_snapshot(self, directory):
+        # Restores the newest snapshot, if any, and returns the log segment to
+        # replay from
+        segments = snapshot_segments(directory)
+        if not segments:
+            return 1
+        with open(snapshot_path(directory, segments[-1]), encoding='utf-8') as file:
+            state = json.load(file)
+        for topic, log_state in state['topics'].items():
+            self.topics[topic] = TopicLog.restore(topic, self.journal, log_state, self.reading)
+        for topic, sids in state['subscribers'].items():
+            if is_pattern(topic):
+                self.add_pattern(topic)
+            for sid in sids:
+                self.add_subscription(sid, topic)
+        return state['segment']
+
+    def journal(self, record):
+        if self.wal is not None:
+            self.wal.append(record)
+
+    def commit(self):
+        # Under the 'always' fsync policy, wait until this request's records are on disk
+        if self.wal is not None:
+            self.wal.sync()
+
+    def apply(self, record):
+        # Replays one journal record onto the in-memory state
+        op = record['op']
+        topic = record['topic']
+        if op == 'create_topic':
+            self.create_topic(None, topic, record.get('retention'))
+            return
+        if op == 'import_topic':
+            with self.topics_lock:
+                self.restore_topic(topic, record['state'])
+            return
+        if op == 'delete_topic':
+            self.delete_topic(None, topic)
+            return
+        if op == 'subscribe_pattern':
+            self.subscribe(record['sid'], topic)
+            return
+        if op == 'unsubscribe_pattern':
+            self.unsubscribe(record['sid'], topic)
+            return
+        log = self.topics.get(topic)
+        if log is None:
+            return  # Raced with the topic's deletion when it was logged
+        # Records with 'via' change a reader a pattern subscription still needs
+        # (or brought in), but leave the topic subscription alone
+        if op == 'subscribe':
+            if 'via' not in record:
+                self.add_subscription(record['sid'], topic)
+            if record['sid'] not in log.members:
+                log.add_reader(record['sid'], max_backlog=record.get('max_backlog'))
+        elif op == 'join_group':
+            self.add_subscription(record['sid'], topic)
+            log.join(record['sid'], record['group'])
+        elif op == 'leave_group':
+            self.remove_subscription(record['sid'], topic)
+            log.leave(record['sid'])
+        elif op == 'unsubscribe':
+            self.remove_subscription(record['sid'], topic)
+            if 'via' not in record:
+                log.remove_reader(record['sid'])
+        elif op in ('publish', 'discard'):
+            messages = record['messages'] if op == 'publish' else [None] * record['count']
+            # Skip whatever part of the record a snapshot already covers
+            covered = max(log.end - record['offset'], 0)
+            if covered < len(messages):
+                log.extend(messages[covered:], record.get('time'), admit=False)
+        elif op == 'ack' and record['sid'] in log.offsets:
+            log.seek(record['sid'], record['offset'])
+
+    # Publisher operations
+    def register_publisher(self, pid):
+        return {'pid': pid}
+
+    def create_topic(self, pid, topic, retention=None):
+        # retention overrides default_retention for this topic; None values are ignored
+        if is_pattern(topic):
+            return {'message': f'Topic {topic} not created: topic names cannot contain wildcards'}
+        retention = retention or {}
+        overflow = retention.get('overflow')
+        if overflow is not None and overflow not in OVERFLOW_POLICIES:
+            return {'message': f"Topic {topic} not created: overflow must be one of {', '.join(OVERFLOW_POLICIES)}"}
+        check_limit('max_messages', retention.get('max_messages'))
+        check_limit('max_bytes', retention.get('max_bytes'))
+        max_age_s = retention.get('max_age_s')
+        check_limit('max_age_s', max_age_s, 0, (int, float))
+        if max_age_s == 0:
+            raise InvalidArgument('max_age_s must be more than 0, not 0')
+        # owner_of may wait for a handover to finish, and the import that ends
+        # it needs topics_lock, so the owner is looked up before taking the lock
+        owner = self.owner_of(topic)
+        if owner is not None:
+            raise TopicMoved(topic, owner)  # Handed over since the request was routed here
+        woken = []
+        with self.topics_lock:
+            owner = self.owner_of(topic, wait=False)  # Unless it moved meanwhile
+            if owner is not None:
+                raise TopicMoved(topic, owner)
+            if topic not in self.topics:
+                limits = dict(self.default_retention)
+                limits.update({key: value for key, value in retention.items() if value is not None})
+                self.journal({'op': 'create_topic', 'topic': topic, 'retention': limits})
+                log = self.topics[topic] = TopicLog(topic, self.journal, limits, self.reading)
+                # Pattern subscribers pick the new topic up right away
+                for pattern in self.patterns.match(topic):
+                    self.matched_topics[pattern].add(topic)
+                    for sid in self.subscribers.get(pattern):
+                        log.add_reader(sid, via=pattern, max_backlog=self.default_max_backlog)
+                        woken.append((sid, pattern))
+        for sid, pattern in woken:
+            self.wake_pattern_waiters(sid, pattern)
+        self.commit()
+        return {'message': f'Topic {topic} created by Publisher {pid}'}
+
+    def delete_topic(self, pid, topic):
+        with self.topics_lock:
+            log = self.remove_topic(topic)
+        if log is not None:
+            # Release any long-polling pulls parked on the topic
+            log.wake_all()
+        self.commit()
+        return {'message': f'Topic {topic} deleted by Publisher {pid}'}
+
+    def remove_topic(self, topic):
+        # Drops topic with its messages, offsets and subscriptions and returns its
+        # log, if it existed; the caller holds topics_lock
+        log = self.topics.pop(topic, None)
+        for sid in self.subscribers.get(topic):
+            self.remove_subscription(sid, topic)
+        if log is not None:
+            self.journal({'op': 'delete_topic', 'topic': topic})
+            for pattern in self.patterns.match(topic):
+                self.matched_topics[pattern].discard(topic)
+            self.patterns.forget(topic)
+        return log
+
+    def restore_topic(self, topic, state):
+        # Installs a topic handed over by another broker; the caller holds topics_lock
+        log = self.topics[topic] = TopicLog.restore(topic, self.journal, state, self.reading)
+        for pattern in self.patterns.match(topic):
+            self.matched_topics[pattern].add(topic)
+            for sid in self.subscribers.get(pattern):
+                log.add_reader(sid, via=pattern, max_backlog=self.default_max_backlog)
+        return log
+
+    def send_message(self, pid, topic, message):
+        # Raises Overloaded when the topic rejects messages beyond its caps
+        # One lookup, so a concurrent delete_topic can't remove the topic
+        # between checking for it and using it
+        log = self.topics.get(topic)
+        if log is not None:
+            # Stored once in the topic log; subscribers read it through their offsets
+            log.append(message)
+            self.commit()
+        return {'message': f'Message sent to topic {topic} by Publisher {pid}'}
+
+    def send_messages(self, pid, batches):
+        # batches is a list of {'topic': ..., 'messages': [...]} dicts. Batches
+        # for topics that reject them as full are left out, and Overloaded
+        # lists those topics once the others are committed
+        count = 0
+        rejected = []
+        for batch in batches:
+            topic = batch.get('topic')
+            messages = batch.get('messages', [])
+            log = self.topics.get(topic)
+            if log is not None:
+                try:
+                    log.extend(messages)
+                except Overloaded:
+                    rejected.append(topic)
+                    continue
+                count += len(messages)
+        self.commit()
+        if rejected:
+            raise Overloaded(rejected, count)
+        return {'message': f'{count} messages sent by Publisher {pid}', 'count': count}
+
+    # Subscriber operations
+    def register_subscriber(self, sid):
+        return {'sid': sid}
+
+    def unregister_subscriber(self, sid):
+        # Drops every subscription sid holds
+        for topic in self.subscriptions.get(sid):
+            self.unsubscribe(sid, topic)
+        return {'message': f'Subscriber {sid} unregistered'}
+
+    def subscribe(self, sid, topic, group=None, max_backlog=None):
+        """Subscribe sid to topic. Subscribing again is a no-op: sid keeps its
+        offset and gets every message once. With group, sid joins that consumer
+        group on the topic instead and gets only its share of the messages: each
+        one goes to exactly one member of the group. max_backlog caps how many
+        unread messages sid may have on the topic (default_max_backlog if
+        None); the topic's overflow policy decides what gives way."""
+        check_limit('max_backlog', max_backlog, 0)
+        if is_pattern(topic):
+            if group is not None:
+                return {'message': f'Subscriber {sid} not subscribed to {topic}: consumer groups need a topic, not a pattern'}
+            return self.subscribe_pattern(sid, topic)
+        log = self.topics.get(topic)
+        if log is not None and group is not None:
+            if not self.subscribers.contains(topic, sid):
+                if not log.join(sid, group):
+                    return {'message': f'Subscriber {sid} not added to group {group}: it already reads topic {topic} through a pattern'}
+                self.add_subscription(sid, topic)
+            self.commit()
+            return {'message': f'Subscriber {sid} subscribed to topic {topic} in group {group}'}
+        if log is not None:
+            if not self.subscribers.contains(topic, sid):
+                self.add_subscription(sid, topic)
+                if max_backlog is None:
+                    max_backlog = self.default_max_backlog
+                if not log.add_reader(sid, max_backlog=max_backlog):
+                    # Already reading the topic through a pattern, so add_reader
+                    # logged nothing; the subscription itself still has to be logged
+                    self.journal({'op': 'subscribe', 'topic': topic, 'sid': sid})
+            self.commit()
+        return {'message': f'Subscriber {sid} subscribed to topic {topic}'}
+
+    def subscribe_pattern(self, sid, pattern):
+        with self.topics_lock:
+            if not self.subscribers.contains(pattern, sid):
+                self.journal({'op': 'subscribe_pattern', 'topic': pattern, 'sid': sid})
+                if pattern not in self.subscribers:
+                    self.add_pattern(pattern)
+                self.add_subscription(sid, pattern)
+                for topic in self.matched_topics[pattern]:
+                    self.topics[topic].add_reader(sid, via=pattern, max_backlog=self.default_max_backlog)
+        self.commit()
+        return {'message': f'Subscriber {sid} subscribed to topic {pattern}'}
+
+    def unsubscribe(self, sid, topic):
+        if is_pattern(topic):
+            return self.unsubscribe_pattern(sid, topic)
+        log = self.topics.get(topic)
+        if log is not None and self.subscribers.contains(topic, sid):
+            self.remove_subscription(sid, topic)
+            via = self.reading_via(sid, topic)
+            if sid in log.members:
+                log.leave(sid)  # Hands whatever sid still holds to the rest of its group
+            elif via is None:
+                # Also releases pulls and streams sid has parked on the topic
+                log.remove_reader(sid)
+            else:
+                self.journal({'op': 'unsubscribe', 'topic': topic, 'sid': sid, 'via': via})
+            self.commit()
+        return {'message': f'Subscriber {sid} unsubscribed from topic {topic}'}
+
+    def unsubscribe_pattern(self, sid, pattern):
+        with self.topics_lock:
+            if self.subscribers.contains(pattern, sid):
+                self.journal({'op': 'unsubscribe_pattern', 'topic': pattern, 'sid': sid})
+                self.remove_subscription(sid, pattern)
+                matched = self.matched_topics[pattern]
+                if pattern not in self.subscribers:
+                    self.patterns.remove(pattern)
+                    del self.matched_topics[pattern]
+                for topic in matched:
+                    if not self.subscribers.contains(topic, sid) and self.reading_via(sid, topic) is None:
+                        self.topics[topic].remove_reader(sid)
+        self.wake_pattern_waiters(sid, pattern)
+        self.commit()
+        return {'message': f'Subscriber {sid} unsubscribed from topic {pattern}'}
+
+    def add_pattern(self, pattern):
+        self.patterns.add(pattern)
+        self.matched_topics[pattern] = {topic for topic in self.topics if pattern_matches(pattern, topic)}
+
+    def reading_via(self, sid, topic):
+        # A pattern sid is subscribed to that matches topic, if any
+        return next((pattern for pattern in self.patterns.match(topic) if self.subscriptions.contains(sid, pattern)), None)
+
+    def add_subscription(self, sid, topic):
+        self.subscribers.add(topic, sid)
+        self.subscriptions.add(sid, topic)
+
+    def remove_subscription(self, sid, topic):
+        self.subscribers.discard(topic, sid)
+        self.subscriptions.discard(sid, topic)
+
+    def subscription_log(self, sid, topic):
+        # The log sid reads topic from, or None when it does not read it, either
+        # through a subscription to the topic or through a matching pattern
+        log = self.topics.get(topic)
+        if log is not None and (sid in log.offsets or sid in log.members):
+            return log
+        return None
+
+    def subscription_logs(self, sid, topic):
+        """(topic, log) pairs sid pulls from when it asks for topic, which may be a
+        pattern or None for all of sid's topics, or None when sid is not
+        subscribed to it."""
+        if topic is None:
+            names = self.subscriptions.get(sid)
+            if not names:
+                return None
+            logs = {}
+            for name in names:
+                logs.update(self.subscription_logs(sid, name) or ())
+            return sorted(logs.items())
+        if is_pattern(topic):
+            if not self.subscribers.contains(topic, sid):
+                return None
+            names = sorted(self.matched_topics.get(topic, ()))
+            logs = [(name, self.topics.get(name)) for name in names]
+            return [(name, log) for name, log in logs if log is not None]
+        log = self.subscription_log(sid, topic)
+        return None if log is None else [(topic, log)]
+
+    def pull_messages(self, sid, topic, max_messages=None, max_bytes=None, lease_s=None):
+        """The next messages sid has not read through topic: at most max_messages
+        of them, and no more than max_bytes beyond the first. Without lease_s they
+        count as read at once. With lease_s they are only leased: the response
+        carries their offsets, and they are delivered again unless acknowledged
+        within lease_s seconds. A topic of None pulls from all of sid's topics.
+        Raises InvalidArgument unless the limits are positive integers."""
+        check_limit('max_messages', max_messages)
+        check_limit('max_bytes', max_bytes)
+        if topic is None:
+            return self.pull_all(sid, max_messages, max_bytes, lease_s)
+        logs = self.subscription_logs(sid, topic)
+        if not is_pattern(topic):
+            if not logs:
+                return {'messages': [], 'offsets': []} if lease_s is not None else {'messages': []}
+            first, messages = self.take(logs[0][1], sid, max_messages, max_bytes, lease_s)
+            if lease_s is None:
+                return {'messages': messages}
+            return {'messages': messages, 'offsets': list(range(first, first + len(messages)))}
+        return self.gather(sid, logs or [], max_messages, max_bytes, lease_s)
+
+    def pull_all(self, sid, max_messages=None, max_bytes=None, lease_s=None):
+        """Like a pattern pull, but across every topic sid reads, directly or
+        through patterns. Topics where sid has read everything are skipped
+        without taking their locks, but every one of them is looked at: that
+        keeps publishes from having to touch idle subscribers."""
+        logs = []
+        for name in sorted(self.reading.get(sid)):
+            log = self.topics.get(name)
+            if log is None or log.moved_to is not None:
+                self.reading.discard(sid, name)  # Deleted or handed over since
+            elif not log.caught_up(sid):
+                logs.append((name, log))
+        return self.gather(sid, logs, max_messages, max_bytes, lease_s)
+
+    def gather(self, sid, logs, max_messages, max_bytes, lease_s):
+        # Pulls from several topics at once. With max_messages each topic first
+        # gets an equal share so a busy topic can't starve the others, then
+        # whatever is left over goes to topics with more to read.
+        by_topic = {}
+        offsets = {}
+        remaining = max_messages
+        remaining_bytes = max_bytes
+        for rounds in range(2):
+            for index, (name, log) in enumerate(logs):
+                if remaining == 0 or (remaining_bytes is not None and remaining_bytes <= 0):
+                    break
+                if remaining is None:
+                    share = None
+                elif rounds == 0:
+                    share = max(remaining // (len(logs) - index), 1)
+                else:
+                    share = remaining
+                first, batch = self.take(log, sid, share, remaining_bytes, lease_s)
+                if batch:
+                    by_topic.setdefault(name, []).extend(batch)
+                    if lease_s is not None:
+                        offsets.setdefault(name, []).extend(range(first, first + len(batch)))
+                    if remaining is not None:
+                        remaining -= len(batch)
+                    if remaining_bytes is not None:
+                        remaining_bytes -= sum(message_size(message) for message in batch)
+            if not remaining:
+                break
+        response = {'messages': [message for batch in by_topic.values() for message in batch], 'topics': by_topic}
+        if lease_s is not None:
+            response['offsets'] = offsets
+        return response
+
+    def take(self, log, sid, max_messages, max_bytes, lease_s):
+        # (offset of the first message, messages) from one log; see pull_messages
+        if lease_s is None:
+            return None, log.read(sid, max_messages, max_bytes)
+        return log.lease(sid, lease_s, max_messages, max_bytes)
+
+    def ack(self, sid, topic, offset):
+        # Acknowledges sid's leased messages on topic up to and including offset.
+        # topic is always a concrete topic, also for messages pulled through a pattern
+        if offset is None:
+            raise InvalidArgument('offset is required')
+        check_limit('offset', offset, 0)
+        log = self.subscription_log(sid, topic)
+        if log is None or not log.ack(sid, offset):
+            return {'message': f'Nothing to acknowledge for Subscriber {sid} on topic {topic} up to offset {offset}',
+                    'acked': False}
+        self.commit()
+        return {'message': f'Subscriber {sid} acknowledged topic {topic} up to offset {offset}', 'acked': True}
+
+    def add_waiter(self, sid, topic, callback):
+        """Park callback until sid has something to pull through topic. Returns
+        False without parking when it already has, or is not subscribed."""
+        logs = self.subscription_logs(sid, topic)
+        if logs is None:
+            return False
+        # Topics created while parked have to wake pattern subscribers too
+        for pattern in self.waited_patterns(sid, topic):
+            with self.waiters_lock:
+                self.pattern_waiters[sid, pattern].append(callback)
+        for _, log in logs:
+            if not log.add_waiter(sid, callback):
+                self.remove_waiter(sid, topic, callback)
+                return False
+        return True
+
+    def remove_waiter(self, sid, topic, callback):
+        for _, log in self.subscription_logs(sid, topic) or ():
+            log.remove_waiter(sid, callback)
+        for pattern in self.waited_patterns(sid, topic):
+            with self.waiters_lock:
+                callbacks = self.pattern_waiters.get((sid, pattern))
+                if callbacks and callback in callbacks:
+                    callbacks.remove(callback)
+                    if not callbacks:
+                        del self.pattern_waiters[sid, pattern]
+
+    def waited_patterns(self, sid, topic):
+        # The patterns whose new topics concern a pull through topic
+        if topic is None:
+            return [name for name in self.subscriptions.get(sid) if is_pattern(name)]
+        return [topic] if is_pattern(topic) else []
+
+    def wake_pattern_waiters(self, sid, pattern):
+        with self.waiters_lock:
+            callbacks = self.pattern_waiters.pop((sid, pattern), [])
+        for callback in callbacks:
+            callback()
+
+    def wait(self, sid, topic, timeout):
+        """Block the calling thread until sid has something to pull through topic
+        or timeout seconds pass. Returns False on timeout."""
+        ready = threading.Event()
+        if not self.add_waiter(sid, topic, ready.set):
+            return True
+        woken = ready.wait(timeout)
+        self.remove_waiter(sid, topic, ready.set)
+        return woken
+
+    def long_poll(self, sid, topic, wait, max_messages=None, max_bytes=None, lease_s=None):
+        """pull_messages, but when there is nothing to pull yet, block the
+        calling thread for up to wait seconds until there is. Raises
+        TopicMoved when topic was handed over to another broker meanwhile."""
+        response = self.pull_messages(sid, topic, max_messages, max_bytes, lease_s)
+        deadline = time.monotonic() + wait
+        while not response['messages'] and wait > 0 and self.subscription_logs(sid, topic) is not None:
+            # Wake-ups without messages (e.g. a new topic matching a pattern)
+            # park again for whatever is left of the wait
+            self.wait(sid, topic, wait)
+            response = self.pull_messages(sid, topic, max_messages, max_bytes, lease_s)
+            wait = deadline - time.monotonic()
+        if not response['messages'] and self.owner_of(topic, wait=False) is not None:
+            raise TopicMoved(topic, self.owner_of(topic, wait=False))  # Handed over while parked
+        return response
+
+    def wake_all(self):
+        # Releases every parked pull and stream, e.g. on shutdown
+        for log in list(self.topics.values()):
+            log.wake_all()
+        with self.waiters_lock:
+            callbacks = [callback for parked in self.pattern_waiters.values() for callback in parked]
+            self.pattern_waiters.clear()
+        for callback in callbacks:
+            callback()
+
+    def topic_stats(self, topic=None):
+        """Retained messages/bytes, evictions and subscriber count per topic, plus totals."""
+        if topic is None:
+            logs = list(self.topics.items())
+        else:
+            log = self.topics.get(topic)
+            logs = [] if log is None else [(topic, log)]
+        stats = {name: log.stats() for name, log in logs}
+        totals = {key: sum(entry[key] for entry in stats.values()) for key in ('messages', 'bytes', 'evicted', 'dropped')}
+        return {'topics': stats, 'totals': totals}
+
+    def overloaded(self, error):
+        # Response body for a publish rejected with Overloaded
+        return {'message': f'{error}; retry in {self.retry_after_ms} ms', 'topics': error.topics,
+                'count': error.count, 'retry_after_ms': self.retry_after_ms}
+
+    def lease_time(self, ack, visibility_timeout_ms=None):
+        # Seconds messages pulled with ack stay leased, or None for pulls that
+        # acknowledge right away
+        if not ack:
+            return None
+        check_limit('visibility_timeout_ms', visibility_timeout_ms, 0, (int, float))
+        if visibility_timeout_ms is None:
+            visibility_timeout_ms = self.default_visibility_timeout_ms
+        return visibility_timeout_ms / 1000
+
+    # Cluster operations
+    def enable_cluster(self, url, nodes):
+        """Serve only the topics the ring over nodes assigns to url, this broker's
+        own URL, and redirect requests for the rest."""
+        self.node_url = url
+        self.cluster = HashRing(nodes)
+
+    def cluster_nodes(self):
+        return {'node': self.node_url, 'nodes': list(self.cluster.nodes) if self.cluster is not None else []}
+
+    def owner_of(self, topic, wait=True):
+        """URL of the broker that serves topic (or pattern), or None when this one does.
+
+        A broker keeps serving the topics it still holds until it has handed them
+        over, so nothing is redirected to a broker that doesn't have it yet. With
+        wait, a topic this broker just gained is only reported once the previous
+        owner has had time to hand it over.
+        """
+        if self.cluster is None or topic is None or topic in self.topics or topic in self.subscribers:
+            return None
+        try:
+            owner = self.cluster.node_for(partition_key(topic))
+        except ValueError:
+            return None  # A pattern spanning all brokers is served wherever it lands
+        if owner != self.node_url:
+            return owner
+        if wait and not self.settled.is_set():
+            # Ours now, but the previous owner may still be handing it over
+            self.settled.wait(SETTLE_TIMEOUT_S)
+        return None
+
+    def update_cluster(self, nodes):
+        # First phase of a membership change: every broker learns the new ring
+        # before any topic moves, so redirects never bounce between old and new owners
+        self.settled.clear()
+        self.cluster = HashRing(nodes)
+        return self.cluster_nodes()
+
+    def rebalance(self):
+        """Second phase: hand every topic and pattern subscription this broker no
+        longer owns over to its new owner."""
+        with self.topics_lock:
+            by_owner = defaultdict(list)
+            names = list(self.topics) + [name for name, _ in self.subscribers.items() if is_pattern(name)]
+            for name in names:
+                try:
+                    owner = self.cluster.node_for(partition_key(name))
+                except ValueError:
+                    continue
+                if owner != self.node_url:
+                    by_owner[owner].append(name)
+            for owner, owned in by_owner.items():
+                self.hand_over(owner, owned)
+        self.commit()
+        return {'moved': {owner: sorted(owned) for owner, owned in by_owner.items()}}
+
+    def settle(self):
+        # Last phase: all handovers are done
+        self.settled.set()
+        return self.cluster_nodes()
+
+    def hand_over(self, owner, names):
+        # Sends topics and pattern subscriptions to owner and forgets them here.
+        # The topics' logs stay locked throughout, so no publish or pull can slip
+        # in between the copy and the removal; requests queued on them fail with
+        # TopicMoved afterwards and get redirected. If owner doesn't take them
+        # within HANDOVER_TIMEOUT_S the error propagates and the topics stay
+        # here, unlocked again. The caller holds topics_lock.
+        logs = [self.topics[name] for name in names if name in self.topics]
+        for log in logs:
+            log.lock.acquire()
+        try:
+            state = {
+                'topics': {log.name: log.state() for log in logs},
+                'subscribers': {name: sorted(self.subscribers.get(name)) for name in names},
+            }
+            requests.post(f'{owner}/cluster/import', json=state, timeout=HANDOVER_TIMEOUT_S).raise_for_status()
+            for log in logs:
+                log.moved_to = owner
+        finally:
+            for log in logs:
+                log.lock.release()
+
+        woken = []
+        for name in names:
+            if is_pattern(name):
+                for sid in self.subscribers.get(name):
+                    self.journal({'op': 'unsubscribe_pattern', 'topic': name, 'sid': sid})
+                    self.remove_subscription(sid, name)
+                    woken.append((sid, name))
+                self.patterns.remove(name)
+                self.matched_topics.pop(name, None)
+            else:
+                self.remove_topic(name)
+        # Parked pulls and streams find the topic gone and are sent to the new owner
+        for log in logs:
+            log.wake_all()
+        for sid, pattern in woken:
+            self.wake_pattern_waiters(sid, pattern)
+
+    def import_topics(self, state):
+        """Take over topics and pattern subscriptions handed over by another broker."""
+        with self.topics_lock:
+            for name, log_state in state['topics'].items():
+                self.journal({'op': 'import_topic', 'topic': name, 'state': log_state})
+                self.restore_topic(name, log_state)
+            for name, sids in state['subscribers'].items():
+                for sid in sids:
+                    if is_pattern(name):
+                        self.journal({'op': 'subscribe_pattern', 'topic': name, 'sid': sid})
+                        if name not in self.subscribers:
+                            self.add_pattern(name)
+                    else:
+                        self.journal({'op': 'subscribe', 'topic': name, 'sid': sid})
+                    self.add_subscription(sid, name)
+        self.commit()
+        return {'message': f"Imported {len(state['topics'])} topics"}
+
+
+# The engine the HTTP and binary servers serve
+engine = BrokerEngine()
@@ -0,0 +1,53 @@
+import argparse
+import requests
+
+# Changes the membership of a broker cluster. Every broker that is or will be
+# a member first learns the new hash ring, then the brokers hand the topics
+# they no longer own to their new owners one at a time, and finally all of
+# them are told the handover is over. Only topics whose owner changes move.
+#
+#   python server/cluster_admin.py http://host1:5000 http://host2:5000 http://host3:5000
+#
+# Adding a node: start it with --cluster listing the new membership, then run
+# this with the same list. Removing a node: run this without it; once it has
+# handed its topics over it can be stopped.
+
+def current_members(nodes):
+    """Union of the memberships reported by every reachable broker in nodes."""
+    members = []
+    for node in nodes:
+        try:
+            reported = requests.post(f'{node}/cluster', json={}).json()['nodes']
+        except requests.exceptions.ConnectionError:
+            continue
+        members += [member for member in reported if member not in members]
+    return members
+
+def set_members(nodes):
+    affected = current_members(nodes)
+    affected += [node for node in nodes if node not in affected]
+    for node in affected:
+        requests.post(f'{node}/cluster/update', json={'nodes': nodes}).raise_for_status()
+    moved = {}
+    # One broker at a time: a handover holds the sender's locks while it
+    # imports into the receiver
+    for node in affected:
+        response = requests.post(f'{node}/cluster/rebalance', json={})
+        response.raise_for_status()
+        moved[node] = response.json()['moved']
+    for node in affected:
+        requests.post(f'{node}/cluster/settle', json={}).raise_for_status()
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description='Set the members of a broker cluster and rebalance topics')
+    parser.add_argument('nodes', nargs='+', help='URLs of all brokers that should be members')
+    args = parser.parse_args()
+    moved = set_members(args.nodes)
+    for node, handed_over in moved.items():
+        count = sum(len(topics) for topics in handed_over.values())
+        print(f"{node}: handed over {count} topics/patterns" +
+              ''.join(f"\n  {len(topics)} to {owner}" for owner, topics in handed_over.items()))
+
+if __name__ == '__main__':
+    main()
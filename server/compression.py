@@ -0,0 +1,73 @@
+import gzip
+import json
+import zlib
+
+# Payload compression, shared by both HTTP engines and the topic logs.
+#
+# On the wire, bodies are gzip-compressed only when both sides agree: a
+# response is compressed when the request listed gzip in Accept-Encoding, and
+# every response advertises 'Accept-Encoding: gzip' (RFC 7694) so clients know
+# they may send gzip-compressed request bodies. Bodies below min_bytes are
+# sent as they are, since compressing them costs more than it saves.
+#
+# At rest, topic logs can keep large messages zlib-compressed to save memory,
+# paying for it with a decompression on every delivery.
+
+min_bytes = 1024  # Smallest body compressed on the wire; 0 turns it off
+level = 1  # zlib level: the fastest one already gets most of the gain on JSON
+at_rest_min_bytes = None  # Smallest message kept compressed in a topic log; None keeps all as they are
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header value allows a gzip response."""
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def wanted(size, accept_encoding):
+    # Whether a response body of size bytes should go out compressed
+    return 0 < min_bytes <= size and accepts_gzip(accept_encoding)
+
+
+# What decompress() raises for a malformed body
+ERRORS = (OSError, EOFError, zlib.error)
+
+
+def compress(data):
+    return gzip.compress(data, level, mtime=0)
+
+
+def decompress(data):
+    return gzip.decompress(data)
+
+
+class Packed:
+    """A message kept zlib-compressed in a topic log."""
+
+    __slots__ = ('data', 'text')
+
+    def __init__(self, message):
+        self.text = isinstance(message, str)
+        raw = message if self.text else json.dumps(message)
+        self.data = zlib.compress(raw.encode(), level)
+
+    def unpack(self):
+        raw = zlib.decompress(self.data).decode()
+        return raw if self.text else json.loads(raw)
+
+
+def pack(message, size):
+    # The form message is stored in, given its size
+    if at_rest_min_bytes is not None and size >= at_rest_min_bytes:
+        return Packed(message)
+    return message
+
+
+def unpack_all(messages):
+    # The stored messages as they were published
+    if at_rest_min_bytes is None:
+        return messages
+    return [message.unpack() if type(message) is Packed else message for message in messages]
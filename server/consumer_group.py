@@ -0,0 +1,109 @@
+import bisect
+import math
+
+# Members that haven't pulled for this long stop counting towards the fair
+# share, and the messages they hold leased are handed to the other members
+member_timeout_s = 30.0
+
+
+class ConsumerGroup:
+    """Delivery state of one consumer group on a topic.
+
+    The group reads the topic's log as a single reader, so the log keeps
+    messages until the group as a whole is done with them, and its members
+    compete for them: every pull hands the member the next contiguous range
+    no other member holds, at most a fair share of what is available.
+    Ranges whose lease runs out, or whose member stopped pulling or left, go
+    back to the group and are handed out again before newer messages.
+
+    Not thread-safe: the TopicLog owning the group calls it under its lock.
+    """
+
+    def __init__(self, name, start):
+        self.name = name
+        self.reader = f'group:{name}'  # The group's reader in the topic log
+        self.next = start  # First offset never handed out
+        self.released = []  # Sorted (start, end) ranges to hand out again
+        self.leased = {}  # Start -> (end, member, deadline) of leased ranges
+        self.members = {}  # Member -> time of its last pull
+
+    def low(self):
+        # The group is done with every message before this offset
+        return min([self.next] + [start for start, _ in self.released[:1]] + list(self.leased))
+
+    def skip_to(self, offset):
+        # Forgets everything before offset, e.g. once retention evicted it
+        self.next = max(self.next, offset)
+        while self.released and self.released[0][0] < offset:
+            start, end = self.released.pop(0)
+            if end > offset:
+                self.released.insert(0, (offset, end))
+                break
+        for start, (end, member, deadline) in list(self.leased.items()):
+            if start < offset:
+                del self.leased[start]
+                if end > offset:
+                    self.leased[offset] = (end, member, deadline)
+
+    def expire(self, now):
+        # Takes back ranges whose lease ran out or whose member stopped pulling
+        cutoff = now - member_timeout_s
+        for start, (end, member, deadline) in list(self.leased.items()):
+            if deadline <= now or self.members.get(member, 0) < cutoff:
+                del self.leased[start]
+                bisect.insort(self.released, (start, end))
+
+    def release(self, member):
+        # Takes back every range member holds, e.g. once it left
+        for start, (end, owner, _) in list(self.leased.items()):
+            if owner == member:
+                del self.leased[start]
+                bisect.insort(self.released, (start, end))
+
+    def share(self, member, end, now):
+        """How many more messages member may take: everything available (up
+        to the log's end offset) or leased, split evenly between the active
+        members, less what member already holds."""
+        cutoff = now - member_timeout_s
+        active = sum(1 for seen in self.members.values() if seen >= cutoff)
+        available = sum(stop - start for start, stop in self.released) + end - self.next
+        held = {}
+        for start, (stop, owner, _) in self.leased.items():
+            held[owner] = held.get(owner, 0) + stop - start
+        fair = math.ceil((available + sum(held.values())) / max(active, 1))
+        return min(max(fair - held.get(member, 0), 0), available)
+
+    def next_range(self, end, limit):
+        # (start, stop) of the next messages to hand out, at most limit of them
+        if self.released:
+            start, stop = self.released[0]
+            if stop == self.next:
+                stop = end  # Runs straight on into messages never handed out
+        else:
+            start, stop = self.next, end
+        return start, min(stop, start + limit)
+
+    def take(self, start, stop, member, deadline=None):
+        # Hands out start..stop as returned by next_range, leased until
+        # deadline or, without one, for good
+        if self.released and self.released[0][0] == start:
+            _, old_stop = self.released.pop(0)
+            if stop < old_stop:
+                self.released.insert(0, (stop, old_stop))
+            self.next = max(self.next, stop)
+        else:
+            self.next = stop
+        if deadline is not None:
+            self.leased[start] = (stop, member, deadline)
+
+    def ack(self, member, offset):
+        # Acknowledges member's leased messages up to and including offset;
+        # returns whether there were any
+        acked = False
+        for start, (end, owner, deadline) in list(self.leased.items()):
+            if owner == member and start <= offset:
+                del self.leased[start]
+                if offset + 1 < end:
+                    self.leased[offset + 1] = (end, owner, deadline)
+                acked = True
+        return acked
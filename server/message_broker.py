@@ -1,90 +1,374 @@
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
 import time
-from flask import Flask, request, jsonify
-from collections import defaultdict
+import logging
+import math
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from werkzeug.serving import WSGIRequestHandler
+import broker
+from broker import engine
+import compression
+import consumer_group
+import metrics
+import request_log
+from topic_log import Overloaded, TopicMoved
 
 # Start timing
 start_time = time.time()
 app = Flask(__name__)
 
-topics = defaultdict(list)  # Topic to message list
-subscribers = defaultdict(list)  # Topic to list of subscribers
-subscriber_messages = defaultdict(lambda: defaultdict(list))  # Topic -> subscriber -> message list
+def decompress_requests(wsgi_app):
+    # Inflates gzip-encoded request bodies before Flask parses them
+    def middleware(environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').strip().lower() == 'gzip':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            try:
+                body = compression.decompress(environ['wsgi.input'].read(length))
+            except compression.ERRORS:
+                start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+                return [b'Malformed gzip request body']
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return wsgi_app(environ, start_response)
+    return middleware
 
-# Middleware to log incoming requests
+app.wsgi_app = decompress_requests(app.wsgi_app)
+
+# Request metrics and logging. Whether a request is logged is decided up
+# front, so requests that aren't sampled cost one random number
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    g.logged = request_log.sampled(request.path.strip('/'))
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe(route, response.status_code, time.perf_counter() - g.started)
+    if g.logged:
+        request_log.log_request(request.method, request.path.strip('/'), response.status_code,
+                                g.started, request.get_json(silent=True))
+    return response
+
+# Compression is negotiated per request: large responses are gzipped for
+# clients that accept it, and every response tells clients they may gzip
+# their requests. Streams are left alone
+@app.after_request
+def compress_response(response):
+    response.headers['Accept-Encoding'] = 'gzip'
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    data = response.get_data()
+    if compression.wanted(len(data), request.headers.get('Accept-Encoding')):
+        response.set_data(compression.compress(data))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    return response
+
+# Cluster mode: requests about topics another broker serves are redirected there
 @app.before_request
-def log_request():
-    method = request.method
-    url = request.url
-    headers = dict(request.headers)
-    json_data = request.get_json() if request.is_json else None
-    print(f"Received {method} request to {url}")
-    print("Headers:", headers)
-    print("JSON Data:", json_data)
+def route_to_owner():
+    if engine.cluster is None:
+        return None
+    data = request.get_json(silent=True) or {}
+    batches = data.get('batches')
+    if batches is not None:
+        if any(engine.owner_of(batch.get('topic')) for batch in batches):
+            # Can't redirect a batch that spans brokers; the client re-splits it
+            return jsonify({'message': 'Batch contains topics served by other brokers', **engine.cluster_nodes()}), 421
+        return None
+    owner = engine.owner_of(data.get('topic'))
+    if owner is not None:
+        return redirect_to(owner)
+    return None
+
+@app.errorhandler(TopicMoved)
+def topic_moved(error):
+    return redirect_to(error.owner)
+
+@app.errorhandler(broker.InvalidArgument)
+def invalid_argument(error):
+    return jsonify({'message': str(error)}), 400
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    response = jsonify(engine.overloaded(error))
+    response.headers['Retry-After'] = str(math.ceil(engine.retry_after_ms / 1000))
+    return response, 429
+
+def redirect_to(owner):
+    # 307 keeps the method and body, so clients can replay the request as is
+    response = jsonify({'message': f'Served by {owner}', 'owner': owner, **engine.cluster_nodes()})
+    response.headers['Location'] = f'{owner}{request.path}'
+    return response, 307
 
 # Publisher Endpoints
 @app.route('/register_publisher', methods=['POST'])
 def register_publisher():
     pid = request.json.get('pid')
-    return jsonify({'pid': pid}), 200
+    return jsonify(engine.register_publisher(pid)), 200
 
 @app.route('/create_topic', methods=['POST'])
 def create_topic():
     pid = request.json.get('pid')
     topic = request.json.get('topic')
-    if topic not in topics:
-        topics[topic] = []
-    return jsonify({'message': f'Topic {topic} created by Publisher {pid}'}), 200
+    retention = {key: request.json.get(key) for key in broker.RETENTION_LIMITS}
+    return jsonify(engine.create_topic(pid, topic, retention)), 200
 
 @app.route('/delete_topic', methods=['POST'])
 def delete_topic():
     pid = request.json.get('pid')
     topic = request.json.get('topic')
-    if topic in topics:
-        del topics[topic]
-    return jsonify({'message': f'Topic {topic} deleted by Publisher {pid}'}), 200
+    return jsonify(engine.delete_topic(pid, topic)), 200
 
 @app.route('/send_message', methods=['POST'])
 def send_message():
     pid = request.json.get('pid')
     topic = request.json.get('topic')
     message = request.json.get('message')
+    return jsonify(engine.send_message(pid, topic, message)), 200
 
-    if topic in topics:
-        for pid in subscribers[topic]:
-            subscriber_messages[topic][pid].append(message)
-        print(f"Publisher {pid} sent message '{message}' to topic {topic}")
-        # print(f"---------------- subscriber_messages: {subscriber_messages} ---------------")
-    return jsonify({'message': f'Message sent to topic {topic} by Publisher {pid}'}), 200
+@app.route('/send_messages', methods=['POST'])
+def send_messages():
+    pid = request.json.get('pid')
+    # Either a single topic with a list of messages, or a list of per-topic batches
+    batches = request.json.get('batches')
+    if batches is None:
+        batches = [{'topic': request.json.get('topic'), 'messages': request.json.get('messages', [])}]
+
+    return jsonify(engine.send_messages(pid, batches)), 200
 
 # Subscriber Endpoints
 @app.route('/register_subscriber', methods=['POST'])
 def register_subscriber():
     sid = request.json.get('sid')
-    return jsonify({'sid': sid}), 200
+    return jsonify(engine.register_subscriber(sid)), 200
 
 @app.route('/subscribe', methods=['POST'])
 def subscribe():
     sid = request.json.get('sid')
     topic = request.json.get('topic')
-    if topic in topics:
-        subscribers[topic].append(sid)
-    return jsonify({'message': f'Subscriber {sid} subscribed to topic {topic}'}), 200
+    group = request.json.get('group')
+    max_backlog = request.json.get('max_backlog')
+    return jsonify(engine.subscribe(sid, topic, group, max_backlog)), 200
+
+@app.route('/unsubscribe', methods=['POST'])
+def unsubscribe():
+    sid = request.json.get('sid')
+    topic = request.json.get('topic')
+    return jsonify(engine.unsubscribe(sid, topic)), 200
+
+@app.route('/unregister_subscriber', methods=['POST'])
+def unregister_subscriber():
+    sid = request.json.get('sid')
+    return jsonify(engine.unregister_subscriber(sid)), 200
 
 @app.route('/pull_messages', methods=['POST'])
 def pull_messages():
     sid = request.json.get('sid')
     topic = request.json.get('topic')
-    # print(f"-------------- sid: {sid}; topic: {topic} --------------")
-    # print(f"-------------- subscriber_messages: {subscriber_messages} --------------")
-    if sid in subscribers[topic]:
-        messages = subscriber_messages[topic][sid]
-        # print(f"----------- messages: {messages} -----------")
-        subscriber_messages[topic][sid] = []
-        return jsonify({'messages': messages}), 200
-    return jsonify({'messages': []}), 200
+    wait = broker.wait_time(request.json.get('wait_ms'))
+    max_messages = request.json.get('max_messages')
+    max_bytes = request.json.get('max_bytes')
+    # With ack the messages are leased until acknowledged through /ack
+    lease_s = engine.lease_time(request.json.get('ack'), request.json.get('visibility_timeout_ms'))
+    # Long poll: parks until a publish lands on the topic or we time out; if
+    # the topic is handed over meanwhile, TopicMoved redirects to the new owner
+    response = engine.long_poll(sid, topic, wait, max_messages, max_bytes, lease_s)
+    return jsonify(response), 200
+
+@app.route('/ack', methods=['POST'])
+def ack():
+    sid = request.json.get('sid')
+    topic = request.json.get('topic')
+    offset = request.json.get('offset')
+    return jsonify(engine.ack(sid, topic, offset)), 200
+
+@app.route('/stream_messages', methods=['POST'])
+def stream_messages():
+    sid = request.json.get('sid')
+    topic = request.json.get('topic')
+    if engine.subscription_logs(sid, topic) is None:
+        return jsonify({'message': f'Subscriber {sid} is not subscribed to topic {topic}'}), 404
+
+    def events():
+        # Server-Sent Events: every batch appended to the topic (or, for a
+        # pattern, to the topics it matches) is pushed as one event holding a
+        # JSON list of messages
+        try:
+            while engine.subscription_logs(sid, topic) is not None:
+                messages = engine.pull_messages(sid, topic)['messages']
+                if messages:
+                    yield f"data: {json.dumps(messages)}\n\n"
+                    continue
+                if not engine.wait(sid, topic, broker.STREAM_HEARTBEAT_MS / 1000):
+                    yield ": keep-alive\n\n"
+        except TopicMoved:
+            pass  # Handed over to another broker; the subscriber reconnects there
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream')
+
+@app.route('/topic_stats', methods=['POST'])
+def topic_stats():
+    topic = (request.get_json(silent=True) or {}).get('topic')
+    return jsonify(engine.topic_stats(topic)), 200
+
+@app.route('/metrics', methods=['GET', 'POST'])
+def get_metrics():
+    # Request latencies per route, rates and backlogs per topic, retained totals
+    return jsonify(metrics.report(list(engine.topics.items()))), 200
+
+# Cluster Endpoints
+@app.route('/cluster', methods=['POST'])
+def cluster():
+    return jsonify(engine.cluster_nodes()), 200
+
+@app.route('/cluster/update', methods=['POST'])
+def update_cluster():
+    return jsonify(engine.update_cluster(request.json.get('nodes'))), 200
+
+@app.route('/cluster/rebalance', methods=['POST'])
+def rebalance():
+    return jsonify(engine.rebalance()), 200
+
+@app.route('/cluster/settle', methods=['POST'])
+def settle():
+    return jsonify(engine.settle()), 200
+
+@app.route('/cluster/import', methods=['POST'])
+def import_topics():
+    return jsonify(engine.import_topics(request.json)), 200
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pub-Sub message broker')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask',
+                        help='flask: threaded Werkzeug server; asyncio: single event loop (aiohttp)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--binary-port', type=int,
+                        help='Also serve the binary TCP protocol (client_api/binary_protocol.py) on this port')
+    parser.add_argument('--cluster', help='Comma-separated URLs of all brokers in the cluster, this one included')
+    parser.add_argument('--node-url', help='URL of this broker as listed in --cluster (default: http://localhost:<port>)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Run this many broker processes on consecutive ports starting at --port, one per core; '
+                             'clients spread topics over them by consistent hashing')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                        help='Structured JSON logs on stdout at this level and above; warning silences request logs')
+    parser.add_argument('--log-sample', type=float,
+                        help='Fraction of requests logged on every endpoint (default: 1%% of publishes and pulls, '
+                             'all other requests)')
+    parser.add_argument('--log-sample-endpoint', action='append', metavar='ENDPOINT=RATE',
+                        help='Fraction of requests logged for one endpoint, e.g. send_message=0.1; repeatable')
+    parser.add_argument('--visibility-timeout-ms', type=int, default=30000,
+                        help='How long messages pulled with ack stay leased before they are delivered again')
+    parser.add_argument('--stream-heartbeat-ms', type=int, default=broker.STREAM_HEARTBEAT_MS,
+                        help='How often an idle stream sends a keep-alive comment')
+    parser.add_argument('--compress-min-bytes', type=int, default=compression.min_bytes,
+                        help='Smallest request or response body gzipped for clients that negotiate it; 0 turns it off')
+    parser.add_argument('--compression-level', type=int, default=compression.level, choices=range(1, 10),
+                        metavar='1-9', help='zlib level for compressed bodies and messages')
+    parser.add_argument('--compress-at-rest-min-bytes', type=int,
+                        help='Keep messages at least this big zlib-compressed in memory (default: never)')
+    parser.add_argument('--group-member-timeout-ms', type=int, default=30000,
+                        help='How long a consumer group member may go without pulling before its share is '
+                             'handed to the other members')
+    parser.add_argument('--max-messages', type=int, help='Default per-topic retention: messages kept')
+    parser.add_argument('--max-bytes', type=int, help='Default per-topic retention: bytes kept')
+    parser.add_argument('--max-age-s', type=float, help='Default per-topic retention: seconds a message is kept')
+    parser.add_argument('--overflow', choices=broker.OVERFLOW_POLICIES,
+                        help='Default per-topic overflow policy once a publish would break max_messages, max_bytes '
+                             'or a subscriber\'s backlog cap (default: drop_oldest)')
+    parser.add_argument('--max-backlog', type=int, help='Default cap on the unread messages of each subscription')
+    parser.add_argument('--retry-after-ms', type=int, default=1000,
+                        help='How long publishers rejected by a full topic are told to wait')
+    parser.add_argument('--data-dir', help='Persist topics, subscriptions, messages and offsets to a write-ahead log in this directory')
+    parser.add_argument('--fsync', choices=['always', 'interval', 'os'], default='interval',
+                        help='always: group-committed fsync before replying; interval: fsync every --fsync-interval-ms; os: never fsync')
+    parser.add_argument('--fsync-interval-ms', type=int, default=10)
+    parser.add_argument('--snapshot-interval-s', type=float, default=60,
+                        help='How often to snapshot state so restarts only replay the log tail (0 disables snapshots)')
+    return parser.parse_args()
+
+def run_workers(args):
+    """Run args.workers independent broker processes on ports args.port,
+    args.port + 1, ... and wait for them.
+
+    Each worker has its own interpreter, and so its own GIL, and only ever
+    sees the topics clients route to it, so throughput for independent topics
+    grows with the number of cores.
+    """
+    processes = []
+    # The workers form a cluster, so clients that only know one of them get
+    # redirected to the worker that owns a topic
+    urls = [f'http://localhost:{args.port + index}' for index in range(args.workers)]
+    for index in range(args.workers):
+        command = [sys.executable, os.path.abspath(__file__), '--port', str(args.port + index),
+                   '--cluster', ','.join(urls), '--node-url', urls[index]]
+        for key, value in vars(args).items():
+            if key in ('workers', 'port', 'cluster', 'node_url') or value is None:
+                continue
+            if key == 'data_dir':
+                value = os.path.join(value, f'worker-{index}')  # Workers must not share a log
+            if key == 'binary_port':
+                value += index
+            for item in value if isinstance(value, list) else [value]:
+                command += [f"--{key.replace('_', '-')}", str(item)]
+        processes.append(subprocess.Popen(command))
+    request_log.log(logging.INFO, 'workers_started', workers=args.workers,
+                    ports=f'{args.port}-{args.port + args.workers - 1}')
+
+    # Take the workers down with us, whether we are interrupted or terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
-    # End timing
-    end_time = time.time()
-    print(f"Server started in {end_time - start_time:.2f} seconds.")
\ No newline at end of file
+    args = parse_args()
+    request_log.configure(args.log_level, request_log.parse_rates(args.log_sample_endpoint), args.log_sample)
+    # Werkzeug's own per-request access lines are synchronous; the sampled
+    # request records replace them
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if args.workers > 1:
+        run_workers(args)
+        sys.exit(0)
+    engine.default_visibility_timeout_ms = args.visibility_timeout_ms
+    broker.STREAM_HEARTBEAT_MS = args.stream_heartbeat_ms
+    engine.default_max_backlog = args.max_backlog
+    engine.retry_after_ms = args.retry_after_ms
+    consumer_group.member_timeout_s = args.group_member_timeout_ms / 1000
+    compression.min_bytes = args.compress_min_bytes
+    compression.level = args.compression_level
+    compression.at_rest_min_bytes = args.compress_at_rest_min_bytes
+    engine.default_retention.update({key: getattr(args, key) for key in broker.RETENTION_LIMITS if getattr(args, key) is not None})
+    if args.data_dir:
+        recovery = engine.enable_persistence(args.data_dir, args.fsync, args.fsync_interval_ms, args.snapshot_interval_s)
+        request_log.log(logging.INFO, 'recovered', **recovery)
+    if args.cluster:
+        engine.enable_cluster(args.node_url or f'http://localhost:{args.port}', args.cluster.split(','))
+    if args.binary_port:
+        import binary_broker
+        binary_broker.start(args.host, args.binary_port)
+        request_log.log(logging.INFO, 'binary_protocol_started', port=args.binary_port)
+    if args.engine == 'asyncio':
+        import async_broker
+        async_broker.run(args.host, args.port)
+    else:
+        # HTTP/1.1 gives streams chunked transfer encoding so every event is
+        # flushed to the subscriber as soon as it is written
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        app.run(host=args.host, port=args.port, threaded=True)
+    request_log.log(logging.INFO, 'server_stopped', uptime_s=round(time.time() - start_time, 3))
@@ -0,0 +1,94 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Structured logging for the broker. Records are handed to a queue and
+# formatted and written by a background thread, so a request thread only pays
+# for building the record, never for stdout. Per-request records are sampled
+# per endpoint: the hot publish and pull paths log one request in a hundred by
+# default, everything else logs every request.
+
+logger = logging.getLogger('broker')
+
+# Fraction of requests logged per endpoint; endpoints not listed use default_rate
+DEFAULT_SAMPLE_RATES = {'send_message': 0.01, 'send_messages': 0.01, 'pull_messages': 0.01}
+sample_rates = dict(DEFAULT_SAMPLE_RATES)
+default_rate = 1.0
+listener = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, event and the record's fields."""
+
+    def format(self, record):
+        entry = {'time': round(record.created, 6), 'level': record.levelname, 'event': record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['error'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # QueueHandler formats in the calling thread; leave that to the listener
+        return record
+
+def configure(level='info', rates=None, default=None, stream=None):
+    """Set the level, override sampling rates and start the background writer."""
+    global default_rate, listener
+    if default is not None:
+        # A blanket rate replaces the built-in per-endpoint ones too
+        default_rate = default
+        sample_rates.clear()
+    sample_rates.update(rates or {})
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    stop()
+    logger.handlers.clear()
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    listener = QueueListener(records, handler)
+    listener.start()
+    logger.addHandler(_QueueHandler(records))
+
+@atexit.register
+def stop():
+    # Writes out whatever is still queued
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+def log(level, event, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+def sampled(endpoint):
+    """Whether to log this request to endpoint; decided before any work is done for it."""
+    if not logger.isEnabledFor(logging.INFO):
+        return False
+    rate = sample_rates.get(endpoint, default_rate)
+    return rate >= 1 or random.random() < rate
+
+def log_request(method, endpoint, status, started, data=None):
+    # started is the time.perf_counter() the request arrived at
+    fields = {'method': method, 'endpoint': endpoint, 'status': status,
+              'duration_ms': round((time.perf_counter() - started) * 1000, 3)}
+    if isinstance(data, dict):
+        fields.update((key, data[key]) for key in ('pid', 'sid', 'topic') if key in data)
+        if 'messages' in data:
+            fields['count'] = len(data['messages'])
+    fields['sample_rate'] = sample_rates.get(endpoint, default_rate)
+    log(logging.INFO, 'request', **fields)
+
+def parse_rates(specs):
+    """{'endpoint': rate} from 'endpoint=rate' strings."""
+    rates = {}
+    for spec in specs or ():
+        endpoint, _, rate = spec.partition('=')
+        rates[endpoint.strip('/')] = float(rate)
+    return rates
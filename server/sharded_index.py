@@ -0,0 +1,59 @@
+import threading
+
+
+class ShardedIndex:
+    """Thread-safe map from keys to sets of values.
+
+    Keys are spread over a fixed number of shards by hash, each with its own
+    dict and lock, so threads updating keys that land in different shards
+    never wait for each other. Reads hand out copies, never the live sets.
+    """
+
+    def __init__(self, shards=64):
+        self.shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def add(self, key, value):
+        entries, lock = self._shard(key)
+        with lock:
+            entries.setdefault(key, set()).add(value)
+
+    def discard(self, key, value):
+        # Keys whose set runs empty are dropped
+        entries, lock = self._shard(key)
+        with lock:
+            values = entries.get(key)
+            if values is not None:
+                values.discard(value)
+                if not values:
+                    del entries[key]
+
+    def contains(self, key, value):
+        entries, lock = self._shard(key)
+        with lock:
+            return value in entries.get(key, ())
+
+    def get(self, key):
+        entries, lock = self._shard(key)
+        with lock:
+            return set(entries.get(key, ()))
+
+    def pop(self, key):
+        entries, lock = self._shard(key)
+        with lock:
+            return entries.pop(key, set())
+
+    def items(self):
+        # Consistent per shard, not across shards
+        result = []
+        for entries, lock in self.shards:
+            with lock:
+                result.extend((key, set(values)) for key, values in entries.items())
+        return result
+
+    def __contains__(self, key):
+        entries, lock = self._shard(key)
+        with lock:
+            return key in entries
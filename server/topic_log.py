@@ -0,0 +1,661 @@
+import heapq
+import json
+import threading
+import time
+
+import compression
+from consumer_group import ConsumerGroup
+
+
+def message_size(message):
+    # Bytes a message accounts for against a topic's max_bytes retention
+    if isinstance(message, str):
+        return len(message.encode())
+    return len(json.dumps(message))
+
+
+class TopicMoved(Exception):
+    """The topic was handed over to the broker at owner."""
+
+    def __init__(self, topic, owner):
+        super().__init__(f'Topic {topic} moved to {owner}')
+        self.topic = topic
+        self.owner = owner
+
+
+class Overloaded(Exception):
+    """Publishing to topics was rejected because they are at their backlog
+    caps; count messages to other topics of the same request went through."""
+
+    def __init__(self, topics, count=0):
+        super().__init__(f"Topic {', '.join(topics)} is full")
+        self.topics = topics
+        self.count = count
+
+
+# What a topic does when a publish would take it past its caps
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'reject')
+
+
+class TopicLog:
+    """Append-only message log for a single topic.
+
+    Every message is stored once no matter how many subscribers the topic has;
+    each subscriber only keeps the offset of the next message it has not pulled
+    yet. Once all subscribers have read past a prefix of the log that prefix is
+    junk and gets trimmed.
+
+    Retention limits (max_messages, max_bytes, max_age_s) bound the log even
+    when a subscriber stops pulling: the oldest messages are evicted and
+    subscribers that had not read them yet skip ahead to the new head.
+    Subscribers can also cap their own backlog (max_backlog, the most
+    messages they may have unread). What happens when a publish would break
+    a cap depends on the topic's overflow policy: drop_oldest evicts as
+    above, or skips just the subscriber past its cap ahead; drop_newest
+    keeps the log as it is and drops the messages that don't fit; reject
+    refuses the whole publish with Overloaded so the publisher backs off.
+    max_age_s always evicts the oldest messages.
+
+    A consumer group (see consumer_group.py) reads the log as one more
+    subscriber and splits what it reads between its members, so each message
+    goes to exactly one of them.
+
+    With a reading index (subscriber -> topics, e.g. a ShardedIndex), the log
+    keeps it listing this topic for every subscriber that reads it. A
+    subscriber that read up to the end is marked idle as of the number of
+    writes so far, and caught_up() compares that mark against the current
+    count, so a pull across all of a subscriber's topics skips the ones with
+    nothing new without taking their locks, and publishing never has to
+    touch the subscribers that were idle.
+    """
+
+    def __init__(self, name=None, journal=None, retention=None, reading=None):
+        self.name = name
+        # Called with a record describing every change, under self.lock so the
+        # journal sees changes to this topic in exactly the order they happened
+        self.journal = journal
+        self.reading = reading
+        retention = retention or {}
+        self.max_messages = retention.get('max_messages')
+        self.max_bytes = retention.get('max_bytes')
+        self.max_age_s = retention.get('max_age_s')
+        self.overflow = retention.get('overflow') or 'drop_oldest'
+
+        # Live messages are messages[head:]; dropping from the front only moves
+        # head, and the list is compacted once the dead prefix dominates
+        self.messages = []
+        self.sizes = []  # Size of each message, parallel to self.messages
+        self.times = []  # Publish time of each message, parallel to self.messages
+        self.head = 0
+        self.base = 0  # Offset of messages[head]
+        self.bytes = 0  # Total size of the live messages
+        self.evicted = 0  # Messages dropped by retention before everyone read them
+        self.dropped = 0  # Messages dropped by backlog caps: not stored (drop_newest) or skipped by one subscriber
+        self.published = 0  # Messages appended and delivered by this process, for metrics
+        self.delivered = 0
+
+        self.offsets = {}  # Subscriber -> offset of the next message to read
+        self.readers_at = {}  # Offset -> number of subscribers whose next read starts there
+        self.lagging = 0  # Number of subscribers at or behind self.base
+        self.waiters = {}  # Subscriber -> callbacks to run once it has something to read
+        # Subscriber -> (end offset, deadline) of messages leased to it but not
+        # acknowledged yet; the subscriber's offset stays at the first of them
+        self.leases = {}
+        self.groups = {}  # Consumer group name -> ConsumerGroup
+        self.members = {}  # Subscriber -> the ConsumerGroup it reads through
+        self.writes = 0  # Publishes that added messages; only ever grows
+        self.idle = {}  # Subscriber -> self.writes when it last had nothing to read
+        self.caps = {}  # Subscriber -> most messages it may have unread
+        # (offset the log may grow to before the subscriber exceeds its cap,
+        # subscriber) per capped subscriber. Offsets only move forward, so an
+        # entry can only be too low; entries are corrected when they reach
+        # the top, which keeps finding the tightest cap amortized O(log n)
+        self.cap_heap = []
+        self.moved_to = None  # URL of the broker this topic was handed over to
+        self.lock = threading.Lock()
+
+    @property
+    def end(self):
+        return self.base + len(self.messages) - self.head
+
+    @property
+    def retention(self):
+        return {'max_messages': self.max_messages, 'max_bytes': self.max_bytes, 'max_age_s': self.max_age_s,
+                'overflow': self.overflow}
+
+    def add_reader(self, sid, via=None, max_backlog=None):
+        # Returns whether sid was added; via names the pattern subscription
+        # that brought it in, if any, for the journal
+        with self.lock:
+            self._check_moved()
+            if sid in self.offsets:
+                return False
+            self._place(sid, self.end)
+            self._track(sid)
+            if max_backlog is not None:
+                self.caps[sid] = max_backlog
+                heapq.heappush(self.cap_heap, (self.end + max_backlog, sid))
+            if self.journal:
+                record = {'op': 'subscribe', 'topic': self.name, 'sid': sid}
+                if via is not None:
+                    record['via'] = via
+                if max_backlog is not None:
+                    record['max_backlog'] = max_backlog
+                self.journal(record)
+            return True
+
+    def remove_reader(self, sid):
+        with self.lock:
+            self._check_moved()
+            if sid not in self.offsets:
+                return
+            self._remove(sid)
+            self._untrack(sid)
+            if self.journal:
+                self.journal({'op': 'unsubscribe', 'topic': self.name, 'sid': sid})
+            waiters = self.waiters.pop(sid, [])
+        for callback in waiters:
+            callback()
+
+    def join(self, sid, group):
+        # Adds sid to consumer group group, which starts reading at the end of
+        # the log when it is new; returns whether sid joined
+        with self.lock:
+            self._check_moved()
+            if sid in self.members or sid in self.offsets:
+                return False
+            consumers = self.groups.get(group)
+            if consumers is None:
+                consumers = self.groups[group] = ConsumerGroup(group, self.end)
+                self._place(consumers.reader, self.end)
+            consumers.members[sid] = time.time()
+            self.members[sid] = consumers
+            self._track(sid)
+            if self.journal:
+                self.journal({'op': 'join_group', 'topic': self.name, 'sid': sid, 'group': group})
+            return True
+
+    def leave(self, sid):
+        # Takes sid out of its consumer group, handing what it holds to the
+        # other members; returns whether sid was in a group
+        with self.lock:
+            self._check_moved()
+            consumers = self.members.pop(sid, None)
+            if consumers is None:
+                return False
+            del consumers.members[sid]
+            consumers.release(sid)
+            self._untrack(sid)
+            if not consumers.members:
+                del self.groups[consumers.name]
+                self._remove(consumers.reader)
+            for member in consumers.members:
+                self._track(member)  # They may get what sid held
+            if self.journal:
+                self.journal({'op': 'leave_group', 'topic': self.name, 'sid': sid, 'group': consumers.name})
+            # The other members may have released messages to pull now
+            waiters = self._take_waiters()
+        for callback in waiters:
+            callback()
+        return True
+
+    def append(self, message):
+        self.extend([message])
+
+    def extend(self, messages, now=None, admit=True):
+        # admit=False appends the messages whatever the caps say, for
+        # replaying a publish that was admitted when it was logged
+        now = now or time.time()
+        with self.lock:
+            self._check_moved()
+            # Records carry the offset they start at so replaying one that a
+            # snapshot already covers is a no-op
+            offset = self.end
+            if self.offsets:
+                sizes = [message_size(message) for message in messages]
+                if admit and self.overflow != 'drop_oldest':
+                    self._enforce_retention(now)  # Aged-out messages make room first
+                    fits = self._room(sizes)
+                    if fits < len(messages):
+                        if self.overflow == 'reject':
+                            raise Overloaded([self.name])
+                        self.dropped += len(messages) - fits
+                        messages, sizes = messages[:fits], sizes[:fits]
+                if compression.at_rest_min_bytes is None:
+                    self.messages.extend(messages)
+                else:
+                    self.messages.extend(map(compression.pack, messages, sizes))
+                self.sizes.extend(sizes)
+                self.times.extend([now] * len(messages))
+                self.bytes += sum(sizes)
+                if self.journal and messages:
+                    self.journal({'op': 'publish', 'topic': self.name, 'offset': offset, 'time': now, 'messages': messages})
+                self._enforce_retention(now)
+                self._enforce_caps()
+            else:
+                # Nobody could ever read them, so don't keep them around
+                self.base += len(messages)
+                if self.journal:
+                    self.journal({'op': 'discard', 'topic': self.name, 'offset': offset, 'count': len(messages)})
+            self.published += len(messages)
+            if messages:
+                self.writes += 1  # Every idle mark is out of date now
+            waiters = self._take_waiters() if messages else []
+        for callback in waiters:
+            callback()
+
+    def read(self, sid, max_messages=None, max_bytes=None):
+        # Delivers the next messages and acknowledges them in one go;
+        # messages stored compressed are expanded outside the lock
+        return compression.unpack_all(self._read(sid, max_messages, max_bytes))
+
+    def _read(self, sid, max_messages, max_bytes):
+        with self.lock:
+            self._check_moved()
+            now = time.time()
+            self._enforce_retention(now)
+            if sid in self.members:
+                return self._group_deliver(sid, max_messages, max_bytes, None, now)[1]
+            if sid not in self.offsets:
+                return []  # Unsubscribed meanwhile
+            offset, end = self._next_batch(sid, max_messages, max_bytes, now)
+            if offset == end:
+                self._track(sid)
+                return []
+            self.leases.pop(sid, None)
+            messages = self._deliver(offset, end)
+            self._advance(sid, end)
+            self._track(sid)
+            if self.journal:
+                self.journal({'op': 'ack', 'topic': self.name, 'sid': sid, 'offset': end})
+            return messages
+
+    def lease(self, sid, lease_s, max_messages=None, max_bytes=None):
+        """Deliver the next messages without acknowledging them. Unless ack()
+        covers them within lease_s seconds they are delivered again. Returns
+        the offset of the first message and the messages."""
+        offset, messages = self._lease(sid, lease_s, max_messages, max_bytes)
+        return offset, compression.unpack_all(messages)
+
+    def _lease(self, sid, lease_s, max_messages, max_bytes):
+        with self.lock:
+            self._check_moved()
+            now = time.time()
+            self._enforce_retention(now)
+            if sid in self.members:
+                return self._group_deliver(sid, max_messages, max_bytes, lease_s, now)
+            if sid not in self.offsets:
+                return self.end, []
+            offset, end = self._next_batch(sid, max_messages, max_bytes, now)
+            if offset == end:
+                self._track(sid)
+                return offset, []
+            self.leases[sid] = (end, now + lease_s)
+            return offset, self._deliver(offset, end)
+
+    def ack(self, sid, offset):
+        # Acknowledges sid's leased messages up to and including offset;
+        # returns whether that moved sid's position
+        with self.lock:
+            self._check_moved()
+            consumers = self.members.get(sid)
+            if consumers is not None:
+                if not consumers.ack(sid, offset):
+                    return False
+                self._commit(consumers)
+                self._track(sid)
+                return True
+            lease = self.leases.get(sid)
+            position = offset + 1
+            if lease is None or not max(self.offsets[sid], self.base) < position <= lease[0]:
+                return False
+            if position == lease[0]:
+                del self.leases[sid]
+            self._advance(sid, position)
+            self._track(sid)
+            if self.journal:
+                self.journal({'op': 'ack', 'topic': self.name, 'sid': sid, 'offset': position})
+            return True
+
+    def seek(self, sid, offset):
+        # Moves sid forward to offset, as if it had read up to there
+        with self.lock:
+            if max(self.offsets[sid], self.base) < offset <= self.end:
+                self._advance(sid, offset)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'messages': self.end - self.base,
+                'bytes': self.bytes,
+                'evicted': self.evicted,
+                'dropped': self.dropped,
+                'subscribers': len(self.offsets) - len(self.groups) + len(self.members),
+                'retention': self.retention,
+            }
+
+    def metrics(self):
+        # Counters, retained size and how far behind each subscriber is
+        with self.lock:
+            end = self.end
+            return {
+                'published': self.published,
+                'delivered': self.delivered,
+                'messages': end - self.base,
+                'bytes': self.bytes,
+                'dropped': self.dropped,
+                'backlog': {sid: end - max(offset, self.base) for sid, offset in self.offsets.items()},
+                'parked': sum(len(callbacks) for callbacks in self.waiters.values()),
+            }
+
+    def snapshot(self):
+        with self.lock:
+            return self.state()
+
+    def state(self):
+        # Everything restore() needs; the caller holds self.lock
+        return {
+            'base': self.base,
+            'messages': compression.unpack_all(self.messages[self.head:]),
+            'times': self.times[self.head:],
+            'offsets': dict(self.offsets),
+            'groups': {name: sorted(consumers.members) for name, consumers in self.groups.items()},
+            'evicted': self.evicted,
+            'dropped': self.dropped,
+            'caps': dict(self.caps),
+            'retention': self.retention,
+        }
+
+    @classmethod
+    def restore(cls, name, journal, state, reading=None):
+        log = cls(name, journal, state.get('retention'), reading)
+        log.base = state['base']
+        log.times = state['times']
+        log.sizes = [message_size(message) for message in state['messages']]
+        log.messages = [compression.pack(message, size) for message, size in zip(state['messages'], log.sizes)]
+        log.bytes = sum(log.sizes)
+        log.evicted = state.get('evicted', 0)
+        log.dropped = state.get('dropped', 0)
+        for sid, offset in state['offsets'].items():
+            log._place(sid, offset)
+        for sid, cap in state.get('caps', {}).items():
+            log.caps[sid] = cap
+            heapq.heappush(log.cap_heap, (max(log.offsets[sid], log.base) + cap, sid))
+        # Members count as idle until they pull; leases are not kept, so
+        # whatever was leased is delivered again
+        for name, members in state.get('groups', {}).items():
+            consumers = log.groups[name] = ConsumerGroup(name, log.offsets[f'group:{name}'])
+            for sid in members:
+                consumers.members[sid] = 0.0
+                log.members[sid] = consumers
+        readers = {consumers.reader for consumers in log.groups.values()}
+        for sid in [sid for sid in log.offsets if sid not in readers] + list(log.members):
+            log._track(sid)
+        return log
+
+    def add_waiter(self, sid, callback):
+        # Parks callback until sid has unread messages; returns False without
+        # parking when there already is something to read
+        with self.lock:
+            self._check_moved()
+            now = time.time()
+            if sid in self.members:
+                consumers = self.members[sid]
+                consumers.skip_to(max(self.base, self.offsets[consumers.reader]))
+                consumers.expire(now)
+                if consumers.share(sid, self.end, now) > 0:
+                    return False
+            elif sid not in self.offsets or self._position(sid, now) < self.end:
+                return False
+            self.waiters.setdefault(sid, []).append(callback)
+            return True
+
+    def remove_waiter(self, sid, callback):
+        with self.lock:
+            callbacks = self.waiters.get(sid)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self.waiters[sid]
+
+    def wake_all(self):
+        with self.lock:
+            waiters = self._take_waiters()
+        for callback in waiters:
+            callback()
+
+    def _check_moved(self):
+        if self.moved_to is not None:
+            raise TopicMoved(self.name, self.moved_to)
+
+    def _position(self, sid, now):
+        # Offset of the next message to deliver to sid: past the messages it
+        # has leased, unless the lease ran out and they are due again
+        offset = max(self.offsets[sid], self.base)
+        lease = self.leases.get(sid)
+        if lease is not None:
+            if lease[0] > offset and lease[1] > now:
+                return lease[0]
+            del self.leases[sid]  # Acknowledged, evicted or timed out
+        return offset
+
+    def _next_batch(self, sid, max_messages, max_bytes, now):
+        # (first, end) offsets of the next messages to deliver to sid
+        offset = self._position(sid, now)
+        end = self.end
+        if max_messages is not None:
+            end = min(end, offset + max_messages)
+        return offset, self._fit(offset, end, max_bytes)
+
+    def _fit(self, offset, end, max_bytes):
+        # Shortens offset..end to max_bytes. The first message always fits,
+        # however large, so one message bigger than max_bytes can't block a
+        # subscriber forever
+        if max_bytes is None or offset == end:
+            return end
+        start = offset - self.base + self.head
+        stop = start + 1
+        budget = max_bytes - self.sizes[start]
+        while stop < start + end - offset and self.sizes[stop] <= budget:
+            budget -= self.sizes[stop]
+            stop += 1
+        return offset + stop - start
+
+    def _group_deliver(self, sid, max_messages, max_bytes, lease_s, now):
+        # read() and lease() for a consumer group member
+        consumers = self.members[sid]
+        consumers.members[sid] = now
+        # Also catches the group up after a replay moved its reader forward
+        consumers.skip_to(max(self.base, self.offsets[consumers.reader]))
+        consumers.expire(now)
+        limit = consumers.share(sid, self.end, now)
+        if max_messages is not None:
+            limit = min(limit, max_messages)
+        offset, end = consumers.next_range(self.end, limit)
+        end = self._fit(offset, end, max_bytes)
+        if offset == end:
+            self._track(sid)
+            return offset, []
+        consumers.take(offset, end, sid, None if lease_s is None else now + lease_s)
+        messages = self._deliver(offset, end)
+        self._commit(consumers)
+        self._track(sid)
+        return offset, messages
+
+    def _commit(self, consumers):
+        # Moves the group's reader up to the first message it still needs
+        low = consumers.low()
+        if low > max(self.offsets[consumers.reader], self.base):
+            self._advance(consumers.reader, low)
+            if self.journal:
+                self.journal({'op': 'ack', 'topic': self.name, 'sid': consumers.reader, 'offset': low})
+
+    def caught_up(self, sid):
+        # Whether sid had read everything as of the last write. Reads two
+        # attributes without the lock: racing a publish can only make the
+        # answer stale, as if the pull had come just before the publish
+        return self.idle.get(sid) == self.writes
+
+    def _track(self, sid):
+        # Lists sid in the reading index and marks it idle, or not, depending
+        # on whether it may have something to read. Subscribers holding leases
+        # are never idle since their messages come back when the lease runs out.
+        if self.reading is None:
+            return
+        consumers = self.members.get(sid)
+        if consumers is not None:
+            done = consumers.next >= self.end and not consumers.released and not consumers.leased
+        else:
+            done = sid not in self.leases and max(self.offsets[sid], self.base) >= self.end
+        if sid not in self.idle:
+            self.reading.add(sid, self.name)  # Idle subscribers are listed already
+        if done:
+            self.idle[sid] = self.writes
+        else:
+            self.idle.pop(sid, None)
+
+    def _untrack(self, sid):
+        if self.reading is not None:
+            self.idle.pop(sid, None)
+            self.reading.discard(sid, self.name)
+
+    def _remove(self, sid):
+        offset = self.offsets.pop(sid)
+        self.leases.pop(sid, None)
+        self.caps.pop(sid, None)  # Its heap entry goes once it reaches the top
+        self._leave(offset)
+        if offset <= self.base:
+            self.lagging -= 1
+            if self.lagging == 0:
+                self._trim()
+
+    def _deliver(self, offset, end):
+        # The messages from offset to end
+        start = offset - self.base + self.head
+        self.delivered += end - offset
+        return self.messages[start:start + end - offset]
+
+    def _take_waiters(self):
+        waiters = [callback for callbacks in self.waiters.values() for callback in callbacks]
+        self.waiters = {}
+        return waiters
+
+    def _place(self, sid, offset):
+        self.offsets[sid] = offset
+        self.readers_at[offset] = self.readers_at.get(offset, 0) + 1
+        if offset <= self.base:
+            self.lagging += 1
+
+    def _advance(self, sid, offset):
+        old = self.offsets[sid]
+        self._leave(old)
+        self.offsets[sid] = offset
+        self.readers_at[offset] = self.readers_at.get(offset, 0) + 1
+        if old <= self.base:
+            self.lagging -= 1
+            if self.lagging == 0:
+                self._trim()
+
+    def _leave(self, offset):
+        self.readers_at[offset] -= 1
+        if not self.readers_at[offset]:
+            del self.readers_at[offset]
+
+    def _trim(self):
+        # Walks forward from the head to the next offset a subscriber still has
+        # to read. Every step drops one message, so the walk is paid for by the
+        # publishes that added them.
+        low, end = self.base, self.end
+        while low < end and low not in self.readers_at:
+            low += 1
+        self._drop(low - self.base)
+        self.lagging = self.readers_at.get(low, 0)
+
+    def _enforce_retention(self, now):
+        # Only ever looks at the messages it evicts plus one, so enforcement is
+        # amortized O(1) per published message
+        live = len(self.messages) - self.head
+        excess = 0
+        if self.max_messages is not None and live > self.max_messages:
+            excess = live - self.max_messages
+        if self.max_bytes is not None:
+            remaining = self.bytes - sum(self.sizes[self.head:self.head + excess])
+            while remaining > self.max_bytes and excess < live:
+                remaining -= self.sizes[self.head + excess]
+                excess += 1
+        if self.max_age_s is not None:
+            cutoff = now - self.max_age_s
+            while excess < live and self.times[self.head + excess] < cutoff:
+                excess += 1
+        if excess:
+            self._evict(excess)
+
+    def _room(self, sizes):
+        # How many of the messages with these sizes, from the first, fit
+        # without breaking a cap. The first message always fits an empty
+        # log, however large, so one big message can't block a topic forever
+        fits = len(sizes)
+        live = self.end - self.base
+        if self.max_messages is not None:
+            fits = min(fits, max(self.max_messages - live, 0))
+        limit = self._cap_limit()
+        if limit is not None:
+            fits = min(fits, max(limit - self.end, 0))
+        if self.max_bytes is not None:
+            budget = self.max_bytes - self.bytes
+            count = 0
+            while count < fits and (sizes[count] <= budget or (count == 0 and live == 0)):
+                budget -= sizes[count]
+                count += 1
+            fits = count
+        return fits
+
+    def _cap_limit(self):
+        # Offset the log may grow to before some subscriber holds more unread
+        # messages than its cap allows, or None without capped subscribers
+        while self.cap_heap:
+            limit, sid = self.cap_heap[0]
+            cap = self.caps.get(sid)
+            if cap is None:
+                heapq.heappop(self.cap_heap)  # Unsubscribed
+                continue
+            current = max(self.offsets[sid], self.base) + cap
+            if current == limit:
+                return limit
+            heapq.heapreplace(self.cap_heap, (current, sid))
+        return None
+
+    def _enforce_caps(self):
+        # drop_oldest for capped subscribers: one whose backlog grew past its
+        # cap skips ahead to the last cap messages, while the others keep theirs
+        limit = self._cap_limit()
+        while limit is not None and limit < self.end:
+            sid = self.cap_heap[0][1]
+            position = self.end - self.caps[sid]
+            self.dropped += position - max(self.offsets[sid], self.base)
+            self.leases.pop(sid, None)
+            self._advance(sid, position)
+            if self.journal:
+                self.journal({'op': 'ack', 'topic': self.name, 'sid': sid, 'offset': position})
+            limit = self._cap_limit()
+
+    def _evict(self, count):
+        # Subscribers that had not read the evicted messages now sit at the head
+        for offset in range(self.base + 1, self.base + count + 1):
+            self.lagging += self.readers_at.get(offset, 0)
+        self.evicted += count
+        self._drop(count)
+        if self.lagging == 0:
+            self._trim()
+
+    def _drop(self, count):
+        if not count:
+            return
+        self.bytes -= sum(self.sizes[self.head:self.head + count])
+        self.head += count
+        self.base += count
+        if self.head * 2 >= len(self.messages):
+            del self.messages[:self.head]
+            del self.sizes[:self.head]
+            del self.times[:self.head]
+            self.head = 0
@@ -0,0 +1,104 @@
+import threading
+
+# Wildcards in subscription patterns over dot-separated topic names: '*'
+# matches exactly one level, '#' matches zero or more levels
+ONE_LEVEL = '*'
+ANY_LEVELS = '#'
+
+
+def is_pattern(topic):
+    return topic is not None and any(level in (ONE_LEVEL, ANY_LEVELS) for level in topic.split('.'))
+
+
+def pattern_matches(pattern, topic):
+    """Whether pattern matches the concrete topic name."""
+    return _matches(pattern.split('.'), 0, topic.split('.'), 0)
+
+
+def _matches(pattern, i, levels, j):
+    if i == len(pattern):
+        return j == len(levels)
+    if pattern[i] == ANY_LEVELS:
+        return any(_matches(pattern, i + 1, levels, k) for k in range(j, len(levels) + 1))
+    if j == len(levels):
+        return False
+    return pattern[i] in (ONE_LEVEL, levels[j]) and _matches(pattern, i + 1, levels, j + 1)
+
+
+class _Node:
+    __slots__ = ('children', 'pattern')
+
+    def __init__(self):
+        self.children = {}  # Level (or wildcard) -> _Node
+        self.pattern = None  # Pattern that ends at this node, if any
+
+
+class TopicTrie:
+    """Index of wildcard subscription patterns.
+
+    Patterns are stored one level per trie node, so finding the patterns that
+    match a topic walks the topic's levels instead of testing every pattern;
+    only '#' nodes fan out over the remaining levels. Results are cached per
+    topic and the cache is dropped whenever a pattern is added or removed.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.cache = {}  # Topic -> frozenset of the patterns matching it
+        self.lock = threading.Lock()
+
+    def add(self, pattern):
+        with self.lock:
+            node = self.root
+            for level in pattern.split('.'):
+                node = node.children.setdefault(level, _Node())
+            node.pattern = pattern
+            self.cache.clear()
+
+    def remove(self, pattern):
+        with self.lock:
+            levels = pattern.split('.')
+            path = [self.root]
+            for level in levels:
+                node = path[-1].children.get(level)
+                if node is None:
+                    return
+                path.append(node)
+            path[-1].pattern = None
+            # Prune the branch back up to the last node still in use
+            for depth in range(len(levels), 0, -1):
+                node = path[depth]
+                if node.children or node.pattern is not None:
+                    break
+                del path[depth - 1].children[levels[depth - 1]]
+            self.cache.clear()
+
+    def match(self, topic):
+        """The patterns matching topic, as a frozenset."""
+        with self.lock:
+            patterns = self.cache.get(topic)
+            if patterns is None:
+                found = set()
+                self._collect(self.root, topic.split('.'), 0, found)
+                patterns = self.cache[topic] = frozenset(found)
+            return patterns
+
+    def forget(self, topic):
+        # Drops topic's cached matches, e.g. once the topic is deleted
+        with self.lock:
+            self.cache.pop(topic, None)
+
+    def _collect(self, node, levels, i, found):
+        hash_node = node.children.get(ANY_LEVELS)
+        if hash_node is not None:
+            # '#' swallows zero or more of the remaining levels
+            for j in range(i, len(levels) + 1):
+                self._collect(hash_node, levels, j, found)
+        if i == len(levels):
+            if node.pattern is not None:
+                found.add(node.pattern)
+            return
+        for level in (levels[i], ONE_LEVEL):
+            child = node.children.get(level)
+            if child is not None:
+                self._collect(child, levels, i + 1, found)
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+
+FSYNC_POLICIES = ('always', 'interval', 'os')
+
+
+class WriteAheadLog:
+    """Segmented, append-only log of broker mutations on local disk.
+
+    Records are JSON lines written to wal-<n>.log segment files; a new segment
+    is started once the current one grows past segment_bytes. How records reach
+    the disk depends on the fsync policy:
+
+    - 'always': sync() blocks until every record appended so far is fsynced. A
+      background flusher fsyncs whatever accumulated while the previous fsync
+      was running, so concurrent writers share one fsync (group commit).
+    - 'interval': the flusher writes and fsyncs buffered records every
+      interval_ms; a crash loses at most that window.
+    - 'os': records are handed to the OS as they are appended and never
+      fsynced; the kernel decides when they hit the disk.
+    """
+
+    def __init__(self, directory, fsync='interval', interval_ms=10, segment_bytes=64 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync must be one of {FSYNC_POLICIES}, got {fsync!r}')
+        self.directory = directory
+        self.fsync = fsync
+        self.interval = interval_ms / 1000
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        segments = self.segments()
+        self.segment = segments[-1] if segments else 1
+        self.file = open(self.segment_path(self.segment), 'a', encoding='utf-8')
+
+        self.lock = threading.Lock()
+        # Held while writing to self.file, so rotation never swaps the file
+        # out from under the flusher. Always taken before self.lock.
+        self.write_lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)  # Signalled when records are buffered
+        self.flushed = threading.Condition(self.lock)  # Signalled after every flush
+        self.buffer = []
+        self.appended = 0  # Records appended so far
+        self.synced = 0  # Records known to be on disk (or handed to the OS)
+        self.closed = False
+
+        self.flusher = None
+        if fsync != 'os':
+            self.flusher = threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True)
+            self.flusher.start()
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f'wal-{segment:06d}.log')
+
+    def segments(self):
+        names = [name for name in os.listdir(self.directory) if name.startswith('wal-') and name.endswith('.log')]
+        return sorted(int(name[4:-4]) for name in names)
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.appended += 1
+            if self.fsync == 'os':
+                self.file.write(line)
+                self.file.flush()
+                self.synced = self.appended
+                self._maybe_rotate()
+            else:
+                self.buffer.append(line)
+                if self.fsync == 'always':
+                    self.pending.notify()
+
+    def sync(self):
+        """Wait until every record appended so far is durable under the 'always' policy."""
+        if self.fsync != 'always':
+            return
+        with self.lock:
+            target = self.appended
+            while self.synced < target and not self.closed:
+                self.flushed.wait()
+
+    def rotate(self):
+        """Flush everything appended so far and start a new segment; returns its number."""
+        with self.write_lock, self.lock:
+            self._write(self.buffer)
+            self.buffer = []
+            if self.fsync == 'os':
+                os.fsync(self.file.fileno())
+            self.synced = self.appended
+            self.flushed.notify_all()
+            self.file.close()
+            self.segment += 1
+            self.file = open(self.segment_path(self.segment), 'a', encoding='utf-8')
+            return self.segment
+
+    def truncate_before(self, segment):
+        """Delete the segments older than segment, e.g. once a snapshot covers them."""
+        for old in self.segments():
+            if old < segment:
+                os.remove(self.segment_path(old))
+
+    def replay(self, start_segment=1):
+        """Yield every record from start_segment on, oldest first."""
+        for segment in self.segments():
+            if segment < start_segment:
+                continue
+            with open(self.segment_path(segment), encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn write at the tail of a crashed segment
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pending.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+        with self.write_lock, self.lock:
+            self._write(self.buffer)
+            self.buffer = []
+            self.file.close()
+            self.flushed.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self.lock:
+                if self.fsync == 'always':
+                    while not self.buffer and not self.closed:
+                        self.pending.wait()
+                else:
+                    self.pending.wait(self.interval)
+                if self.closed:
+                    return
+            with self.write_lock:
+                with self.lock:
+                    lines, self.buffer = self.buffer, []
+                    count = self.appended
+                # Writers keep appending to the fresh buffer while we are on disk
+                self._write(lines)
+                with self.lock:
+                    self.synced = max(self.synced, count)
+                    self._maybe_rotate()
+                    self.flushed.notify_all()
+
+    def _write(self, lines):
+        if not lines:
+            return
+        self.file.write(''.join(lines))
+        self.file.flush()
+        if self.fsync != 'os':
+            os.fsync(self.file.fileno())
+
+    def _maybe_rotate(self):
+        if self.file.tell() >= self.segment_bytes:
+            self.file.close()
+            self.segment += 1
+            self.file = open(self.segment_path(self.segment), 'a', encoding='utf-8')
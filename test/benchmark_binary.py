@@ -0,0 +1,126 @@
+import sys
+import os
+import subprocess
+import time
+import argparse
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from client_api_impl import ClientAPIImpl
+
+# HTTP+JSON against the binary TCP protocol on the same broker: round-trip
+# latency of single publishes, publish throughput when the binary client
+# pipelines requests instead of waiting for each response, and pull latency.
+
+HTTP_PORT = 5200
+BINARY_PORT = 6200
+
+def start_server(engine='flask'):
+    """Start a broker serving both transports and wait until it accepts connections."""
+    print("Starting the server...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine, '--port', str(HTTP_PORT),
+                                       '--binary-port', str(BINARY_PORT)],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            ClientAPIImpl(f'tcp://localhost:{BINARY_PORT}').close()
+            break
+        except ConnectionError:
+            time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+def measure_round_trips(api, pid, sid, topic, num_messages, message):
+    """Mean microseconds per publish and per pull, one request at a time."""
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        api.send_message(pid, topic, message)
+    publish_us = (time.perf_counter() - start_time) / num_messages * 1e6
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        api.pull_messages(sid, topic, max_messages=1)
+    pull_us = (time.perf_counter() - start_time) / num_messages * 1e6
+    return publish_us, pull_us
+
+def measure_pipelined(api, pid, topic, num_messages, message, depth):
+    """Messages per second with up to depth publishes in flight on the binary connection."""
+    controller = api.api_controller
+    in_flight = []
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        in_flight.append(controller.submit('send_message', pid, topic, message))
+        if len(in_flight) >= depth:
+            in_flight.pop(0).result()
+    for future in in_flight:
+        future.result()
+    return num_messages / (time.perf_counter() - start_time)
+
+def save_plot(labels, values, title, ylabel, filename):
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Binary')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.bar(labels, values)
+        plt.title(title)
+        plt.ylabel(ylabel)
+        plt.grid(True, axis='y')
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the HTTP and binary TCP transports')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--message-bytes', type=int, default=100)
+    args = parser.parse_args()
+    message = 'x' * args.message_bytes
+
+    server_process = start_server(args.engine)
+    try:
+        http_api = ClientAPIImpl(f'http://localhost:{HTTP_PORT}')
+        binary_api = ClientAPIImpl(f'tcp://localhost:{BINARY_PORT}')
+        latencies = {}
+        for name, api in (('HTTP', http_api), ('TCP', binary_api)):
+            pid = api.register_publisher()['pid']
+            sid = api.register_subscriber()['sid']
+            topic = f'bench_{name}'
+            api.create_topic(pid, topic)
+            api.subscribe(sid, topic)
+            latencies[name] = measure_round_trips(api, pid, sid, topic, args.messages, message)
+            print(f"{name:>4}: publish {latencies[name][0]:8.1f} us, pull {latencies[name][1]:8.1f} us per request")
+
+        pid = binary_api.register_publisher()['pid']
+        binary_api.create_topic(pid, 'bench_pipelined')
+        depths = [1, 8, 64, 512]
+        throughputs = []
+        for depth in depths:
+            throughputs.append(measure_pipelined(binary_api, pid, 'bench_pipelined', args.messages, message, depth))
+            print(f"TCP pipelined, {depth:>3} in flight: {throughputs[-1]:10.0f} msgs/sec")
+        http_api.close()
+        binary_api.close()
+    finally:
+        stop_server(server_process)
+
+    save_plot([f'{name} {kind}' for name in latencies for kind in ('publish', 'pull')],
+              [value for pair in latencies.values() for value in pair],
+              'Round-trip Latency by Transport', 'Microseconds per request', 'latency_by_transport.png')
+    save_plot([str(depth) for depth in depths], throughputs,
+              'Binary Publish Throughput vs Requests in Flight', 'Messages per second', 'pipelined_throughput.png')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import sys
+import os
+import subprocess
+import time
+import argparse
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from client_api_impl import ClientAPIImpl
+
+# Cost and benefit of compression for multi-kilobyte JSON messages: a
+# publisher sends a backlog of documents in batches, then a subscriber pulls
+# it back in pages. For each mode the benchmark reports the bytes that crossed
+# the loopback interface, the broker's resident memory with the backlog
+# retained, and the CPU time the broker and the client spent. It reads
+# /proc, so it needs Linux.
+
+PORT = 5500
+MODES = {
+    'off': ({}, []),
+    'wire': ({'compression': True}, []),
+    'wire + at rest': ({'compression': True}, ['--compress-at-rest-min-bytes', '1024']),
+}
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+def document(n):
+    # A JSON document of a few kilobytes, as repetitive as typical API payloads
+    return {'id': n, 'type': 'order', 'customer': {'id': n % 97, 'name': f'Customer {n % 97}', 'country': 'NL'},
+            'lines': [{'sku': f'SKU-{n % 13}-{line}', 'quantity': line + 1, 'price': 9.95, 'currency': 'EUR',
+                       'description': 'Standard shipping, gift wrapped'} for line in range(20)]}
+
+def loopback_bytes():
+    with open('/proc/net/dev') as file:
+        for line in file:
+            name, _, counters = line.partition(':')
+            if name.strip() == 'lo':
+                return int(counters.split()[0])  # Received, which on loopback equals sent
+    return 0
+
+def broker_rss_mb(pid):
+    with open(f'/proc/{pid}/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0
+
+def broker_cpu_s(pid):
+    with open(f'/proc/{pid}/stat') as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+
+def start_server(extra_args):
+    """Start the broker and wait until it accepts connections."""
+    print("Starting the server...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--port', str(PORT), '--log-level', 'warning'] + extra_args)
+    with ClientAPIImpl(f'http://localhost:{PORT}', retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                break
+            except Exception:
+                time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+def measure(server_pid, client_options, num_messages, batch_size, page_size):
+    """Wire bytes, broker RSS with the backlog retained, and broker and client CPU seconds."""
+    documents = [document(n) for n in range(num_messages)]
+    with ClientAPIImpl(f'http://localhost:{PORT}', **client_options) as api:
+        pid = api.register_publisher()['pid']
+        api.create_topic(pid, 'bench_compression')
+        sid = api.register_subscriber()['sid']
+        api.subscribe(sid, 'bench_compression')
+
+        wire_before = loopback_bytes()
+        broker_before = broker_cpu_s(server_pid)
+        client_before = time.process_time()
+        for start in range(0, num_messages, batch_size):
+            api.send_messages(pid, 'bench_compression', documents[start:start + batch_size])
+        rss = broker_rss_mb(server_pid)
+        received = 0
+        while received < num_messages:
+            received += len(api.pull_messages(sid, 'bench_compression', max_messages=page_size))
+        return {
+            'wire_mb': (loopback_bytes() - wire_before) / 1e6,
+            'rss_mb': rss,
+            'broker_cpu_s': broker_cpu_s(server_pid) - broker_before,
+            'client_cpu_s': time.process_time() - client_before,
+        }
+
+def save_plot(results, filename):
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Compression')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        figure, axes = plt.subplots(1, 3, figsize=(14, 4))
+        modes = list(results)
+        for axis, (key, label) in zip(axes, (('wire_mb', 'Bytes on the wire (MB)'), ('rss_mb', 'Broker RSS (MB)'),
+                                              ('broker_cpu_s', 'Broker CPU (s)'))):
+            axis.bar(modes, [results[mode][key] for mode in modes])
+            axis.set_title(label)
+            axis.grid(True, axis='y')
+        figure.suptitle('Compression: Wire, Memory and CPU')
+        figure.tight_layout()
+        figure.savefig(file_path)
+        plt.close(figure)
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Wire bytes, broker memory and CPU with compression off and on')
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=100, help='Messages per send_messages request')
+    parser.add_argument('--page-size', type=int, default=100, help='max_messages per pull')
+    args = parser.parse_args()
+
+    results = {}
+    for mode, (client_options, server_args) in MODES.items():
+        server_process = start_server(server_args)
+        try:
+            results[mode] = measure(server_process.pid, client_options, args.messages, args.batch_size, args.page_size)
+        finally:
+            stop_server(server_process)
+    for mode, result in results.items():
+        print(f"{mode:>15}: {result['wire_mb']:8.2f} MB on the wire, broker RSS {result['rss_mb']:7.1f} MB, "
+              f"CPU broker {result['broker_cpu_s']:.2f} s / client {result['client_cpu_s']:.2f} s")
+    save_plot(results, 'compression.png')
+
+if __name__ == '__main__':
+    main()
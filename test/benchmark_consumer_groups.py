@@ -0,0 +1,121 @@
+import sys
+import os
+import subprocess
+import threading
+import time
+import argparse
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from client_api_impl import ClientAPIImpl
+
+# Consume throughput of one consumer group as it grows: a backlog is published
+# up front, then every member pulls (and, with --ack, acknowledges) pages of it
+# on its own thread until the group has drained the whole backlog.
+
+PORT = 5400
+
+def start_server(engine):
+    """Start the broker and wait until it accepts connections."""
+    print("Starting the server...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine, '--port', str(PORT),
+                                       '--log-level', 'warning'])
+    with ClientAPIImpl(f'http://localhost:{PORT}', retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                break
+            except Exception:
+                time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+def measure_throughput(num_members, num_messages, page_size, ack):
+    """Messages per second consumed by a group of num_members, and how many each member got."""
+    topic = f'bench_groups_{num_members}'
+    with ClientAPIImpl(f'http://localhost:{PORT}', pool_size=num_members) as api:
+        pid = api.register_publisher()['pid']
+        api.create_topic(pid, topic)
+        sids = [api.register_subscriber()['sid'] for _ in range(num_members)]
+        for sid in sids:
+            api.subscribe(sid, topic, group='bench')
+        for start in range(0, num_messages, 1000):
+            api.send_messages(pid, topic, [f'Message {n}' for n in range(start, min(start + 1000, num_messages))])
+
+        counts = dict.fromkeys(sids, 0)
+        lock = threading.Lock()
+        consumed = [0]
+
+        def consume(sid):
+            while consumed[0] < num_messages:
+                if ack:
+                    page = api.pull_batch(sid, topic, wait_ms=100, max_messages=page_size, visibility_timeout_ms=30000)
+                    if page['offsets']:
+                        api.ack(sid, topic, page['offsets'][-1])
+                    messages = page['messages']
+                else:
+                    messages = api.pull_messages(sid, topic, wait_ms=100, max_messages=page_size)
+                counts[sid] += len(messages)
+                with lock:
+                    consumed[0] += len(messages)
+
+        threads = [threading.Thread(target=consume, args=(sid,)) for sid in sids]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        api.delete_topic(pid, topic)
+    return num_messages / elapsed, sorted(counts.values())
+
+def save_plot(members, throughputs, filename):
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'ConsumerGroups')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.plot(members, throughputs, marker='o')
+        plt.title('Consumer Group Throughput vs Members')
+        plt.xlabel('Group members')
+        plt.ylabel('Messages per second')
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Consume throughput of a consumer group by number of members')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask')
+    parser.add_argument('--members', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--messages', type=int, default=20000, help='Messages consumed per group size')
+    parser.add_argument('--page-size', type=int, default=50, help='max_messages per pull')
+    parser.add_argument('--ack', action='store_true', help='Lease pages and acknowledge them instead of auto-acking')
+    args = parser.parse_args()
+
+    server_process = start_server(args.engine)
+    throughputs = []
+    try:
+        for num_members in args.members:
+            throughput, counts = measure_throughput(num_members, args.messages, args.page_size, args.ack)
+            throughputs.append(throughput)
+            print(f"{num_members:3} members: {throughput:10.0f} msgs/sec, per member {counts[0]}..{counts[-1]}")
+    finally:
+        stop_server(server_process)
+    save_plot(args.members, throughputs, 'throughput_vs_members.png')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+import sys
+import os
+import json
+import math
+import random
+import statistics
+import subprocess
+import threading
+import time
+import platform
+import argparse
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+from client_api_impl import ClientAPIImpl
+from broker import BrokerEngine
+import metrics
+
+# Reusable load generator for the broker, with machine-readable results.
+#
+#   python benchmark_harness.py run --scenario publish --loop open --rate 2000 --output before.json
+#   python benchmark_harness.py compare before.json after.json
+#
+# A closed loop runs a fixed number of clients that each send their next
+# request as soon as the previous one is answered, so it finds the maximum
+# throughput. An open loop sends requests on a schedule at --rate per second
+# however fast the broker answers, the way independent users would, and times
+# each request from when it was due rather than from when it went out: if the
+# broker stalls, the requests queued behind the stall count as slow instead of
+# silently not being sent (coordinated omission).
+#
+# Every run starts with a warm-up phase whose requests are discarded, then
+# measures for --duration seconds. Each worker records into its own histogram,
+# merged once the run is over, so measuring takes no lock. With --repeat the
+# measurement is repeated on fresh topics and compare uses the spread between
+# repetitions to tell a regression from noise. --in-process drives a broker
+# engine in this process directly, which measures the engine's own cost
+# without HTTP in the way.
+
+PORT = 5600
+PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))
+
+# Latency buckets: 1 us up to ~160 s, each 1% wider than the one before it,
+# so a percentile read from the buckets is off by at most 1%
+MIN_LATENCY_S = 1e-6
+GROWTH = 1.01
+BOUNDS = tuple(MIN_LATENCY_S * GROWTH ** index for index in range(1900))
+
+# Metrics compare looks at, and whether higher values are better
+METRICS = (('throughput_msgs_s', True), ('p50_ms', False), ('p99_ms', False), ('p999_ms', False))
+
+
+class Histogram(metrics.Histogram):
+    """The broker's latency histogram with finer buckets and tail percentiles."""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(BOUNDS, PERCENTILES, digits=4)
+
+
+class Worker:
+    """What one load-generating thread measured."""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.completed = 0  # Requests answered within the measurement window
+        self.errors = 0
+
+
+def publish(api, tag, options):
+    """Each request publishes --batch-size messages to the worker's own topic."""
+    pid = api.register_publisher()['pid']
+    topic = f'harness_{tag}'
+    api.create_topic(pid, topic)
+    message = 'x' * options.message_size
+    if options.batch_size == 1:
+        return lambda: api.send_message(pid, topic, message)
+    batch = [message] * options.batch_size
+    return lambda: api.send_messages(pid, topic, batch)
+
+
+def round_trip(api, tag, options):
+    """Each request publishes --batch-size messages and pulls them back."""
+    pid = api.register_publisher()['pid']
+    sid = api.register_subscriber()['sid']
+    topic = f'harness_{tag}'
+    api.create_topic(pid, topic)
+    api.subscribe(sid, topic)
+    batch = ['x' * options.message_size] * options.batch_size
+
+    def request():
+        api.send_messages(pid, topic, batch)
+        received = 0
+        while received < len(batch):
+            received += len(api.pull_messages(sid, topic, wait_ms=1000))
+    return request
+
+
+SCENARIOS = {'publish': publish, 'round-trip': round_trip}
+
+
+def closed_loop(requests, warmup_s, duration_s):
+    """Every worker sends its next request as soon as the previous one returns."""
+    start = time.perf_counter()
+    measure_from, end = start + warmup_s, start + warmup_s + duration_s
+    workers = [Worker() for _ in requests]
+
+    def work(request, worker):
+        while True:
+            began = time.perf_counter()
+            if began >= end:
+                return
+            try:
+                request()
+            except Exception:
+                worker.errors += 1
+                continue
+            done = time.perf_counter()
+            if began >= measure_from and done <= end:
+                worker.latency.observe(done - began)
+                worker.completed += 1
+
+    run_threads(work, requests, workers)
+    return workers
+
+
+def open_loop(requests, rate, warmup_s, duration_s, poisson, seed):
+    """Requests are due at rate per second, spread over the workers; each is
+    timed from when it was due."""
+    total_s = warmup_s + duration_s
+    if poisson:
+        generator = random.Random(seed)
+        offsets, offset = [], generator.expovariate(rate)
+        while offset < total_s:
+            offsets.append(offset)
+            offset += generator.expovariate(rate)
+    else:
+        offsets = [index / rate for index in range(int(rate * total_s))]
+    # next() on a list iterator is atomic under the GIL, so the workers can
+    # share the schedule without a lock
+    schedule = iter(offsets)
+    start = time.perf_counter() + 0.05
+    measure_from, end = start + warmup_s, start + total_s
+    workers = [Worker() for _ in requests]
+
+    def work(request, worker):
+        for offset in schedule:
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                request()
+            except Exception:
+                worker.errors += 1
+                continue
+            done = time.perf_counter()
+            # Requests due in the window count even when they finish late,
+            # otherwise an overloaded broker would look fast
+            if due >= measure_from:
+                worker.latency.observe(done - due)
+                if done <= end:
+                    worker.completed += 1
+
+    run_threads(work, requests, workers)
+    return workers
+
+
+def run_threads(work, requests, workers):
+    threads = [threading.Thread(target=work, args=(request, worker)) for request, worker in zip(requests, workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure(api, options, repetition):
+    """One warm-up plus measurement; returns the run's results and its histogram."""
+    scenario = SCENARIOS[options.scenario]
+    requests = [scenario(api, f'{options.scenario}_{repetition}_{index}_{time.time_ns()}', options)
+                for index in range(options.concurrency)]
+    if options.loop == 'open':
+        workers = open_loop(requests, options.rate, options.warmup, options.duration, options.poisson, repetition)
+    else:
+        workers = closed_loop(requests, options.warmup, options.duration)
+    latency = Histogram()
+    for worker in workers:
+        latency.merge(worker.latency)
+    completed = sum(worker.completed for worker in workers)
+    run = {
+        'requests_s': round(completed / options.duration, 2),
+        'throughput_msgs_s': round(completed * options.batch_size / options.duration, 2),
+        'errors': sum(worker.errors for worker in workers),
+        **latency.summary(),
+    }
+    return run, latency
+
+
+def spread(values):
+    return {
+        'mean': round(statistics.mean(values), 4),
+        'stdev': round(statistics.stdev(values), 4) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'max': max(values),
+    }
+
+
+def start_server(engine):
+    """Start the broker and wait until it accepts connections."""
+    print("Starting the server...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine, '--port', str(PORT),
+                                       '--log-level', 'warning'])
+    with ClientAPIImpl(f'http://localhost:{PORT}', retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                break
+            except Exception:
+                time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+
+def stop_server(server_process):
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+
+def run(options):
+    if options.loop == 'open' and not options.rate:
+        raise SystemExit('--loop open needs --rate')
+    if options.in_process:
+        server_process, url = None, BrokerEngine()
+    else:
+        server_process = None if options.url else start_server(options.engine)
+        url = options.url or f'http://localhost:{PORT}'
+    runs, latency = [], Histogram()
+    try:
+        with ClientAPIImpl(url, pool_size=options.concurrency) as api:
+            for repetition in range(options.repeat):
+                result, histogram = measure(api, options, repetition)
+                runs.append(result)
+                latency.merge(histogram)
+                print(f"Run {repetition + 1}/{options.repeat}: {result['throughput_msgs_s']:.0f} msgs/sec, "
+                      f"p50 {result.get('p50_ms', 0):.3f} ms, p99 {result.get('p99_ms', 0):.3f} ms, "
+                      f"p99.9 {result.get('p999_ms', 0):.3f} ms, {result['errors']} errors")
+    finally:
+        if server_process:
+            stop_server(server_process)
+
+    config = {key: value for key, value in vars(options).items() if key not in ('command', 'output', 'func')}
+    if options.loop == 'open' and runs[-1]['requests_s'] < 0.95 * options.rate:
+        print(f"Warning: the broker only kept up with {runs[-1]['requests_s']:.0f} of {options.rate} requests/sec")
+    results = {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'runs': runs,
+        'summary': {
+            **{key: spread([result[key] for result in runs if key in result]) for key, _ in METRICS
+               if any(key in result for result in runs)},
+            'latency': latency.summary(),
+            'histogram_us': latency.buckets(),
+        },
+    }
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved: {options.output}")
+    return results
+
+
+def compare_results(baseline, candidate, threshold):
+    """Per metric, the relative change from baseline to candidate and whether
+    it is a regression: worse by more than threshold and, when both sides
+    were repeated, by more than twice the standard error of the difference."""
+    rows = []
+    for key, higher_is_better in METRICS:
+        before = [run[key] for run in baseline['runs'] if key in run]
+        after = [run[key] for run in candidate['runs'] if key in run]
+        if not before or not after:
+            continue
+        mean_before, mean_after = statistics.mean(before), statistics.mean(after)
+        change = (mean_after - mean_before) / mean_before if mean_before else 0.0
+        worse = -change if higher_is_better else change
+        noise = 0.0
+        if len(before) > 1 and len(after) > 1:
+            noise = 2 * math.sqrt(statistics.variance(before) / len(before) + statistics.variance(after) / len(after))
+        regression = worse > threshold and abs(mean_after - mean_before) > noise
+        rows.append({'metric': key, 'baseline': round(mean_before, 4), 'candidate': round(mean_after, 4),
+                     'change': round(change, 4), 'regression': regression})
+    return rows
+
+
+def compare(options):
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    with open(options.candidate) as file:
+        candidate = json.load(file)
+    differing = sorted(key for key in set(baseline['config']) | set(candidate['config'])
+                       if key not in ('url', 'repeat') and baseline['config'].get(key) != candidate['config'].get(key))
+    if differing:
+        print(f"Warning: the runs were configured differently: {', '.join(differing)}")
+    rows = compare_results(baseline, candidate, options.threshold)
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['metric']:>18}: {row['baseline']:12.3f} -> {row['candidate']:12.3f} ({row['change']:+7.1%}) {flag}")
+    # A non-zero exit status lets scripts fail on a regression
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the broker and compare results between runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Generate load and record latency and throughput')
+    run_parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='publish')
+    run_parser.add_argument('--loop', choices=['closed', 'open'], default='closed')
+    run_parser.add_argument('--rate', type=float, help='Requests per second for --loop open')
+    run_parser.add_argument('--poisson', action='store_true',
+                            help='Space open-loop requests randomly (Poisson arrivals) instead of evenly')
+    run_parser.add_argument('--concurrency', type=int, default=8,
+                            help='Clients for --loop closed; sender threads for --loop open')
+    run_parser.add_argument('--warmup', type=float, default=2, help='Seconds of load before measuring')
+    run_parser.add_argument('--duration', type=float, default=10, help='Seconds measured per repetition')
+    run_parser.add_argument('--repeat', type=int, default=3, help='Measurements, each on fresh topics')
+    run_parser.add_argument('--batch-size', type=int, default=1, help='Messages per request')
+    run_parser.add_argument('--message-size', type=int, default=100, help='Bytes per message')
+    run_parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask')
+    run_parser.add_argument('--url', help='Load an already running broker instead of starting one')
+    run_parser.add_argument('--in-process', action='store_true',
+                            help='Call a broker engine in this process directly instead of over HTTP')
+    run_parser.add_argument('--output', help='File to write the results to as JSON')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions between two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.05,
+                                help='Relative change that counts as a regression (default 5%%)')
+    compare_parser.set_defaults(func=compare)
+    return parser.parse_args(argv)
+
+
+def main():
+    options = parse_args()
+    status = options.func(options)
+    if options.command == 'compare':
+        sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import sys
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import argparse
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from client_api_impl import ClientAPIImpl
+
+# Publish throughput with request logging off, sampled (the default: 1% of
+# publishes and pulls) and full (every request). The broker's log goes to a
+# file, as it would in production, rather than to a terminal.
+
+PORT = 5300
+MODES = {
+    'off': ['--log-level', 'warning'],
+    'sampled': [],
+    'full': ['--log-sample', '1'],
+}
+
+def start_server(mode, engine, log_file):
+    """Start a broker logging in the given mode and wait until it accepts connections."""
+    print(f"Starting the server with logging {mode}...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine, '--port', str(PORT)] + MODES[mode],
+                                      stdout=log_file, stderr=subprocess.DEVNULL)
+    with ClientAPIImpl(f'http://localhost:{PORT}', retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                break
+            except Exception:
+                time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+def measure_throughput(num_threads, messages_per_thread):
+    """Messages per second published by num_threads threads sharing one client."""
+    with ClientAPIImpl(f'http://localhost:{PORT}', pool_size=num_threads) as api:
+        pid = api.register_publisher()['pid']
+        api.create_topic(pid, 'bench_logging')
+
+        def publish():
+            for n in range(messages_per_thread):
+                api.send_message(pid, 'bench_logging', f'Message {n}')
+
+        threads = [threading.Thread(target=publish) for _ in range(num_threads)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return num_threads * messages_per_thread / (time.perf_counter() - start_time)
+
+def save_plot(modes, throughputs, filename):
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Logging')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.bar(modes, throughputs)
+        plt.title('Publish Throughput vs Request Logging')
+        plt.xlabel('Request logging')
+        plt.ylabel('Messages per second')
+        plt.grid(True, axis='y')
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish throughput with request logging off, sampled and full')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=500, help='Messages per thread')
+    args = parser.parse_args()
+
+    throughputs = []
+    for mode in MODES:
+        with tempfile.TemporaryFile() as log_file:
+            server_process = start_server(mode, args.engine, log_file)
+            try:
+                throughputs.append(measure_throughput(args.threads, args.messages))
+            finally:
+                stop_server(server_process)
+            log_file.seek(0)
+            lines = sum(1 for _ in log_file)
+        print(f"Logging {mode:>7}: {throughputs[-1]:10.0f} msgs/sec, {lines} log lines")
+    save_plot(list(MODES), throughputs, 'throughput_vs_logging.png')
+
+if __name__ == '__main__':
+    main()
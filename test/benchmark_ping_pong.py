@@ -4,6 +4,7 @@ import subprocess
 import time
 import matplotlib.pyplot as plt
 import threading
+import argparse
 import requests
 
 # Add the path to the client_api directory
@@ -11,13 +12,24 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
 from client_api_impl import ClientAPIImpl
 
 
-def start_server():
-    """Start the server."""
+def wait_until_ready():
+    """Poll the broker until it answers instead of sleeping a fixed time."""
+    with ClientAPIImpl(retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                return
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+
+
+def start_server(engine='flask'):
+    """Start the server with the given engine ('flask' or 'asyncio')."""
     print("Starting the server...")
     server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
     try:
-        server_process = subprocess.Popen(['python', server_path])
-        time.sleep(2)  # Allow time for the server to start
+        server_process = subprocess.Popen(['python', server_path, '--engine', engine])
+        wait_until_ready()
         print("Server started.")
         return server_process
     except Exception as e:
@@ -76,7 +88,7 @@ def subscribe_clients(api_clients, topics):
     def subscribe(client, topic, start_time):
         try:
             client.subscribe(client.register_publisher()['pid'], topic)
-            subscription_times.append(time.time() - start_time)
+            subscription_times.append(time.perf_counter() - start_time)
         except Exception as e:
             print(f"Error subscribing client to topic {topic}: {e}")
             sys.exit(1)
@@ -84,7 +96,7 @@ def subscribe_clients(api_clients, topics):
     threads = []
     for i in range(len(api_clients)):
         topic = topics[i % len(topics)] if topics else None
-        start_time = time.time()  # Start time for subscription
+        start_time = time.perf_counter()  # Start time for subscription
         thread = threading.Thread(target=subscribe, args=(api_clients[i], topic, start_time))
         threads.append(thread)
         thread.start()
@@ -102,7 +114,7 @@ def send_messages(api_clients, topics, messages):
     def send_message(client, topic, message, start_time):
         try:
             client.send_message(client.register_publisher()['pid'], topic, message)
-            send_times.append(time.time() - start_time)
+            send_times.append(time.perf_counter() - start_time)
         except Exception as e:
             print(f"Error sending message from client to topic {topic}: {e}")
             sys.exit(1)
@@ -111,7 +123,7 @@ def send_messages(api_clients, topics, messages):
     for i in range(len(api_clients)):
         topic = topics[i % len(topics)] if topics else None
         message = messages[i] if messages else None
-        start_time = time.time()  # Start time for sending
+        start_time = time.perf_counter()  # Start time for sending
         thread = threading.Thread(target=send_message, args=(api_clients[i], topic, message, start_time))
         threads.append(thread)
         thread.start()
@@ -129,7 +141,7 @@ def pull_messages(api_clients, topics):
     def pull_message(client, topic, start_time):
         try:
             messages = client.pull_messages(client.register_publisher()['pid'], topic)
-            pull_times.append(time.time() - start_time)
+            pull_times.append(time.perf_counter() - start_time)
         except requests.exceptions.RequestException as e:
             if "Max retries exceeded" in str(e):
                 print(f"Critical error pulling messages for client from topic {topic}: {e}")
@@ -141,7 +153,7 @@ def pull_messages(api_clients, topics):
     threads = []
     for i in range(len(api_clients)):
         topic = topics[i % len(topics)] if topics else None
-        start_time = time.time()  # Start time for pulling
+        start_time = time.perf_counter()  # Start time for pulling
         thread = threading.Thread(target=pull_message, args=(api_clients[i], topic, start_time))
         threads.append(thread)
         thread.start()
@@ -152,6 +164,53 @@ def pull_messages(api_clients, topics):
     return pull_times
 
 
+def measure_round_trip_latency(num_round_trips, use_stream):
+    """Measure the average ping-pong round trip between two clients.
+
+    With use_stream=False every hop costs a publish plus a (long-polling) pull;
+    with use_stream=True the broker pushes each message over an open stream, so
+    a hop is a publish plus one push.
+    """
+    api_client1, api_client2 = ClientAPIImpl(), ClientAPIImpl()
+    pid_1 = api_client1.register_publisher()['pid']
+    pid_2 = api_client2.register_publisher()['pid']
+    mode = 'stream' if use_stream else 'pull'
+    ping_topic, pong_topic = f'rt_ping_{mode}_{pid_1}', f'rt_pong_{mode}_{pid_2}'
+    api_client1.create_topic(pid_1, ping_topic)
+    api_client2.create_topic(pid_2, pong_topic)
+    api_client1.subscribe(pid_1, pong_topic)
+    api_client2.subscribe(pid_2, ping_topic)
+
+    def receive(client, sid, topic):
+        if use_stream:
+            yield from client.stream(sid, topic)
+        while True:
+            yield from client.pull_messages(sid, topic, wait_ms=5000)
+
+    def respond():
+        pings = receive(api_client2, pid_2, ping_topic)
+        for _ in range(num_round_trips):
+            api_client2.send_message(pid_2, pong_topic, next(pings))
+        pings.close()
+
+    responder = threading.Thread(target=respond)
+    responder.start()
+
+    pongs = receive(api_client1, pid_1, pong_topic)
+    round_trip_times = []
+    for i in range(num_round_trips):
+        start_time = time.perf_counter()
+        api_client1.send_message(pid_1, ping_topic, f'Ping {i}')
+        next(pongs)
+        round_trip_times.append(time.perf_counter() - start_time)
+    pongs.close()
+    responder.join()
+    api_client1.close()
+    api_client2.close()
+
+    return sum(round_trip_times) / len(round_trip_times)
+
+
 def save_plot(data, x_values, title, xlabel, ylabel, filename):
     """Save the plot for given data."""
     try:
@@ -180,11 +239,25 @@ def save_plot(data, x_values, title, xlabel, ylabel, filename):
         print(f"Error saving plot {filename}: {e}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask',
+                        help='Broker engine to benchmark against')
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     initial_clients = 100
     max_clients = 3000
     increment = 500
-    server_process = start_server()
+    server_process = start_server(args.engine)
+
+    # Round-trip latency: two requests per hop (pull) vs one push per hop (stream)
+    pull_round_trip = measure_round_trip_latency(200, use_stream=False)
+    stream_round_trip = measure_round_trip_latency(200, use_stream=True)
+    print(f"Average round trip with pull (two requests per hop): {pull_round_trip * 1000:.2f} ms")
+    print(f"Average round trip with stream (one push per hop): {stream_round_trip * 1000:.2f} ms")
 
     # Lists for timing data
     avg_client_creation_times = []
@@ -201,14 +274,14 @@ def main():
             x_values.append(num_clients)  # Track the number of clients
 
             # Track client creation time
-            start_time = time.time()
+            start_time = time.perf_counter()
             clients = create_clients(num_clients)
-            avg_client_creation_times.append(time.time() - start_time)
+            avg_client_creation_times.append(time.perf_counter() - start_time)
 
             # Track topic creation time
-            start_time = time.time()
+            start_time = time.perf_counter()
             topics = create_topics(clients, num_clients)
-            avg_topic_creation_times.append(time.time() - start_time)
+            avg_topic_creation_times.append(time.perf_counter() - start_time)
 
             # Prepare messages for sending
             messages = [f'Message from Client {i}' for i in range(num_clients)]
@@ -233,6 +306,10 @@ def main():
             avg_send_times.append((sum(send_times_phase_1) + sum(send_times_phase_2)) / (len(send_times_phase_1) + len(send_times_phase_2)))
             avg_pull_times.append((sum(pull_times_phase_1) + sum(pull_times_phase_2)) / (len(pull_times_phase_1) + len(pull_times_phase_2)))
 
+            # Release each client's pooled connections before the next round
+            for client in clients:
+                client.close()
+
             time.sleep(1)  # Short delay between tests
 
             # Increment client count
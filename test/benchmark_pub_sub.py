@@ -4,18 +4,29 @@ import subprocess
 import time
 import matplotlib.pyplot as plt
 import threading
+import argparse
 import requests
 
 # Add the path to the client_api directory
 sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
 from client_api_impl import ClientAPIImpl
 
-def start_server():
-    """Start the server."""
+def wait_until_ready():
+    """Poll the broker until it answers instead of sleeping a fixed time."""
+    with ClientAPIImpl(retries=0) as api:
+        for _ in range(100):
+            try:
+                api.register_publisher()
+                return
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+
+def start_server(engine='flask'):
+    """Start the server with the given engine ('flask' or 'asyncio')."""
     print("Starting the server...")
     server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
-    server_process = subprocess.Popen(['python', server_path])
-    time.sleep(2)  # Allow time for the server to start
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine])
+    wait_until_ready()
     print("Server started.")
     return server_process
 
@@ -30,9 +41,9 @@ def create_publishers(api, num_publishers):
     publishers = []
     publisher_times = []
     def register_publisher():
-        start_time = time.time()
+        start_time = time.perf_counter()
         publisher_response = api.register_publisher()
-        end_time = time.time()
+        end_time = time.perf_counter()
         publishers.append(publisher_response['pid'])
         publisher_times.append(end_time - start_time)
 
@@ -49,10 +60,10 @@ def create_topics(api, publishers):
     topics = []
     topic_times = []
     def create_topic(publisher_pid):
-        start_time = time.time()
+        start_time = time.perf_counter()
         topic_name = f'topic_{publisher_pid}'
         api.create_topic(publisher_pid, topic_name)
-        end_time = time.time()
+        end_time = time.perf_counter()
         topics.append(topic_name)
         topic_times.append(end_time - start_time)
 
@@ -69,9 +80,9 @@ def create_subscribers(api, num_subscribers):
     subscribers = []
     subscriber_times = []
     def register_subscriber():
-        start_time = time.time()
+        start_time = time.perf_counter()
         subscriber_response = api.register_subscriber()
-        end_time = time.time()
+        end_time = time.perf_counter()
         subscribers.append(subscriber_response['sid'])
         subscriber_times.append(end_time - start_time)
 
@@ -87,9 +98,9 @@ def create_subscribers(api, num_subscribers):
 def subscribe_to_topics(api, subscribers, topics):
     subscribe_times = []
     def subscribe(subscriber_sid, topic_name):
-        start_time = time.time()
+        start_time = time.perf_counter()
         api.subscribe(subscriber_sid, topic_name)
-        end_time = time.time()
+        end_time = time.perf_counter()
         subscribe_times.append(end_time - start_time)
 
     threads = [threading.Thread(target=subscribe, args=(subscribers[i], topics[i])) for i in range(len(subscribers))]
@@ -104,9 +115,9 @@ def subscribe_to_topics(api, subscribers, topics):
 def send_messages(api, publishers, topics, message):
     send_times = []
     def send_message(publisher_pid, topic_name):
-        start_time = time.time()
+        start_time = time.perf_counter()
         api.send_message(publisher_pid, topic_name, message)
-        end_time = time.time()
+        end_time = time.perf_counter()
         send_times.append(end_time - start_time)
 
     threads = [threading.Thread(target=send_message, args=(publishers[i], topics[i])) for i in range(len(publishers))]
@@ -121,7 +132,7 @@ def send_messages(api, publishers, topics, message):
 def pull_messages(api, subscribers, topics):
     pull_times = []
     def pull_message(subscriber_sid, topic_name):
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             api.pull_messages(subscriber_sid, topic_name)
         except requests.exceptions.ConnectionError as e:
@@ -130,7 +141,7 @@ def pull_messages(api, subscribers, topics):
         except requests.exceptions.RequestException as e:
             print(f"Error pulling message: {e}")
             raise  # Raise the exception to stop execution
-        end_time = time.time()
+        end_time = time.perf_counter()
         pull_times.append(end_time - start_time)
 
     threads = [threading.Thread(target=pull_message, args=(subscribers[i], topics[i])) for i in range(len(subscribers))]
@@ -143,6 +154,33 @@ def pull_messages(api, subscribers, topics):
     return avg_pull_time
 
 
+def benchmark_batch_sizes(api, batch_sizes=(1, 10, 100, 1000), total_messages=5000):
+    """Measure publish throughput (msgs/sec) for different batch sizes."""
+    pid = api.register_publisher()['pid']
+    topic_name = f'batch_topic_{pid}'
+    api.create_topic(pid, topic_name)
+    sid = api.register_subscriber()['sid']
+    api.subscribe(sid, topic_name)
+
+    throughputs = []
+    for batch_size in batch_sizes:
+        batch = [f'Message {i}' for i in range(batch_size)]
+        num_batches = max(1, total_messages // batch_size)
+        start_time = time.perf_counter()
+        for _ in range(num_batches):
+            if batch_size == 1:
+                api.send_message(pid, topic_name, batch[0])
+            else:
+                api.send_messages(pid, topic_name, batch)
+        elapsed = time.perf_counter() - start_time
+        throughput = num_batches * batch_size / elapsed
+        throughputs.append(throughput)
+        print(f"Batch size {batch_size}: {throughput:.0f} msgs/sec")
+        api.pull_messages(sid, topic_name)  # Drain so the log doesn't grow across runs
+
+    return throughputs
+
+
 def save_plot(data, x_values, title, xlabel, ylabel, filename):
     """Save the plot for given data."""
     try:
@@ -172,7 +210,8 @@ def save_plot(data, x_values, title, xlabel, ylabel, filename):
 
 def benchmark(num_clients):
     """Benchmark all API functionalities with increasing clients."""
-    api = ClientAPIImpl()
+    # One pooled client shared by every thread, as a real multi-threaded app would
+    api = ClientAPIImpl(pool_size=100)
     half_clients = num_clients // 2
 
     # Create publishers
@@ -195,17 +234,25 @@ def benchmark(num_clients):
 
     # Pull messages
     avg_pull_time = pull_messages(api, subscribers, topics)
+    api.close()
 
     return (
         avg_publisher_time, avg_topic_time, avg_subscriber_time,
         avg_subscribe_time, avg_send_time, avg_pull_time
     )
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask',
+                        help='Broker engine to benchmark against')
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     num_clients = 100  # Start with 100 clients
     max_clients = 3000
     increment = 500
-    server_process = start_server()
+    server_process = start_server(args.engine)
 
     # Initialize lists to hold average times
     avg_publisher_times = []
@@ -216,6 +263,12 @@ def main():
     avg_pull_times = []
 
     try:
+        batch_sizes = [1, 10, 100, 1000]
+        with ClientAPIImpl() as api:
+            throughputs = benchmark_batch_sizes(api, batch_sizes)
+        save_plot(throughputs, batch_sizes, 'Publish Throughput by Batch Size', 'Batch Size', 'Messages per second',
+                  'batch_send_throughput.png')
+
         while num_clients <= max_clients:
             print(f"Test for {num_clients} clients")
             time.sleep(2)
@@ -0,0 +1,148 @@
+import sys
+import os
+import subprocess
+import time
+import asyncio
+import argparse
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from async_client_api_impl import AsyncClientAPIImpl
+
+# asyncio variant of benchmark_pub_sub.py: every client is a coroutine
+# sharing one pooled AsyncClientAPIImpl, so a single process can drive
+# thousands of concurrent clients without paying for a thread each.
+
+def start_server(engine='flask'):
+    """Start the server with the given engine ('flask' or 'asyncio')."""
+    print("Starting the server...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine])
+    time.sleep(2)  # Allow time for the server to start
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    """Stop the server."""
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+async def timed(operation, *args):
+    """Run one API call and return (result, elapsed seconds)."""
+    start_time = time.perf_counter()
+    result = await operation(*args)
+    return result, time.perf_counter() - start_time
+
+async def run_concurrently(calls):
+    """Run (operation, args) calls concurrently; return results and average time."""
+    timings = await asyncio.gather(*(timed(operation, *args) for operation, args in calls))
+    results = [result for result, _ in timings]
+    avg_time = sum(elapsed for _, elapsed in timings) / len(timings)
+    return results, avg_time
+
+async def benchmark(api, num_clients):
+    """Benchmark all API functionalities with num_clients concurrent clients."""
+    half_clients = num_clients // 2
+
+    # Create publishers
+    responses, avg_publisher_time = await run_concurrently([(api.register_publisher, ())] * half_clients)
+    publishers = [response['pid'] for response in responses]
+
+    # Create topics
+    topics = [f'topic_{pid}' for pid in publishers]
+    _, avg_topic_time = await run_concurrently([(api.create_topic, (pid, topic)) for pid, topic in zip(publishers, topics)])
+
+    # Create subscribers
+    responses, avg_subscriber_time = await run_concurrently([(api.register_subscriber, ())] * half_clients)
+    subscribers = [response['sid'] for response in responses]
+
+    # Subscribe to topics
+    _, avg_subscribe_time = await run_concurrently([(api.subscribe, (sid, topic)) for sid, topic in zip(subscribers, topics)])
+
+    # Send messages
+    message = f'Message from {num_clients} clients'
+    _, avg_send_time = await run_concurrently([(api.send_message, (pid, topic, message)) for pid, topic in zip(publishers, topics)])
+
+    # Pull messages
+    _, avg_pull_time = await run_concurrently([(api.pull_messages, (sid, topic)) for sid, topic in zip(subscribers, topics)])
+
+    return (
+        avg_publisher_time, avg_topic_time, avg_subscriber_time,
+        avg_subscribe_time, avg_send_time, avg_pull_time
+    )
+
+def save_plot(data, x_values, title, xlabel, ylabel, filename):
+    """Save the plot for given data."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'PubSubAsync')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.plot(x_values, data)
+        plt.title(title)
+        plt.xlabel(xlabel)
+        plt.ylabel(ylabel)
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+async def run_benchmarks(client_counts, pool_size):
+    results = []
+    async with AsyncClientAPIImpl(pool_size=pool_size) as api:
+        for num_clients in client_counts:
+            print(f"Test for {num_clients} clients")
+            results.append(await benchmark(api, num_clients))
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='asyncio',
+                        help='Broker engine to benchmark against')
+    parser.add_argument('--pool-size', type=int, default=100,
+                        help='Connections shared by all client coroutines')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    client_counts = [100, 1000, 2500, 5000, 10000]
+    server_process = start_server(args.engine)
+
+    results = []
+    try:
+        results = asyncio.run(run_benchmarks(client_counts, args.pool_size))
+    except Exception as e:
+        print(f"An error occurred: {e}. Ending the execution.")
+    finally:
+        stop_server(server_process)
+
+    if not results:
+        return
+    x_values = client_counts[:len(results)]
+    (
+        avg_publisher_times, avg_topic_times, avg_subscriber_times,
+        avg_subscribe_times, avg_send_times, avg_pull_times
+    ) = zip(*results)
+    save_plot(avg_publisher_times, x_values, 'Average Time to Create Publishers', 'Number of Publishers', 'Time (seconds)',
+              'average_create_publishers.png')
+    save_plot(avg_topic_times, x_values, 'Average Time to Create Topics', 'Number of Topics', 'Time (seconds)',
+              'average_create_topics.png')
+    save_plot(avg_subscriber_times, x_values, 'Average Time to Create Subscribers', 'Number of Subscribers', 'Time (seconds)',
+              'average_create_subscribers.png')
+    save_plot(avg_subscribe_times, x_values, 'Average Time to Subscribe to Topics', 'Number of Subscriptions', 'Time (seconds)',
+              'average_subscribe_topics.png')
+    save_plot(avg_send_times, x_values, 'Average Time to Send Messages', 'Number of Messages Sent', 'Time (seconds)',
+              'average_send_messages.png')
+    save_plot(avg_pull_times, x_values, 'Average Time to Pull Messages', 'Number of Messages Pulled', 'Time (seconds)',
+              'average_pull_messages.png')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+import tempfile
+import matplotlib.pyplot as plt
+
+# Add the path to the server directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+from broker import BrokerEngine
+
+# Restart-to-ready time of a persistent broker as its history grows, when
+# recovery replays the whole write-ahead log versus when it loads a snapshot
+# and replays only the tail written after it.
+
+TAIL_MESSAGES = 1000  # Published after the snapshot, in both scenarios
+
+def close(engine):
+    """Close engine's write-ahead log, as a broker shutting down would."""
+    if engine.wal is not None:
+        engine.wal.close()
+
+def build_history(data_dir, num_topics, num_messages, snapshot):
+    """Publish num_messages across num_topics (half of them pulled), then the tail."""
+    engine = BrokerEngine()
+    engine.enable_persistence(data_dir, 'os', snapshot_interval_s=0)
+    for i in range(num_topics):
+        engine.create_topic('P1', f'topic_{i}')
+        engine.subscribe('S1', f'topic_{i}')
+    batch = ['x' * 100] * 10
+    for n in range(num_messages // len(batch)):
+        engine.send_messages('P1', [{'topic': f'topic_{n % num_topics}', 'messages': batch}])
+        if n % 2:
+            engine.pull_messages('S1', f'topic_{n % num_topics}')
+    if snapshot:
+        engine.write_snapshot(data_dir)
+    for n in range(TAIL_MESSAGES):
+        engine.send_message('P1', f'topic_{n % num_topics}', 'tail')
+    close(engine)
+
+def restart_time(num_topics, num_messages, snapshot):
+    with tempfile.TemporaryDirectory() as data_dir:
+        build_history(data_dir, num_topics, num_messages, snapshot)
+        engine = BrokerEngine()
+        recovery = engine.enable_persistence(data_dir, 'os', snapshot_interval_s=0)
+        close(engine)
+    return recovery['recovery_seconds'], recovery['replayed_records']
+
+def save_plot(x_values, full_replay, snapshot_replay, xlabel, filename):
+    """Save restart times with and without a snapshot."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Recovery')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.plot(x_values, full_replay, label='full log replay')
+        plt.plot(x_values, snapshot_replay, label='snapshot + tail replay')
+        plt.title('Restart-to-Ready Time')
+        plt.xlabel(xlabel)
+        plt.ylabel('Time (seconds)')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def sweep(label, cases, x_values, filename):
+    full_replay, snapshot_replay = [], []
+    for num_topics, num_messages in cases:
+        full_time, full_records = restart_time(num_topics, num_messages, snapshot=False)
+        snap_time, snap_records = restart_time(num_topics, num_messages, snapshot=True)
+        full_replay.append(full_time)
+        snapshot_replay.append(snap_time)
+        print(f"{num_topics:>6} topics, {num_messages:>8} messages: "
+              f"full replay {full_time:.3f}s ({full_records} records), "
+              f"snapshot + tail {snap_time:.3f}s ({snap_records} records)")
+    save_plot(x_values, full_replay, snapshot_replay, label, filename)
+
+def main():
+    message_counts = [10000, 50000, 100000, 200000]
+    sweep('Messages Published', [(10, count) for count in message_counts], message_counts,
+          'restart_time_by_messages.png')
+
+    topic_counts = [10, 100, 1000, 5000]
+    sweep('Topics', [(count, 50000) for count in topic_counts], topic_counts,
+          'restart_time_by_topics.png')
+
+if __name__ == '__main__':
+    main()
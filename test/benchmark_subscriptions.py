@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+import matplotlib.pyplot as plt
+
+# Add the path to the server directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+from broker import BrokerEngine
+
+# Latency of subscribe and pull against the broker core as a topic's
+# subscriber count grows. It runs in-process so the cost of the subscription
+# registry isn't hidden behind HTTP; with constant-time membership checks
+# both lines should stay flat.
+
+SAMPLES = 1000
+
+def measure_latencies(num_subscribers):
+    """Average subscribe, re-subscribe and pull latency in microseconds on a
+    topic that already has num_subscribers subscribers."""
+    broker = BrokerEngine()
+    broker.create_topic('P0', 'topic')
+    for i in range(num_subscribers):
+        broker.subscribe(f'S{i}', 'topic')
+    sample = [f'New{i}' for i in range(SAMPLES)]
+
+    start_time = time.perf_counter()
+    for sid in sample:
+        broker.subscribe(sid, 'topic')
+    subscribe_us = (time.perf_counter() - start_time) / SAMPLES * 1e6
+
+    start_time = time.perf_counter()
+    for sid in sample:
+        broker.subscribe(sid, 'topic')  # Already subscribed: must not add a second delivery
+    resubscribe_us = (time.perf_counter() - start_time) / SAMPLES * 1e6
+
+    broker.send_message('P0', 'topic', 'Message')
+    start_time = time.perf_counter()
+    for sid in sample:
+        assert broker.pull_messages(sid, 'topic')['messages'] == ['Message']
+    pull_us = (time.perf_counter() - start_time) / SAMPLES * 1e6
+    return subscribe_us, resubscribe_us, pull_us
+
+def save_plot(subscriber_counts, results, filename):
+    """Save one latency line per operation on a log-scaled subscriber axis."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Subscriptions')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        for operation, latencies in results.items():
+            plt.plot(subscriber_counts, latencies, marker='o', label=operation)
+        plt.xscale('log')
+        plt.title('Subscription Latency vs Subscribers per Topic')
+        plt.xlabel('Subscribers per Topic')
+        plt.ylabel('Average latency (µs)')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    subscriber_counts = [10, 100, 1000, 10000, 100000]
+    results = {'subscribe': [], 're-subscribe': [], 'pull': []}
+    for num_subscribers in subscriber_counts:
+        latencies = measure_latencies(num_subscribers)
+        for operation, latency in zip(results, latencies):
+            results[operation].append(latency)
+        print(f"{num_subscribers:>6} subscribers: subscribe {latencies[0]:.2f} µs, "
+              f"re-subscribe {latencies[1]:.2f} µs, pull {latencies[2]:.2f} µs")
+    save_plot(subscriber_counts, results, 'subscription_latency.png')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import sys
+import os
+import time
+import threading
+import matplotlib.pyplot as plt
+
+# Add the path to the server directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+from broker import BrokerEngine
+
+# Publish + pull throughput of the broker core as the number of threads
+# grows, with every thread on its own topic versus all threads sharing one.
+# It runs in-process so only the broker's own locking is measured. Under
+# CPython's GIL the totals stay roughly flat rather than scaling with the
+# thread count; what to look out for is throughput collapsing as threads are
+# added, which is what contention on a broker-wide lock looks like.
+
+def run(num_threads, shared, operations_per_thread):
+    """Publish/pull pairs per second across num_threads threads."""
+    broker = BrokerEngine()
+    names = ['topic_0'] * num_threads if shared else [f'topic_{i}' for i in range(num_threads)]
+    for i, topic in enumerate(names):
+        broker.create_topic('P0', topic)
+        broker.subscribe(f'S{i}', topic)
+
+    def work(index):
+        sid, topic = f'S{index}', names[index]
+        for n in range(operations_per_thread):
+            broker.send_message('P0', topic, f'Message {n}')
+            broker.pull_messages(sid, topic)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(num_threads)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    return num_threads * operations_per_thread / elapsed
+
+def save_plot(thread_counts, results, filename):
+    """Save one throughput line per topic layout."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Threads')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        for layout, throughputs in results.items():
+            plt.plot(thread_counts, throughputs, marker='o', label=layout)
+        plt.title('Publish + Pull Throughput vs Threads')
+        plt.xlabel('Threads')
+        plt.ylabel('Publish/pull pairs per second')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    thread_counts = [1, 2, 4, 8, 16, 32]
+    operations_per_thread = 5000
+    results = {'topic per thread': [], 'one shared topic': []}
+    for num_threads in thread_counts:
+        for layout, shared in (('topic per thread', False), ('one shared topic', True)):
+            throughput = run(num_threads, shared, operations_per_thread)
+            results[layout].append(throughput)
+            print(f"{num_threads:>3} threads, {layout:>16}: {throughput:>10.0f} pairs/sec")
+    save_plot(thread_counts, results, 'throughput_vs_threads.png')
+
+if __name__ == '__main__':
+    main()
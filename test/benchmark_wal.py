@@ -0,0 +1,85 @@
+import sys
+import os
+import time
+import tempfile
+import threading
+import matplotlib.pyplot as plt
+
+# Add the path to the server directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+from broker import BrokerEngine
+
+# Publish throughput of the broker core for each write-ahead log fsync
+# policy. It runs in-process, so HTTP costs don't drown out the cost of
+# persistence; concurrent publisher threads show how group commit lets
+# them share fsyncs under the 'always' policy.
+
+POLICIES = ['memory', 'os', 'interval', 'always']
+
+def fresh_broker(policy, data_dir):
+    """Return a new broker engine, persisting to data_dir unless policy is 'memory'."""
+    engine = BrokerEngine()
+    if policy != 'memory':
+        engine.enable_persistence(data_dir, policy)
+    return engine
+
+def publish_throughput(policy, num_threads, messages_per_thread):
+    """Messages per second published by num_threads concurrent publishers."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        engine = fresh_broker(policy, data_dir)
+        for i in range(num_threads):
+            engine.create_topic(f'P{i}', f'topic_{i}')
+            engine.subscribe(f'S{i}', f'topic_{i}')
+
+        def publish(index):
+            for n in range(messages_per_thread):
+                engine.send_message(f'P{index}', f'topic_{index}', f'Message {n}')
+
+        threads = [threading.Thread(target=publish, args=(i,)) for i in range(num_threads)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        if engine.wal is not None:
+            engine.wal.close()  # Close the log before the directory goes away
+    return num_threads * messages_per_thread / elapsed
+
+def save_plot(results, thread_counts, filename):
+    """Save one throughput line per policy."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'WAL')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        for policy, throughputs in results.items():
+            plt.plot(thread_counts, throughputs, label=policy)
+        plt.title('Publish Throughput by fsync Policy')
+        plt.xlabel('Publisher Threads')
+        plt.ylabel('Messages per second')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    thread_counts = [1, 4, 16, 64]
+    messages_per_thread = 500
+    results = {}
+    for policy in POLICIES:
+        results[policy] = []
+        for num_threads in thread_counts:
+            throughput = publish_throughput(policy, num_threads, messages_per_thread)
+            results[policy].append(throughput)
+            print(f"{policy:>8}, {num_threads:>3} threads: {throughput:>10.0f} msgs/sec")
+    save_plot(results, thread_counts, 'publish_throughput_by_fsync_policy.png')
+
+if __name__ == '__main__':
+    main()
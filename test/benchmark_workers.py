@@ -0,0 +1,120 @@
+import sys
+import os
+import subprocess
+import time
+import argparse
+import multiprocessing
+import requests
+import matplotlib.pyplot as plt
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+from client_api_impl import ClientAPIImpl
+
+# Publish throughput for independent topics as the broker runs more worker
+# processes (message_broker.py --workers N). Clients run in their own
+# processes too, so they don't become the single-core bottleneck, and route
+# every topic to its owning worker with the hash ring.
+
+BASE_PORT = 5100
+
+def start_server(num_workers, engine='flask'):
+    """Start a broker with num_workers worker processes and wait until all of them answer."""
+    print(f"Starting the server with {num_workers} workers...")
+    server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+    server_process = subprocess.Popen(['python', server_path, '--engine', engine, '--port', str(BASE_PORT),
+                                       '--workers', str(num_workers)],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for url in worker_urls(num_workers):
+        for _ in range(100):
+            try:
+                requests.post(f'{url}/register_publisher', json={'pid': 'probe'})
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+    print("Server started.")
+    return server_process
+
+def stop_server(server_process):
+    """Stop the server and its workers."""
+    print("Stopping the server...")
+    server_process.terminate()
+    server_process.wait()
+    print("Server stopped.")
+
+def worker_urls(num_workers):
+    return [f'http://localhost:{BASE_PORT + index}' for index in range(num_workers)]
+
+def publish(urls, client_index, num_topics, messages_per_topic, start_barrier):
+    """One client process: publish messages_per_topic messages to each of its own topics."""
+    with ClientAPIImpl(urls) as api:
+        pid = f'P{client_index}'
+        topics = [f'client{client_index}_topic{n}' for n in range(num_topics)]
+        for topic in topics:
+            api.create_topic(pid, topic)
+            api.subscribe(f'S{client_index}', topic)
+        start_barrier.wait()
+        for n in range(messages_per_topic):
+            for topic in topics:
+                api.send_message(pid, topic, f'Message {n}')
+
+def measure_throughput(num_workers, num_clients, num_topics, messages_per_topic):
+    """Messages per second published by num_clients client processes."""
+    urls = worker_urls(num_workers)
+    start_barrier = multiprocessing.Barrier(num_clients + 1)
+    clients = [multiprocessing.Process(target=publish, args=(urls, i, num_topics, messages_per_topic, start_barrier))
+               for i in range(num_clients)]
+    for client in clients:
+        client.start()
+    start_barrier.wait()
+    start_time = time.perf_counter()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start_time
+    return num_clients * num_topics * messages_per_topic / elapsed
+
+def save_plot(worker_counts, throughputs, filename):
+    """Save throughput against worker count."""
+    try:
+        images_dir = os.path.join(os.path.dirname(__file__), 'Images', 'Workers')
+        if not os.path.exists(images_dir):
+            os.makedirs(images_dir)
+        file_path = os.path.join(images_dir, filename)
+
+        plt.figure()
+        plt.plot(worker_counts, throughputs, marker='o', label='measured')
+        # Linear scaling from the single-worker result, for reference
+        plt.plot(worker_counts, [throughputs[0] * count for count in worker_counts], linestyle='--', label='linear')
+        plt.title('Publish Throughput vs Broker Workers')
+        plt.xlabel('Broker worker processes')
+        plt.ylabel('Messages per second')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(file_path)
+        plt.close()
+
+        print(f"Plot saved successfully: {file_path}")
+    except Exception as e:
+        print(f"Error saving plot {filename}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep the number of broker worker processes')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    worker_counts = [count for count in (1, 2, 4, 8, 16, 32) if count <= args.max_workers] or [1]
+    throughputs = []
+    for num_workers in worker_counts:
+        server_process = start_server(num_workers, args.engine)
+        try:
+            # Enough client processes to keep every worker busy
+            throughput = measure_throughput(num_workers, num_clients=2 * num_workers, num_topics=4, messages_per_topic=250)
+        finally:
+            stop_server(server_process)
+        throughputs.append(throughput)
+        print(f"{num_workers:>3} workers: {throughput:>10.0f} msgs/sec")
+    save_plot(worker_counts, throughputs, 'throughput_vs_workers.png')
+
+if __name__ == '__main__':
+    main()
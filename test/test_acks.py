@@ -0,0 +1,118 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestAcks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server on its own port before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5009'])
+        cls.api = ClientAPIImpl('http://localhost:5009')
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'acks_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, [f'Message {n}' for n in range(10)])
+
+    def test_pages(self):
+        """max_messages and max_bytes bound each page, and pages carry their offsets."""
+        page = self.api.pull_batch(self.sid, self.topic, max_messages=4)
+        self.assertEqual(page['messages'], [f'Message {n}' for n in range(4)])
+        self.assertEqual(page['offsets'], [0, 1, 2, 3])
+        # Messages are 9 bytes each
+        page = self.api.pull_batch(self.sid, self.topic, max_bytes=20)
+        self.assertEqual(page['offsets'], [4, 5])
+        page = self.api.pull_batch(self.sid, self.topic, max_bytes=1)
+        self.assertEqual(page['offsets'], [6])  # The first message is always delivered
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic, max_bytes=30), ['Message 7', 'Message 8', 'Message 9'])
+
+    def test_ack_advances_position(self):
+        """Acked messages are gone; unacked ones come back after the visibility timeout."""
+        page = self.api.pull_batch(self.sid, self.topic, max_messages=6, visibility_timeout_ms=300)
+        self.assertTrue(self.api.ack(self.sid, self.topic, page['offsets'][3]))
+        # Messages 4 and 5 are still leased: the next page starts after them
+        self.assertEqual(self.api.pull_batch(self.sid, self.topic, visibility_timeout_ms=300)['offsets'], [6, 7, 8, 9])
+        time.sleep(0.4)
+        page = self.api.pull_batch(self.sid, self.topic, visibility_timeout_ms=300)
+        self.assertEqual(page['offsets'], list(range(4, 10)))
+        self.assertTrue(self.api.ack(self.sid, self.topic, 9))
+        time.sleep(0.4)
+        self.assertEqual(self.api.pull_batch(self.sid, self.topic)['messages'], [])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['messages'], 0)
+
+    def test_unacked_messages_are_retained(self):
+        """Leased messages stay in the log until they are acknowledged."""
+        self.api.pull_batch(self.sid, self.topic, visibility_timeout_ms=60000)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['messages'], 10)
+        self.api.ack(self.sid, self.topic, 4)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['messages'], 5)
+
+    def test_invalid_acks(self):
+        """Acks for messages never delivered or already acknowledged change nothing."""
+        self.assertFalse(self.api.ack(self.sid, self.topic, 3))
+        self.api.pull_batch(self.sid, self.topic, max_messages=2)
+        self.assertFalse(self.api.ack(self.sid, self.topic, 5))
+        self.assertTrue(self.api.ack(self.sid, self.topic, 1))
+        self.assertFalse(self.api.ack(self.sid, self.topic, 1))
+
+    def test_malformed_acks(self):
+        """A missing, negative or non-integer offset is rejected with 400 and acks nothing."""
+        self.api.pull_batch(self.sid, self.topic, max_messages=2, visibility_timeout_ms=60000)
+        for options in ({}, {'offset': None}, {'offset': -1}, {'offset': 1.5}, {'offset': '1'}):
+            response = requests.post('http://localhost:5009/ack', json={'sid': self.sid, 'topic': self.topic, **options})
+            self.assertEqual(response.status_code, 400, options)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['messages'], 10)
+
+    def test_long_poll_skips_leased_messages(self):
+        """A long poll with everything leased parks until something new is published."""
+        self.api.pull_batch(self.sid, self.topic)
+        start_time = time.time()
+        self.assertEqual(self.api.pull_batch(self.sid, self.topic, wait_ms=300)['messages'], [])
+        self.assertGreaterEqual(time.time() - start_time, 0.3)
+
+    def test_pattern_pull(self):
+        """Pattern pulls report offsets per topic, and each topic is acked on its own."""
+        prefix = f'ackpattern{self.pid}'
+        for name in ('a', 'b'):
+            self.api.create_topic(self.pid, f'{prefix}.{name}')
+        self.api.subscribe(self.sid, f'{prefix}.*')
+        self.api.send_messages(self.pid, f'{prefix}.a', ['A0', 'A1'])
+        self.api.send_message(self.pid, f'{prefix}.b', 'B0')
+        page = self.api.pull_batch(self.sid, f'{prefix}.*', visibility_timeout_ms=300)
+        self.assertEqual(page['offsets'], {f'{prefix}.a': [0, 1], f'{prefix}.b': [0]})
+        self.assertTrue(self.api.ack(self.sid, f'{prefix}.a', 1))
+        time.sleep(0.4)
+        page = self.api.pull_batch(self.sid, f'{prefix}.*')
+        self.assertEqual(page['topics'], {f'{prefix}.b': ['B0']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestAsyncEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the asyncio engine on its own port before any tests are run."""
+        print("Starting the asyncio server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--engine', 'asyncio', '--port', '5001'])
+        cls.api = ClientAPIImpl('http://localhost:5001')
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'async_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+
+    def test_publish_subscribe(self):
+        """Messages and batches published to the asyncio engine are pulled back in order."""
+        self.api.send_message(self.pid, self.topic, 'First')
+        self.api.send_messages(self.pid, self.topic, ['Second', 'Third'])
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['First', 'Second', 'Third'])
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), [])
+
+    def test_long_poll_times_out(self):
+        """A parked pull on an idle topic returns an empty list after wait_ms."""
+        start_time = time.time()
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic, wait_ms=300), [])
+        self.assertGreaterEqual(time.time() - start_time, 0.3)
+
+    def test_stream(self):
+        """Messages are pushed over the stream as they are published."""
+        self.api.send_messages(self.pid, self.topic, ['One', 'Two'])
+        stream = self.api.stream(self.sid, self.topic)
+        self.assertEqual([next(stream), next(stream)], ['One', 'Two'])
+        self.api.send_message(self.pid, self.topic, 'Three')
+        self.assertEqual(next(stream), 'Three')
+        stream.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import sys
+import asyncio
+import os
+import unittest
+import subprocess
+import threading
+import time
+import requests
+import aiohttp
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from async_client_api_impl import AsyncClientAPIImpl
+from broker import BrokerEngine
+from topic_log import Overloaded
+
+BASE_URL = 'http://localhost:5016'
+
+class TestBackpressure(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5016', '--retry-after-ms', '100'])
+        cls.api = ClientAPIImpl(BASE_URL)
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'backpressure_{self.pid}'
+        self.sid = self.api.register_subscriber()['sid']
+
+    def test_reject(self):
+        """A publish past a subscriber's cap is refused with 429 and Retry-After."""
+        self.api.create_topic(self.pid, self.topic, overflow='reject')
+        self.api.subscribe(self.sid, self.topic, max_backlog=3)
+        self.api.send_messages(self.pid, self.topic, ['First', 'Second', 'Third'])
+
+        response = requests.post(f'{BASE_URL}/send_message', json={'pid': self.pid, 'topic': self.topic, 'message': 'Fourth'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.json()['topics'], [self.topic])
+        self.assertEqual(response.json()['retry_after_ms'], 100)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['First', 'Second', 'Third'])
+
+    def test_reject_batches(self):
+        """Only the batches of full topics are refused; the rest go through."""
+        other = f'{self.topic}_other'
+        self.api.create_topic(self.pid, self.topic, max_messages=2, overflow='reject')
+        self.api.create_topic(self.pid, other)
+        self.api.subscribe(self.sid, self.topic)
+        self.api.subscribe(self.sid, other)
+
+        response = requests.post(f'{BASE_URL}/send_messages', json={'pid': self.pid, 'batches': [
+            {'topic': self.topic, 'messages': [1, 2, 3]}, {'topic': other, 'messages': [4, 5]}]})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['topics'], [self.topic])
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(self.api.pull_all(self.sid), {other: [4, 5]})
+
+    def test_drop_newest(self):
+        """drop_newest keeps what is stored and drops the messages that don't fit."""
+        self.api.create_topic(self.pid, self.topic, max_messages=3, overflow='drop_newest')
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, [f'Message {i}' for i in range(5)])
+
+        stats = self.api.topic_stats(self.topic)['topics'][self.topic]
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['evicted'], 0)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['Message 0', 'Message 1', 'Message 2'])
+
+    def test_drop_oldest_per_subscriber(self):
+        """A capped subscriber skips ahead without costing the others anything."""
+        self.api.create_topic(self.pid, self.topic)
+        capped_sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(capped_sid, self.topic, max_backlog=2)
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, [f'Message {i}' for i in range(5)])
+
+        self.assertEqual(self.api.pull_messages(capped_sid, self.topic), ['Message 3', 'Message 4'])
+        self.assertEqual(len(self.api.pull_messages(self.sid, self.topic)), 5)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['dropped'], 3)
+
+    def test_invalid_max_backlog(self):
+        """A negative or non-integer max_backlog is rejected with 400 and subscribes nothing."""
+        self.api.create_topic(self.pid, self.topic)
+        for max_backlog in (-1, 1.5, 'all', True):
+            response = requests.post(f'{BASE_URL}/subscribe', json={'sid': self.sid, 'topic': self.topic, 'max_backlog': max_backlog})
+            self.assertEqual(response.status_code, 400, max_backlog)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['subscribers'], 0)
+
+    def test_client_backs_off(self):
+        """A rejected publish is retried until a consumer makes room."""
+        self.api.create_topic(self.pid, self.topic, overflow='reject')
+        self.api.subscribe(self.sid, self.topic, max_backlog=1)
+        self.api.send_message(self.pid, self.topic, 'First')
+
+        consumer = threading.Timer(0.3, self.api.pull_messages, (self.sid, self.topic))
+        consumer.start()
+        self.api.send_message(self.pid, self.topic, 'Second')
+        consumer.join()
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['Second'])
+
+        with ClientAPIImpl(BASE_URL, overload_retries=0) as impatient:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                impatient.send_message(self.pid, self.topic, 'Third')
+                impatient.send_message(self.pid, self.topic, 'Fourth')
+
+    def test_async_client_backs_off(self):
+        """The asyncio client retries refused publishes too, and raises once it gives up."""
+        async def run():
+            async with AsyncClientAPIImpl(BASE_URL) as api:
+                await api.create_topic(self.pid, self.topic, overflow='reject')
+                await api.subscribe(self.sid, self.topic, max_backlog=1)
+                await api.send_message(self.pid, self.topic, 'First')
+
+                async def consume():
+                    await asyncio.sleep(0.3)
+                    return await api.pull_messages(self.sid, self.topic)
+                consumer = asyncio.ensure_future(consume())
+                await api.send_batches(self.pid, {self.topic: ['Second']})
+                self.assertEqual(await consumer, ['First'])
+                self.assertEqual(await api.pull_messages(self.sid, self.topic), ['Second'])
+
+            async with AsyncClientAPIImpl(BASE_URL, overload_retries=0) as impatient:
+                await impatient.send_message(self.pid, self.topic, 'Third')
+                with self.assertRaises(aiohttp.ClientResponseError) as raised:
+                    await impatient.send_message(self.pid, self.topic, 'Fourth')
+                self.assertEqual(raised.exception.status, 429)
+        asyncio.run(run())
+
+class TestBackpressureInProcess(unittest.TestCase):
+    def test_caps_survive_restore(self):
+        """Caps and overflow policies carry over when a topic is handed to another broker."""
+        engine = BrokerEngine()
+        api = ClientAPIImpl(engine)
+        api.create_topic('pid', 'orders', overflow='reject')
+        api.subscribe('sid', 'orders', max_backlog=2)
+        api.send_messages('pid', 'orders', ['First', 'Second'])
+        with self.assertRaises(Overloaded):
+            api.send_message('pid', 'orders', 'Third')
+
+        restored = BrokerEngine()
+        restored.import_topics({'topics': {'orders': engine.topics['orders'].snapshot()}, 'subscribers': {'orders': ['sid']}})
+        with self.assertRaises(Overloaded):
+            restored.send_message('pid', 'orders', 'Third')
+        self.assertEqual(ClientAPIImpl(restored).pull_messages('sid', 'orders'), ['First', 'Second'])
+
+if __name__ == '__main__':
+    unittest.main()
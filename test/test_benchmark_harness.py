@@ -0,0 +1,52 @@
+import sys
+import os
+import unittest
+
+# Add the path to the test directory, where the harness lives
+sys.path.append(os.path.dirname(__file__))
+
+from benchmark_harness import Histogram, compare_results
+
+def results(*runs):
+    return {'runs': [{'throughput_msgs_s': throughput, 'p99_ms': p99} for throughput, p99 in runs]}
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """Percentiles are read from the buckets to within 1%, and merging adds up."""
+        first, second = Histogram(), Histogram()
+        for n in range(1, 501):
+            first.observe(n / 1000)
+        for n in range(501, 1001):
+            second.observe(n / 1000)
+        first.merge(second)
+        summary = first.summary()
+        self.assertEqual(summary['count'], 1000)
+        for name, expected in (('p50_ms', 500), ('p99_ms', 990), ('p999_ms', 999)):
+            self.assertAlmostEqual(summary[name], expected, delta=expected * 0.01)
+        self.assertEqual(summary['max_ms'], 1000)
+        self.assertEqual(sum(first.buckets().values()), 1000)
+
+    def test_empty(self):
+        self.assertEqual(Histogram().summary(), {'count': 0})
+
+class TestCompare(unittest.TestCase):
+    def test_regression_beyond_threshold(self):
+        """Lower throughput and higher latency beyond the threshold are regressions."""
+        rows = {row['metric']: row for row in compare_results(results((1000, 10)), results((800, 13)), 0.05)}
+        self.assertTrue(rows['throughput_msgs_s']['regression'])
+        self.assertTrue(rows['p99_ms']['regression'])
+        self.assertAlmostEqual(rows['throughput_msgs_s']['change'], -0.2)
+
+    def test_improvements_and_small_changes(self):
+        rows = compare_results(results((1000, 10)), results((1030, 8)), 0.05)
+        self.assertFalse(any(row['regression'] for row in rows))
+
+    def test_noise(self):
+        """A change within the spread of repeated runs is not flagged."""
+        noisy = compare_results(results((1000, 10), (600, 10), (1400, 10)), results((850, 10), (500, 10), (1200, 10)), 0.05)
+        self.assertFalse(noisy[0]['regression'])
+        steady = compare_results(results((1000, 10), (990, 10), (1010, 10)), results((850, 10), (840, 10), (860, 10)), 0.05)
+        self.assertTrue(steady[0]['regression'])
+
+if __name__ == '__main__':
+    unittest.main()
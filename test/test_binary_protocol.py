@@ -0,0 +1,108 @@
+import sys
+import os
+import unittest
+import subprocess
+import threading
+import time
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+from binary_protocol import BrokerError, encode_frame, decode_frame
+
+class TestBinaryCodec(unittest.TestCase):
+    def test_round_trip(self):
+        """Every value type survives encoding and decoding."""
+        value = ['text', 'ünïcode', '', None, True, False, 0, -7, 2 ** 40, 1.5,
+                 [], {'messages': ['a', 'b'], 'count': 2, 'nested': {'x': [1, None]}}]
+        frame = encode_frame(42, 3, value)
+        self.assertEqual(decode_frame(frame[4:]), (42, 3, value))
+
+    def test_rejects_unknown_types(self):
+        with self.assertRaises(TypeError):
+            encode_frame(1, 1, [object()])
+
+class TestBinaryProtocol(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start a broker serving HTTP on 5007 and the binary protocol on 6007."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5007', '--binary-port', '6007'])
+        for _ in range(50):
+            try:
+                cls.api = ClientAPIImpl('tcp://localhost:6007')
+                break
+            except ConnectionError:
+                time.sleep(0.1)
+        cls.http_api = ClientAPIImpl('http://localhost:5007')
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.http_api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'binary_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+
+    def test_publish_subscribe(self):
+        """Messages and batches sent over TCP are pulled back in order."""
+        self.api.send_message(self.pid, self.topic, 'First')
+        self.assertEqual(self.api.send_messages(self.pid, self.topic, ['Second', 'Third'])['count'], 2)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['First', 'Second', 'Third'])
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), [])
+
+    def test_shares_state_with_http(self):
+        """Messages published over HTTP are pulled over TCP, and the other way round."""
+        self.http_api.send_message(self.pid, self.topic, 'Over HTTP')
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['Over HTTP'])
+        self.api.send_message(self.pid, self.topic, 'Over TCP')
+        self.assertEqual(self.http_api.pull_messages(self.sid, self.topic), ['Over TCP'])
+
+    def test_pipelining(self):
+        """Requests submitted without waiting are all answered, each with its own response."""
+        controller = self.api.api_controller
+        sends = [controller.submit('send_message', self.pid, self.topic, f'Message {n}') for n in range(500)]
+        pull = controller.submit('pull_messages', self.sid, self.topic, None, None)
+        for future in sends:
+            self.assertEqual(future.result(5)['message'], f'Message sent to topic {self.topic} by Publisher {self.pid}')
+        self.assertEqual(pull.result(5)['messages'], [f'Message {n}' for n in range(500)])
+
+    def test_long_poll_does_not_block_connection(self):
+        """A parked pull leaves the connection free for the requests behind it."""
+        received = []
+        poller = threading.Thread(target=lambda: received.extend(self.api.pull_messages(self.sid, self.topic, wait_ms=5000)))
+        poller.start()
+        time.sleep(0.2)
+        start_time = time.time()
+        self.api.send_message(self.pid, self.topic, 'Wake up')
+        poller.join(5)
+        self.assertLess(time.time() - start_time, 1)
+        self.assertEqual(received, ['Wake up'])
+
+    def test_unsubscribe_and_delete(self):
+        self.api.send_message(self.pid, self.topic, 'Kept')
+        self.api.unsubscribe(self.sid, self.topic)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), [])
+        self.api.delete_topic(self.pid, self.topic)
+        self.assertNotIn(self.topic, self.api.topic_stats()['topics'])
+
+    def test_rejected_request(self):
+        """Requests the broker can't serve fail with BrokerError and leave the connection usable."""
+        with self.assertRaises(BrokerError):
+            self.api.api_controller.submit('send_message', self.pid).result(5)
+        self.assertEqual(self.api.register_publisher()['pid'][0], 'P')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import sys
+import os
+import unittest
+import socket
+import subprocess
+import threading
+import time
+import requests
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from hash_ring import HashRing, partition_key
+import cluster_admin
+import broker
+from broker import BrokerEngine
+
+NODES = [f'http://localhost:{port}' for port in (5020, 5021, 5022)]
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        """Start three brokers; the cluster initially consists of the first two."""
+        print("Starting the servers...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        self.server_processes = [
+            subprocess.Popen(['python', server_path, '--port', url.rsplit(':', 1)[1], '--node-url', url,
+                              '--cluster', ','.join(NODES[:2])])
+            for url in NODES
+        ]
+        for url in NODES:
+            for _ in range(100):
+                try:
+                    requests.post(f'{url}/cluster', json={})
+                    break
+                except requests.exceptions.ConnectionError:
+                    time.sleep(0.1)
+        # The client only knows one broker and learns the rest from redirects
+        self.api = ClientAPIImpl(NODES[0])
+        self.pid = self.api.register_publisher()['pid']
+        self.sid = self.api.register_subscriber()['sid']
+        self.topics = [f'cluster_{i}' for i in range(30)]
+        for topic in self.topics:
+            self.api.create_topic(self.pid, topic)
+            self.api.subscribe(self.sid, topic)
+            self.api.send_message(self.pid, topic, f'{topic} before')
+        print("Servers started.")
+
+    def tearDown(self):
+        """Stop the servers after each test."""
+        print("Stopping the servers...")
+        self.api.close()
+        for process in self.server_processes:
+            process.terminate()
+        for process in self.server_processes:
+            process.wait()
+        print("Servers stopped.")
+
+    def hosted(self, url):
+        return set(requests.post(f'{url}/topic_stats', json={}).json()['topics'])
+
+    def test_redirects_to_owner(self):
+        """Topics live on their owners, and a client that knew one broker learned the cluster."""
+        ring = HashRing(NODES[:2])
+        for url in NODES[:2]:
+            self.assertEqual(self.hosted(url), {topic for topic in self.topics if ring.node_for(partition_key(topic)) == url})
+        self.assertEqual(self.api.api_controller.nodes, NODES[:2])
+        for topic in self.topics:
+            self.assertEqual(self.api.pull_messages(self.sid, topic), [f'{topic} before'])
+
+    def test_pattern_spanning_all_brokers(self):
+        """A pattern with no owner goes to the broker the client was given and matches the topics there."""
+        self.assertEqual(len(self.api.api_controller.nodes), 2)
+        ring = HashRing(NODES[:2])
+        local = next(topic for topic in self.topics if ring.node_for(partition_key(topic)) == NODES[0])
+        self.api.subscribe(self.sid, '*.created')
+        self.api.create_topic(self.pid, f'{local}.created')
+        self.api.send_message(self.pid, f'{local}.created', 'Created')
+        self.assertEqual(self.api.pull_messages(self.sid, '*.created'), ['Created'])
+        self.api.unsubscribe(self.sid, '*.created')
+
+    def test_adding_a_node_moves_only_its_topics(self):
+        """Only the topics the new node owns move, with their backlog and subscriptions."""
+        before = {url: self.hosted(url) for url in NODES[:2]}
+        cluster_admin.set_members(NODES)
+
+        ring = HashRing(NODES)
+        gained = {topic for topic in self.topics if ring.node_for(partition_key(topic)) == NODES[2]}
+        self.assertTrue(gained)
+        self.assertEqual(self.hosted(NODES[2]), gained)
+        for url in NODES[:2]:
+            self.assertEqual(self.hosted(url), before[url] - gained)
+
+        for topic in self.topics:
+            self.api.send_message(self.pid, topic, f'{topic} after')
+        for topic in self.topics:
+            self.assertEqual(self.api.pull_messages(self.sid, topic), [f'{topic} before', f'{topic} after'])
+
+    def test_removing_a_node(self):
+        """A leaving node hands all of its topics to the remaining one."""
+        cluster_admin.set_members(NODES[:1])
+        self.assertEqual(self.hosted(NODES[1]), set())
+        self.assertEqual(self.hosted(NODES[0]), set(self.topics))
+        self.server_processes[1].terminate()
+        self.server_processes[1].wait()
+        for topic in self.topics:
+            self.assertEqual(self.api.pull_messages(self.sid, topic), [f'{topic} before'])
+
+class TestHandoverLocking(unittest.TestCase):
+    def setUp(self):
+        """One in-process broker in the middle of a membership change."""
+        self.engine = BrokerEngine()
+        self.engine.enable_cluster('http://localhost:5090', ['http://localhost:5090'])
+        self.engine.settled.clear()
+
+    def tearDown(self):
+        self.engine.settled.set()
+
+    def test_create_waits_without_blocking_imports(self):
+        """A create waiting for the handover to finish doesn't hold up the import that finishes it."""
+        creator = threading.Thread(target=self.engine.create_topic, args=('P1', 'orders'))
+        creator.start()
+        time.sleep(0.2)
+        start_time = time.time()
+        self.engine.import_topics({'topics': {}, 'subscribers': {}})
+        self.assertLess(time.time() - start_time, 1)
+        self.engine.settled.set()
+        creator.join()
+        self.assertIn('orders', self.engine.topics)
+
+    def test_handover_to_a_hung_peer(self):
+        """A peer that never answers fails the handover but leaves the topics here, unlocked."""
+        peer = socket.socket()
+        peer.bind(('localhost', 0))
+        peer.listen()  # Accepts connections but never reads or answers
+        hung_url = f'http://localhost:{peer.getsockname()[1]}'
+        self.engine.settled.set()
+        self.engine.create_topic('P1', 'orders')
+        self.engine.subscribe('S1', 'orders')
+        self.engine.update_cluster([hung_url])
+        broker.HANDOVER_TIMEOUT_S, timeout = 0.5, broker.HANDOVER_TIMEOUT_S
+        try:
+            with self.assertRaises(requests.exceptions.Timeout):
+                self.engine.rebalance()
+        finally:
+            broker.HANDOVER_TIMEOUT_S = timeout
+            peer.close()
+        self.engine.send_message('P1', 'orders', 'Still here')
+        self.assertEqual(self.engine.pull_messages('S1', 'orders')['messages'], ['Still here'])
+        self.assertTrue(self.engine.topics_lock.acquire(timeout=1))
+        self.engine.topics_lock.release()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from compression import accepts_gzip
+
+DOCUMENT = {'items': [{'id': n, 'name': f'Item {n}', 'tags': ['red', 'green', 'blue']} for n in range(50)]}
+
+class TestNegotiation(unittest.TestCase):
+    def test_accepts_gzip(self):
+        """gzip is accepted when listed, or through *, unless its quality is zero."""
+        self.assertTrue(accepts_gzip('gzip, deflate'))
+        self.assertTrue(accepts_gzip('deflate, GZIP;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('identity'))
+        self.assertFalse(accepts_gzip(None))
+
+class TestCompression(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server on its own port, keeping large messages compressed, before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5015',
+                                               '--compress-at-rest-min-bytes', '512'])
+        cls.url = 'http://localhost:5015'
+        cls.api = ClientAPIImpl(cls.url, compression=True)
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'compression_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+
+    def pull(self, accept_encoding):
+        return requests.post(f'{self.url}/pull_messages', json={'sid': self.sid, 'topic': self.topic},
+                             headers={'Accept-Encoding': accept_encoding})
+
+    def test_large_responses_are_compressed(self):
+        """Large responses are gzipped only for clients that accept it."""
+        self.api.send_messages(self.pid, self.topic, [DOCUMENT, DOCUMENT])
+        response = self.pull('gzip')
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(response.json()['messages'], [DOCUMENT, DOCUMENT])
+        self.api.send_message(self.pid, self.topic, DOCUMENT)
+        response = self.pull('identity')
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(response.json()['messages'], [DOCUMENT])
+
+    def test_small_responses_are_not(self):
+        """Bodies below the threshold go out as they are."""
+        self.api.send_message(self.pid, self.topic, 'Small')
+        response = self.pull('gzip')
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(response.headers.get('Accept-Encoding'), 'gzip')
+
+    def test_compressed_requests(self):
+        """Once the broker has advertised gzip, large request bodies are sent compressed."""
+        self.assertIn(self.url, self.api.api_controller.gzip_nodes)
+        kwargs = self.api.api_controller._encode(b'x' * 2048, self.url)
+        self.assertEqual(kwargs['headers'].get('Content-Encoding'), 'gzip')
+        text = 'Text ' * 1000
+        self.api.send_messages(self.pid, self.topic, [DOCUMENT, text, 'Small'])
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), [DOCUMENT, text, 'Small'])
+
+    def test_malformed_request(self):
+        """A body that claims to be gzipped but isn't is rejected."""
+        response = requests.post(f'{self.url}/send_message', data=b'{"not": "gzip"}',
+                                 headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_compressed_at_rest(self):
+        """Messages kept compressed are delivered as published, and count at their original size."""
+        text = 'Text ' * 1000
+        self.api.send_messages(self.pid, self.topic, [DOCUMENT, text])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['bytes'], len(text) + len(json.dumps(DOCUMENT)))
+        page = self.api.pull_batch(self.sid, self.topic, visibility_timeout_ms=60000)
+        self.assertEqual(page['messages'], [DOCUMENT, text])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import threading
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from broker import BrokerEngine
+
+class TestConcurrency(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5006'])
+        cls.api = ClientAPIImpl('http://localhost:5006', pool_size=64)
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def test_concurrent_publishers_and_pullers(self):
+        """Concurrent publishers and pullers on shared topics lose and duplicate nothing.
+
+        Each subscriber is drained by two threads at once, so any read of a
+        subscriber's backlog that isn't atomic shows up as a duplicate.
+        """
+        num_topics, num_publishers, num_subscribers, messages_per_publisher = 4, 8, 8, 100
+        topics = [f'stress_{i}' for i in range(num_topics)]
+        pid = self.api.register_publisher()['pid']
+        for topic in topics:
+            self.api.create_topic(pid, topic)
+        # Every subscriber reads two topics
+        subscriptions = {}
+        for i in range(num_subscribers):
+            sid = self.api.register_subscriber()['sid']
+            subscriptions[sid] = [topics[i % num_topics], topics[(i + 1) % num_topics]]
+            for topic in subscriptions[sid]:
+                self.api.subscribe(sid, topic)
+
+        def publish(index):
+            topic = topics[index % num_topics]
+            for n in range(messages_per_publisher):
+                self.api.send_message(pid, topic, f'{index}:{n}')
+
+        received = {(sid, topic): [] for sid, subscribed in subscriptions.items() for topic in subscribed}
+        received_lock = threading.Lock()
+        publishing = threading.Event()
+
+        def pull(sid):
+            # Keeps pulling until publishing is over and a final pull comes back empty
+            while True:
+                done = not publishing.is_set()
+                empty = True
+                for topic in subscriptions[sid]:
+                    messages = self.api.pull_messages(sid, topic)
+                    with received_lock:
+                        received[sid, topic].extend(messages)
+                    empty = empty and not messages
+                if done and empty:
+                    return
+
+        publishing.set()
+        pullers = [threading.Thread(target=pull, args=(sid,)) for sid in subscriptions for _ in range(2)]
+        publishers = [threading.Thread(target=publish, args=(i,)) for i in range(num_publishers)]
+        for thread in pullers + publishers:
+            thread.start()
+        for thread in publishers:
+            thread.join()
+        publishing.clear()
+        for thread in pullers:
+            thread.join()
+
+        for (sid, topic), messages in received.items():
+            expected = sorted(f'{index}:{n}' for index in range(num_publishers) if topics[index % num_topics] == topic
+                              for n in range(messages_per_publisher))
+            self.assertEqual(sorted(messages), expected, f'{sid} on {topic}')
+
+class VanishingTopics(dict):
+    # A topic map where each membership check is followed right away by a
+    # concurrent delete_topic, the worst interleaving a check-then-read can hit
+    def __contains__(self, topic):
+        found = super().__contains__(topic)
+        self.pop(topic, None)
+        return found
+
+class TestDeleteRaces(unittest.TestCase):
+    def test_publish_while_deleting(self):
+        """Publishes and stats racing topic deletion see the topic or nothing, never a KeyError."""
+        engine = BrokerEngine()
+        for topic in ('orders', 'orders.eu'):
+            engine.create_topic('P1', topic)
+            engine.subscribe('S1', topic)
+        engine.subscribe('S1', 'orders.*')
+        engine.topics = VanishingTopics(engine.topics)
+        engine.send_message('P1', 'orders', 'Racing')
+        engine.send_messages('P1', [{'topic': 'orders', 'messages': ['Racing']}])
+        engine.topic_stats('orders')
+        engine.pull_messages('S1', 'orders.*')
+
+if __name__ == '__main__':
+    unittest.main()
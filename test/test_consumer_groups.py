@@ -0,0 +1,125 @@
+import sys
+import os
+import unittest
+import subprocess
+import threading
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestConsumerGroups(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server on its own port, with a short member timeout, before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5013',
+                                               '--group-member-timeout-ms', '500'])
+        cls.api = ClientAPIImpl('http://localhost:5013')
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'groups_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+
+    def join(self, count, group='workers'):
+        sids = [self.api.register_subscriber()['sid'] for _ in range(count)]
+        for sid in sids:
+            self.api.subscribe(sid, self.topic, group=group)
+        return sids
+
+    def test_each_message_once(self):
+        """Every message goes to exactly one member of the group."""
+        sids = self.join(3)
+        self.api.send_messages(self.pid, self.topic, [f'Message {n}' for n in range(30)])
+        received = []
+        for _ in range(10):
+            for sid in sids:
+                received.extend(self.api.pull_messages(sid, self.topic))
+        self.assertEqual(sorted(received), sorted(f'Message {n}' for n in range(30)))
+
+    def test_fair_shares(self):
+        """A member takes no more than its share of what is available."""
+        first, second = self.join(2)
+        self.api.send_messages(self.pid, self.topic, [f'Message {n}' for n in range(10)])
+        self.assertEqual(self.api.pull_batch(first, self.topic, visibility_timeout_ms=60000)['offsets'], [0, 1, 2, 3, 4])
+        # first holds its share until it acknowledges some of it
+        self.assertEqual(self.api.pull_batch(first, self.topic, visibility_timeout_ms=60000)['messages'], [])
+        self.assertEqual(self.api.pull_batch(second, self.topic, visibility_timeout_ms=60000)['offsets'], [5, 6, 7, 8, 9])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['subscribers'], 2)
+
+    def test_groups_and_subscribers_read_independently(self):
+        """Each group, and each plain subscriber, gets every message."""
+        self.join(2, 'a')
+        (member,) = self.join(1, 'b')
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, ['M0', 'M1'])
+        self.assertEqual(self.api.pull_messages(member, self.topic), ['M0', 'M1'])
+        self.assertEqual(self.api.pull_messages(sid, self.topic), ['M0', 'M1'])
+
+    def test_stale_member_is_rebalanced(self):
+        """Messages leased by a member that stopped pulling go to the others."""
+        stale, active = self.join(2)
+        self.api.send_messages(self.pid, self.topic, [f'Message {n}' for n in range(4)])
+        page = self.api.pull_batch(stale, self.topic, visibility_timeout_ms=60000)
+        self.assertEqual(page['offsets'], [0, 1])
+        self.assertEqual(self.api.pull_batch(active, self.topic, visibility_timeout_ms=60000)['offsets'], [2, 3])
+        self.assertTrue(self.api.ack(active, self.topic, 3))
+        time.sleep(0.6)
+        # active now counts as the only member and takes over stale's lease
+        page = self.api.pull_batch(active, self.topic, visibility_timeout_ms=60000)
+        self.assertEqual(page['offsets'], [0, 1])
+        self.assertFalse(self.api.ack(stale, self.topic, 1))
+        self.assertTrue(self.api.ack(active, self.topic, 1))
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['messages'], 0)
+
+    def test_leaving_releases_messages(self):
+        """A member that leaves hands its unacknowledged messages to the others."""
+        leaving, staying = self.join(2)
+        self.api.send_messages(self.pid, self.topic, ['M0', 'M1'])
+        self.assertEqual(self.api.pull_batch(leaving, self.topic, visibility_timeout_ms=60000)['messages'], ['M0'])
+        self.api.unsubscribe(leaving, self.topic)
+        self.assertEqual(self.api.pull_messages(staying, self.topic), ['M0', 'M1'])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['subscribers'], 1)
+
+    def test_long_poll_wakes_member(self):
+        """A member parked on an empty group is woken by a publish."""
+        (member,) = self.join(1)
+        publisher = threading.Timer(0.2, self.api.send_message, (self.pid, self.topic, 'M0'))
+        start_time = time.time()
+        publisher.start()
+        self.assertEqual(self.api.pull_messages(member, self.topic, wait_ms=2000), ['M0'])
+        self.assertLess(time.time() - start_time, 1)
+        publisher.join()
+
+    def test_patterns_are_rejected(self):
+        """Groups read a single topic, not a pattern."""
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, f'{self.topic}.*', group='workers')
+        self.api.create_topic(self.pid, f'{self.topic}.a')
+        self.api.send_message(self.pid, f'{self.topic}.a', 'M0')
+        self.assertEqual(self.api.pull_messages(sid, f'{self.topic}.*'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+import os
+import unittest
+import threading
+import time
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from broker import BrokerEngine
+
+class TestInProcess(unittest.TestCase):
+    def setUp(self):
+        """A fresh engine per test, used without any server."""
+        self.engine = BrokerEngine()
+        self.api = ClientAPIImpl(self.engine)
+        self.pid = self.api.register_publisher()['pid']
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.create_topic(self.pid, 'orders')
+        self.api.subscribe(self.sid, 'orders')
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_pub_sub(self):
+        """Messages published in process are pulled in order, once."""
+        self.api.send_message(self.pid, 'orders', {'id': 1})
+        self.api.send_messages(self.pid, 'orders', ['Second', 'Third'])
+        self.assertEqual(self.api.pull_messages(self.sid, 'orders'), [{'id': 1}, 'Second', 'Third'])
+        self.assertEqual(self.api.pull_messages(self.sid, 'orders'), [])
+        self.assertEqual(self.api.topic_stats('orders')['topics']['orders']['messages'], 0)
+
+    def test_engines_are_independent(self):
+        """Two engines in one process share nothing."""
+        other = ClientAPIImpl(BrokerEngine())
+        other.create_topic(self.pid, 'orders')
+        other.subscribe(self.sid, 'orders')
+        other.send_message(self.pid, 'orders', 'Elsewhere')
+        self.assertEqual(self.api.pull_messages(self.sid, 'orders'), [])
+        self.assertEqual(other.pull_messages(self.sid, 'orders'), ['Elsewhere'])
+
+    def test_long_poll(self):
+        """A pull with wait_ms blocks until a message is published."""
+        publisher = threading.Timer(0.2, self.api.send_message, (self.pid, 'orders', 'Late'))
+        start_time = time.time()
+        publisher.start()
+        self.assertEqual(self.api.pull_messages(self.sid, 'orders', wait_ms=2000), ['Late'])
+        self.assertLess(time.time() - start_time, 1)
+        publisher.join()
+
+    def test_leases_and_patterns(self):
+        """Acks, patterns and pull_all behave as they do over the network."""
+        self.api.create_topic(self.pid, 'orders.eu')
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, 'orders.*')
+        self.api.send_message(self.pid, 'orders.eu', 'Leased')
+        page = self.api.pull_batch(sid, 'orders.*', visibility_timeout_ms=60000)
+        self.assertEqual(page['offsets'], {'orders.eu': [0]})
+        self.assertTrue(self.api.ack(sid, 'orders.eu', 0))
+        self.api.send_message(self.pid, 'orders', 'Direct')
+        self.assertEqual(self.api.pull_all(self.sid), {'orders': ['Direct']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+import os
+import unittest
+import subprocess
+import threading
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestLongPoll(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path])
+        cls.api = ClientAPIImpl()
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'long_poll_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+
+    def test_pull_returns_when_message_arrives(self):
+        """A parked pull returns as soon as a message is published."""
+        message = 'Delivered while waiting'
+        timer = threading.Timer(0.3, self.api.send_message, args=(self.pid, self.topic, message))
+        timer.start()
+
+        start_time = time.time()
+        pulled_messages = self.api.pull_messages(self.sid, self.topic, wait_ms=5000)
+        elapsed = time.time() - start_time
+        timer.join()
+
+        self.assertEqual(pulled_messages, [message])
+        self.assertLess(elapsed, 4, "The pull did not return when the message arrived.")
+
+    def test_pull_times_out_when_idle(self):
+        """A parked pull on an idle topic returns an empty list after wait_ms."""
+        start_time = time.time()
+        pulled_messages = self.api.pull_messages(self.sid, self.topic, wait_ms=300)
+        elapsed = time.time() - start_time
+
+        self.assertEqual(pulled_messages, [])
+        self.assertGreaterEqual(elapsed, 0.3)
+
+    def test_max_messages(self):
+        """max_messages bounds a pull and leaves the rest queued."""
+        messages = [f'Message {i}' for i in range(5)]
+        self.api.send_messages(self.pid, self.topic, messages)
+
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic, max_messages=2), messages[:2])
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic, wait_ms=1000), messages[2:])
+
+    def test_invalid_limits(self):
+        """Non-integer or non-positive limits are rejected with 400 and lose nothing."""
+        messages = [1, 2, 3]
+        self.api.send_messages(self.pid, self.topic, messages)
+        for options in ({'max_messages': -1}, {'max_messages': 0}, {'max_messages': 1.5}, {'max_bytes': 0},
+                        {'max_bytes': 'all'}, {'wait_ms': -1}, {'ack': True, 'visibility_timeout_ms': -1}):
+            response = requests.post('http://localhost:5000/pull_messages', json={'sid': self.sid, 'topic': self.topic, **options})
+            self.assertEqual(response.status_code, 400, options)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), messages)
+
+if __name__ == '__main__':
+    unittest.main()
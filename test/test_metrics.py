@@ -0,0 +1,98 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the paths to the client_api and server directories
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from client_api_impl import ClientAPIImpl
+from metrics import Histogram
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """Percentiles land within one bucket (~19%) of the exact values."""
+        histogram = Histogram()
+        for n in range(1, 1001):
+            histogram.observe(n / 1000)  # 1 ms .. 1 s
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 1000)
+        for name, exact in (('p50_ms', 500), ('p95_ms', 950), ('p99_ms', 990)):
+            self.assertGreaterEqual(summary[name], exact)
+            self.assertLessEqual(summary[name], exact * 1.2)
+        self.assertEqual(summary['max_ms'], 1000)
+        self.assertAlmostEqual(summary['mean_ms'], 500.5, places=1)
+
+    def test_outliers(self):
+        """Values beyond the last bucket still count, and percentiles never exceed the max."""
+        histogram = Histogram()
+        histogram.observe(1e-7)
+        histogram.observe(500.0)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['p99_ms'], 500000)
+        self.assertLessEqual(summary['p50_ms'], summary['max_ms'])
+
+class TestMetricsEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server on its own port before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5008'])
+        cls.url = 'http://localhost:5008'
+        cls.api = ClientAPIImpl(cls.url)
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def test_metrics(self):
+        """Route latencies, per-topic counters, rates and backlogs, and totals are reported."""
+        pid = self.api.register_publisher()['pid']
+        topic = f'metrics_{pid}'
+        self.api.create_topic(pid, topic)
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, topic)
+        for n in range(10):
+            self.api.send_message(pid, topic, f'Message {n}')
+        self.assertEqual(len(self.api.pull_messages(sid, topic, max_messages=4)), 4)
+
+        metrics = requests.get(f'{self.url}/metrics').json()
+        self.assertGreater(metrics['uptime_s'], 0)
+        send = metrics['routes']['/send_message']
+        self.assertGreaterEqual(send['count'], 10)
+        self.assertGreaterEqual(send['statuses']['200'], 10)
+        self.assertLessEqual(send['p50_ms'], send['p99_ms'])
+        self.assertLessEqual(send['p99_ms'], send['max_ms'])
+
+        entry = metrics['topics'][topic]
+        self.assertEqual(entry['published'], 10)
+        self.assertEqual(entry['delivered'], 4)
+        self.assertEqual(entry['backlog'], {sid: 6})
+        self.assertEqual(entry['messages'], 6)
+        self.assertGreater(entry['publish_rate'], 0)
+        self.assertGreaterEqual(metrics['totals']['retained_bytes'], entry['bytes'])
+
+        # Reading the metrics doesn't reset the rates for the next reader
+        metrics = requests.post(f'{self.url}/metrics').json()
+        self.assertGreater(metrics['topics'][topic]['publish_rate'], 0)
+        self.assertEqual(metrics['topics'][topic]['published'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
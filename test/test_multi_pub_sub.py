@@ -79,5 +79,25 @@ class  TestMultiPublishSubscribe(unittest.TestCase):
 
         print("Test passed: Multiple publishers and subscribers interacted successfully with multiple topics.")
 
+    def test_batch_publish(self):
+        """Batches to one or several topics arrive whole and in order; batches for unknown topics count for nothing."""
+        api = self.api
+        pid = api.register_publisher()['pid']
+        sid = api.register_subscriber()['sid']
+        topics = [f'batch_{pid}_{i}' for i in range(3)]
+        for topic in topics:
+            api.create_topic(pid, topic)
+            api.subscribe(sid, topic)
+
+        messages = [f'Message {i}' for i in range(100)]
+        self.assertEqual(api.send_messages(pid, topics[0], messages)['count'], 100)
+        self.assertEqual(api.pull_messages(sid, topics[0]), messages)
+
+        batches = {topic: [f'{topic} {i}' for i in range(10)] for topic in topics}
+        batches[f'batch_{pid}_missing'] = ['Lost']
+        self.assertEqual(api.send_batches(pid, batches)['count'], 30)
+        for topic in topics:
+            self.assertEqual(api.pull_messages(sid, topic), batches[topic])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import os
+import unittest
+import subprocess
+import tempfile
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestPersistence(unittest.TestCase):
+    """Broker state survives a restart when it runs with --data-dir."""
+
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.api = ClientAPIImpl('http://localhost:5002')
+        self.server_process = None
+
+    def tearDown(self):
+        self.stop_server()
+        self.api.close()
+        self.data_dir.cleanup()
+
+    def start_server(self, fsync, snapshot_interval_s=60):
+        print(f"Starting the server (fsync={fsync})...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        self.server_process = subprocess.Popen(['python', server_path, '--port', '5002',
+                                                '--data-dir', self.data_dir.name, '--fsync', fsync,
+                                                '--snapshot-interval-s', str(snapshot_interval_s)])
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                self.api.register_subscriber()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    def stop_server(self):
+        if self.server_process:
+            print("Stopping the server...")
+            self.server_process.terminate()
+            self.server_process.wait()
+            self.server_process = None
+            print("Server stopped.")
+
+    def check_restart(self, fsync):
+        self.start_server(fsync)
+        pid = self.api.register_publisher()['pid']
+        self.api.create_topic(pid, 'orders')
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, 'orders')
+        self.api.send_messages(pid, 'orders', ['Order 1', 'Order 2', 'Order 3'])
+        self.assertEqual(self.api.pull_messages(sid, 'orders', max_messages=1), ['Order 1'])
+        if fsync != 'always':
+            time.sleep(0.2)  # Let the flusher catch up before pulling the plug
+        self.stop_server()
+
+        self.start_server(fsync)
+        # The consumed message stays consumed; the rest are still queued
+        self.assertEqual(self.api.pull_messages(sid, 'orders'), ['Order 2', 'Order 3'])
+        self.api.send_message(pid, 'orders', 'Order 4')
+        self.assertEqual(self.api.pull_messages(sid, 'orders'), ['Order 4'])
+
+    def test_restart_fsync_always(self):
+        self.check_restart('always')
+
+    def test_restart_fsync_interval(self):
+        self.check_restart('interval')
+
+    def test_restart_fsync_os(self):
+        self.check_restart('os')
+
+    def test_restart_from_snapshot(self):
+        """A restart loads the latest snapshot and replays only the log written after it."""
+        self.start_server('always', snapshot_interval_s=0.5)
+        pid = self.api.register_publisher()['pid']
+        self.api.create_topic(pid, 'orders')
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, 'orders')
+        self.api.send_messages(pid, 'orders', ['Order 1', 'Order 2'])
+        self.assertEqual(self.api.pull_messages(sid, 'orders', max_messages=1), ['Order 1'])
+        time.sleep(1.5)  # Let at least one snapshot happen
+        self.api.send_message(pid, 'orders', 'Order 3')
+        self.stop_server()
+
+        files = os.listdir(self.data_dir.name)
+        self.assertTrue(any(name.startswith('snapshot-') for name in files), "No snapshot was written.")
+        self.assertEqual(len([name for name in files if name.startswith('wal-')]), 1,
+                         "Log segments covered by the snapshot were not truncated.")
+
+        self.start_server('always', snapshot_interval_s=0.5)
+        self.assertEqual(self.api.pull_messages(sid, 'orders'), ['Order 2', 'Order 3'])
+
+if __name__ == '__main__':
+    unittest.main()
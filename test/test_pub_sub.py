@@ -77,5 +77,30 @@ class TestPublishSubscribe(unittest.TestCase):
         self.assertIn(message, pulled_messages, "The pulled message does not match the published message.")
         print("Test passed: The message pulled matches the published message.")
 
+    def test_shared_log(self):
+        """Every subscriber gets each message once, and the log is trimmed once all of them read it."""
+        pid = self.api.register_publisher()['pid']
+        topic = f'shared_{pid}'
+        self.api.create_topic(pid, topic)
+        first, second = self.api.register_subscriber()['sid'], self.api.register_subscriber()['sid']
+        self.api.subscribe(first, topic)
+        self.api.subscribe(second, topic)
+        messages = [f'Message {i}' for i in range(5)]
+        for message in messages:
+            self.api.send_message(pid, topic, message)
+        self.assertEqual(self.api.topic_stats(topic)['topics'][topic]['messages'], 5)
+
+        self.assertEqual(self.api.pull_messages(first, topic), messages)
+        self.assertEqual(self.api.pull_messages(first, topic), [])
+        # The second subscriber still pins the log
+        self.assertEqual(self.api.topic_stats(topic)['topics'][topic]['messages'], 5)
+        # A late subscriber starts at the end of the log
+        late = self.api.register_subscriber()['sid']
+        self.api.subscribe(late, topic)
+        self.assertEqual(self.api.pull_messages(late, topic), [])
+
+        self.assertEqual(self.api.pull_messages(second, topic), messages)
+        self.assertEqual(self.api.topic_stats(topic)['topics'][topic]['messages'], 0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
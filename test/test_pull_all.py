@@ -0,0 +1,85 @@
+import sys
+import os
+import unittest
+import subprocess
+import threading
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestPullAll(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server on its own port before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5014'])
+        cls.api = ClientAPIImpl('http://localhost:5014')
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.prefix = f'all{self.pid}'
+        self.names = [f'{self.prefix}.{n}' for n in range(20)]
+        for name in self.names:
+            self.api.create_topic(self.pid, name)
+        self.sid = self.api.register_subscriber()['sid']
+        for name in self.names:
+            self.api.subscribe(self.sid, name)
+
+    def test_grouped_by_topic(self):
+        """One request returns what sid has on every topic, by topic."""
+        self.api.send_messages(self.pid, self.names[3], ['A0', 'A1'])
+        self.api.send_message(self.pid, self.names[17], 'B0')
+        self.assertEqual(self.api.pull_all(self.sid), {self.names[3]: ['A0', 'A1'], self.names[17]: ['B0']})
+        self.assertEqual(self.api.pull_all(self.sid), {})
+        self.api.send_message(self.pid, self.names[3], 'A2')
+        self.assertEqual(self.api.pull_all(self.sid), {self.names[3]: ['A2']})
+
+    def test_budget_is_shared(self):
+        """max_messages is spread over the topics so a busy one can't starve the rest."""
+        self.api.send_messages(self.pid, self.names[0], [f'Busy {n}' for n in range(100)])
+        self.api.send_message(self.pid, self.names[1], 'Quiet')
+        by_topic = self.api.pull_all(self.sid, max_messages=10)
+        self.assertEqual(by_topic[self.names[1]], ['Quiet'])
+        self.assertEqual(by_topic[self.names[0]], [f'Busy {n}' for n in range(9)])
+
+    def test_patterns_and_unsubscribe(self):
+        """Topics read through patterns are included; unsubscribed topics are not."""
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, f'{self.prefix}.*')
+        self.api.unsubscribe(self.sid, self.names[5])
+        self.api.send_message(self.pid, self.names[5], 'M0')
+        self.assertEqual(self.api.pull_all(sid), {self.names[5]: ['M0']})
+        self.assertEqual(self.api.pull_all(self.sid), {})
+
+    def test_long_poll(self):
+        """A pull_all with nothing to read parks until any of sid's topics gets a message."""
+        publisher = threading.Timer(0.2, self.api.send_message, (self.pid, self.names[11], 'Late'))
+        start_time = time.time()
+        publisher.start()
+        self.assertEqual(self.api.pull_all(self.sid, wait_ms=2000), {self.names[11]: ['Late']})
+        self.assertLess(time.time() - start_time, 1)
+        publisher.join()
+
+if __name__ == '__main__':
+    unittest.main()
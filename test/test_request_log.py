@@ -0,0 +1,77 @@
+import sys
+import os
+import io
+import json
+import logging
+import random
+import time
+import unittest
+
+# Add the path to the server directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+import request_log
+
+class TestRequestLog(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def tearDown(self):
+        """Put the module back to the defaults the broker starts with."""
+        request_log.stop()
+        request_log.logger.handlers.clear()
+        request_log.logger.setLevel(logging.NOTSET)
+        request_log.sample_rates.clear()
+        request_log.sample_rates.update(request_log.DEFAULT_SAMPLE_RATES)
+        request_log.default_rate = 1.0
+
+    def records(self):
+        # Flushes the background writer and parses what it wrote
+        request_log.stop()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_sampling_fraction(self):
+        """Each endpoint logs about its configured fraction of requests; unlisted ones log all."""
+        request_log.configure(rates={'send_message': 0.1, 'pull_messages': 0}, stream=self.stream)
+        random.seed(17)
+        logged = sum(request_log.sampled('send_message') for _ in range(10000))
+        self.assertGreater(logged, 850)
+        self.assertLess(logged, 1150)
+        self.assertFalse(any(request_log.sampled('pull_messages') for _ in range(1000)))
+        self.assertTrue(all(request_log.sampled('create_topic') for _ in range(1000)))
+
+    def test_default_replaces_built_in_rates(self):
+        """A blanket rate also overrides the built-in hot-path rates, unless an endpoint is named."""
+        request_log.configure(rates={'pull_messages': 1}, default=0, stream=self.stream)
+        self.assertFalse(request_log.sampled('send_message'))
+        self.assertFalse(request_log.sampled('create_topic'))
+        self.assertTrue(request_log.sampled('pull_messages'))
+
+    def test_level(self):
+        """Below the configured level nothing is sampled or written."""
+        request_log.configure('warning', stream=self.stream)
+        self.assertFalse(request_log.sampled('create_topic'))
+        request_log.log(logging.INFO, 'skipped')
+        request_log.log(logging.WARNING, 'kept', topic='orders')
+        records = self.records()
+        self.assertEqual([(record['level'], record['event']) for record in records], [('WARNING', 'kept')])
+        self.assertEqual(records[0]['topic'], 'orders')
+
+    def test_request_record(self):
+        """A request record carries its fields, the batch size and the rate it was sampled at."""
+        request_log.configure(rates={'send_messages': 0.5}, stream=self.stream)
+        request_log.log_request('POST', 'send_messages', 200, time.perf_counter(),
+                                {'pid': 'p1', 'topic': 'orders', 'messages': ['a', 'b']})
+        record, = self.records()
+        self.assertEqual(record['event'], 'request')
+        self.assertEqual((record['endpoint'], record['status'], record['pid'], record['topic']),
+                         ('send_messages', 200, 'p1', 'orders'))
+        self.assertEqual(record['count'], 2)
+        self.assertEqual(record['sample_rate'], 0.5)
+
+    def test_parse_rates(self):
+        """--log-sample-endpoint values become {endpoint: rate}, without the leading slash."""
+        self.assertEqual(request_log.parse_rates(['/send_message=0.5', 'ack=1']), {'send_message': 0.5, 'ack': 1.0})
+
+if __name__ == '__main__':
+    unittest.main()
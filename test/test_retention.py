@@ -0,0 +1,99 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestRetention(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5003'])
+        cls.api = ClientAPIImpl('http://localhost:5003')
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'retention_{self.pid}'
+
+    def test_max_messages(self):
+        """A subscriber that stops pulling only pins the newest max_messages messages."""
+        self.api.create_topic(self.pid, self.topic, max_messages=3)
+        idle_sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(idle_sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, [f'Message {i}' for i in range(10)])
+
+        stats = self.api.topic_stats(self.topic)['topics'][self.topic]
+        self.assertEqual(stats['messages'], 3)
+        self.assertEqual(stats['evicted'], 7)
+        self.assertEqual(self.api.pull_messages(idle_sid, self.topic), ['Message 7', 'Message 8', 'Message 9'])
+
+    def test_max_bytes(self):
+        """Retained bytes never exceed max_bytes."""
+        self.api.create_topic(self.pid, self.topic, max_bytes=25)
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, ['x' * 10] * 5)
+
+        stats = self.api.topic_stats(self.topic)['topics'][self.topic]
+        self.assertEqual((stats['messages'], stats['bytes']), (2, 20))
+
+    def test_max_age(self):
+        """Messages older than max_age_s are evicted before they are pulled."""
+        self.api.create_topic(self.pid, self.topic, max_age_s=0.2)
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'Stale')
+        time.sleep(0.3)
+        self.api.send_message(self.pid, self.topic, 'Fresh')
+        self.assertEqual(self.api.pull_messages(sid, self.topic), ['Fresh'])
+
+    def test_invalid_limits(self):
+        """Non-positive or non-numeric limits are rejected with 400 and create nothing."""
+        for limits in ({'max_messages': 0}, {'max_messages': 1.5}, {'max_bytes': -1}, {'max_bytes': 'all'},
+                       {'max_age_s': 0}, {'max_age_s': -1}, {'max_age_s': '1'}):
+            response = requests.post('http://localhost:5003/create_topic', json={'pid': self.pid, 'topic': self.topic, **limits})
+            self.assertEqual(response.status_code, 400, limits)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'], {})
+
+    def test_delete_topic_reclaims_everything(self):
+        """Deleting a topic drops its messages and subscriptions."""
+        self.api.create_topic(self.pid, self.topic)
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'Gone')
+        self.api.delete_topic(self.pid, self.topic)
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'], {})
+
+        # Re-creating the topic starts from scratch, without the old subscription
+        self.api.create_topic(self.pid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'New')
+        self.assertEqual(self.api.pull_messages(sid, self.topic), [])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['subscribers'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
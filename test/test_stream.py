@@ -0,0 +1,80 @@
+import sys
+import os
+import unittest
+import subprocess
+import json
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+BASE_URL = 'http://localhost:5017'
+
+class TestStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the Flask engine with a short heartbeat before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5017', '--stream-heartbeat-ms', '300'])
+        cls.api = ClientAPIImpl(BASE_URL)
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'stream_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(self.sid, self.topic)
+
+    def test_events_and_heartbeat(self):
+        """Published batches arrive as events, and an idle stream gets keep-alive comments."""
+        self.api.send_messages(self.pid, self.topic, ['One', 'Two'])
+        with requests.post(f'{BASE_URL}/stream_messages', json={'sid': self.sid, 'topic': self.topic},
+                           stream=True, timeout=5) as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['Content-Type'].startswith('text/event-stream'))
+            lines = (line for line in response.iter_lines(chunk_size=None, decode_unicode=True) if line)
+            self.assertEqual(json.loads(next(lines)[len('data: '):]), ['One', 'Two'])
+            self.assertEqual(next(lines), ': keep-alive')
+            self.api.send_message(self.pid, self.topic, 'Three')
+            line = next(lines)
+            while line == ': keep-alive':
+                line = next(lines)
+            self.assertEqual(json.loads(line[len('data: '):]), ['Three'])
+
+    def test_client_stream(self):
+        """ClientAPIImpl.stream yields the pushed messages one by one."""
+        stream = self.api.stream(self.sid, self.topic)
+        self.api.send_messages(self.pid, self.topic, ['One', 'Two'])
+        self.assertEqual([next(stream), next(stream)], ['One', 'Two'])
+        stream.close()
+
+    def test_not_subscribed(self):
+        """Streaming a topic the subscriber doesn't read is a 404."""
+        sid = self.api.register_subscriber()['sid']
+        response = requests.post(f'{BASE_URL}/stream_messages', json={'sid': sid, 'topic': self.topic}, timeout=5)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('not subscribed', response.json()['message'])
+
+if __name__ == '__main__':
+    unittest.main()
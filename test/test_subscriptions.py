@@ -0,0 +1,97 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import threading
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestSubscriptions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5004'])
+        cls.api = ClientAPIImpl('http://localhost:5004')
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        self.topic = f'subscriptions_{self.pid}'
+        self.api.create_topic(self.pid, self.topic)
+        self.sid = self.api.register_subscriber()['sid']
+
+    def test_subscribe_is_idempotent(self):
+        """Subscribing twice still delivers every message once."""
+        self.api.subscribe(self.sid, self.topic)
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'Once')
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['Once'])
+        self.assertEqual(self.api.topic_stats(self.topic)['topics'][self.topic]['subscribers'], 1)
+
+    def test_unsubscribe(self):
+        """An unsubscribed subscriber gets nothing and no longer pins messages."""
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'Unread')
+        self.api.unsubscribe(self.sid, self.topic)
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), [])
+        stats = self.api.topic_stats(self.topic)['topics'][self.topic]
+        self.assertEqual((stats['subscribers'], stats['messages']), (0, 0))
+
+        # Subscribing again starts from the end of the topic
+        self.api.subscribe(self.sid, self.topic)
+        self.api.send_message(self.pid, self.topic, 'Fresh')
+        self.assertEqual(self.api.pull_messages(self.sid, self.topic), ['Fresh'])
+
+    def test_unsubscribe_releases_long_poll(self):
+        """A parked pull returns as soon as its subscription is dropped."""
+        self.api.subscribe(self.sid, self.topic)
+        poller = ClientAPIImpl('http://localhost:5004')
+        try:
+            result = {}
+            start_time = time.time()
+            thread = threading.Thread(
+                target=lambda: result.setdefault('messages', poller.pull_messages(self.sid, self.topic, wait_ms=10000)))
+            thread.start()
+            time.sleep(0.3)
+            self.api.unsubscribe(self.sid, self.topic)
+            thread.join()
+            self.assertEqual(result['messages'], [])
+            self.assertLess(time.time() - start_time, 5)
+        finally:
+            poller.close()
+
+    def test_unregister_subscriber(self):
+        """Unregistering drops the subscriber from every topic it subscribed to."""
+        other = f'{self.topic}_other'
+        self.api.create_topic(self.pid, other)
+        for topic in (self.topic, other):
+            self.api.subscribe(self.sid, topic)
+        self.api.unregister_subscriber(self.sid)
+        stats = self.api.topic_stats()['topics']
+        self.assertEqual((stats[self.topic]['subscribers'], stats[other]['subscribers']), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import threading
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+
+class TestWildcardSubscriptions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the server before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5005'])
+        cls.api = ClientAPIImpl('http://localhost:5005')
+        # Wait until the server accepts connections
+        for _ in range(50):
+            try:
+                cls.api.register_publisher()
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def setUp(self):
+        self.pid = self.api.register_publisher()['pid']
+        # Every test gets its own topic tree
+        self.root = f'orders_{self.pid}'
+        self.sid = self.api.register_subscriber()['sid']
+
+    def test_one_level_wildcard(self):
+        """'*' matches exactly one level."""
+        for region in ('eu', 'us'):
+            self.api.create_topic(self.pid, f'{self.root}.{region}.created')
+        self.api.create_topic(self.pid, f'{self.root}.eu.paid')
+        self.api.subscribe(self.sid, f'{self.root}.*.created')
+        for topic in (f'{self.root}.eu.created', f'{self.root}.us.created', f'{self.root}.eu.paid'):
+            self.api.send_message(self.pid, topic, topic)
+        self.assertEqual(sorted(self.api.pull_messages(self.sid, f'{self.root}.*.created')),
+                         [f'{self.root}.eu.created', f'{self.root}.us.created'])
+
+    def test_multi_level_wildcard_picks_up_new_topics(self):
+        """'#' matches any depth, including topics created after subscribing."""
+        self.api.subscribe(self.sid, f'{self.root}.#')
+        self.api.create_topic(self.pid, self.root)
+        self.api.create_topic(self.pid, f'{self.root}.eu.created')
+        self.api.send_message(self.pid, self.root, 'Top')
+        self.api.send_message(self.pid, f'{self.root}.eu.created', 'Nested')
+        self.assertEqual(sorted(self.api.pull_messages(self.sid, f'{self.root}.#')), ['Nested', 'Top'])
+
+    def test_long_poll_wakes_on_new_topic(self):
+        """A parked pattern pull returns once a matching topic is created and published to."""
+        self.api.subscribe(self.sid, f'{self.root}.#')
+        result = {}
+        poller = ClientAPIImpl('http://localhost:5005')
+        try:
+            thread = threading.Thread(
+                target=lambda: result.setdefault('messages', poller.pull_messages(self.sid, f'{self.root}.#', wait_ms=10000)))
+            thread.start()
+            time.sleep(0.3)
+            self.api.create_topic(self.pid, f'{self.root}.late')
+            self.api.send_message(self.pid, f'{self.root}.late', 'Late')
+            thread.join()
+            self.assertEqual(result['messages'], ['Late'])
+        finally:
+            poller.close()
+
+    def test_unsubscribe_pattern_keeps_direct_subscription(self):
+        """Dropping a pattern leaves topics the subscriber also subscribed to directly."""
+        self.api.create_topic(self.pid, f'{self.root}.eu')
+        self.api.create_topic(self.pid, f'{self.root}.us')
+        self.api.subscribe(self.sid, f'{self.root}.*')
+        self.api.subscribe(self.sid, f'{self.root}.eu')
+        self.api.unsubscribe(self.sid, f'{self.root}.*')
+        self.api.send_message(self.pid, f'{self.root}.eu', 'Kept')
+        self.api.send_message(self.pid, f'{self.root}.us', 'Dropped')
+        self.assertEqual(self.api.pull_messages(self.sid, f'{self.root}.eu'), ['Kept'])
+        self.assertEqual(self.api.pull_messages(self.sid, f'{self.root}.us'), [])
+
+if __name__ == '__main__':
+    unittest.main()
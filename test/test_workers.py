@@ -0,0 +1,89 @@
+import sys
+import os
+import unittest
+import subprocess
+import time
+import requests
+
+# Add the path to the client_api directory
+sys.path.append(os.path.join(os.path.dirname(__file__), '../client_api'))
+
+from client_api_impl import ClientAPIImpl
+from hash_ring import HashRing, partition_key
+
+WORKER_URLS = [f'http://localhost:{5010 + index}' for index in range(3)]
+
+class TestHashRing(unittest.TestCase):
+    def test_adding_a_node_moves_few_keys(self):
+        """Only the keys the new node takes over change owner."""
+        ring = HashRing(['a', 'b', 'c'])
+        keys = [f'topic_{i}' for i in range(3000)]
+        before = {key: ring.node_for(key) for key in keys}
+        ring.add('d')
+        moved = [key for key in keys if ring.node_for(key) != before[key]]
+        self.assertTrue(all(ring.node_for(key) == 'd' for key in moved))
+        self.assertLess(len(moved), len(keys) * 0.4)
+
+    def test_hierarchies_stay_together(self):
+        """A topic hierarchy and its patterns share one owner."""
+        ring = HashRing(WORKER_URLS)
+        owners = {ring.node_for(partition_key(topic)) for topic in ('orders', 'orders.eu.created', 'orders.*.created', 'orders.#')}
+        self.assertEqual(len(owners), 1)
+        with self.assertRaises(ValueError):
+            partition_key('*.created')
+
+class TestWorkers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start a broker with three workers before any tests are run."""
+        print("Starting the server...")
+        server_path = os.path.join(os.path.dirname(__file__), '../server/message_broker.py')
+        cls.server_process = subprocess.Popen(['python', server_path, '--port', '5010', '--workers', '3'])
+        # Wait until every worker accepts connections
+        for url in WORKER_URLS:
+            for _ in range(100):
+                try:
+                    requests.post(f'{url}/register_publisher', json={'pid': 'probe'})
+                    break
+                except requests.exceptions.ConnectionError:
+                    time.sleep(0.1)
+        cls.api = ClientAPIImpl(WORKER_URLS)
+        print("Server started.")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server and its workers after tests are done."""
+        print("Stopping the server...")
+        cls.api.close()
+        cls.server_process.terminate()
+        cls.server_process.wait()
+        print("Server stopped.")
+
+    def test_topics_are_spread_and_routed(self):
+        """Every topic lives on exactly one worker and its messages come back from there."""
+        pid = self.api.register_publisher()['pid']
+        sid = self.api.register_subscriber()['sid']
+        topics = [f'spread_{i}' for i in range(12)]
+        for topic in topics:
+            self.api.create_topic(pid, topic)
+            self.api.subscribe(sid, topic)
+        self.api.send_batches(pid, {topic: [f'{topic} message'] for topic in topics})
+        for topic in topics:
+            self.assertEqual(self.api.pull_messages(sid, topic), [f'{topic} message'])
+
+        hosting = [set(requests.post(f'{url}/topic_stats', json={}).json()['topics']) & set(topics) for url in WORKER_URLS]
+        self.assertEqual(sum(len(names) for names in hosting), len(topics))
+        self.assertTrue(all(hosting), 'every worker should own some of the topics')
+
+    def test_pattern_subscription(self):
+        """A pattern is served by the worker that owns its hierarchy."""
+        pid = self.api.register_publisher()['pid']
+        sid = self.api.register_subscriber()['sid']
+        self.api.subscribe(sid, 'fleet.*.position')
+        for vehicle in ('car', 'bike'):
+            self.api.create_topic(pid, f'fleet.{vehicle}.position')
+            self.api.send_message(pid, f'fleet.{vehicle}.position', vehicle)
+        self.assertEqual(sorted(self.api.pull_messages(sid, 'fleet.*.position')), ['bike', 'car'])
+
+if __name__ == '__main__':
+    unittest.main()